@@ -0,0 +1,202 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: ABCSMC.py                                                   #
+# Description: Approximate Bayesian computation (sequential Monte   #
+# Carlo) over the impact constants: finds the posterior distribution#
+# of the constants consistent with the odds ratios and regression   #
+# values of the literature. Each generation of particles is run as  #
+# parallel batches and the tolerance shrinks adaptively (quantile   #
+# of the distances of the previous generation)                      #
+#####################################################################
+
+import sys
+import os
+import csv
+import numpy as np
+
+from Calibration import Calibration_summarize, CALIBRATION_PARAMS, \
+    TARGET_RANGES
+from ParallelTrials import ParallelTrials_runBatch
+
+#####################################################################
+# Given summary values (as by Calibration_summarize), returns their #
+# distance to the targets: Euclidean, after scaling the difference  #
+# of each value by its scale (inf if any value is undefined)        #
+#####################################################################
+def ABC_getDistance(summary, targets, scales):
+    summary = np.asarray(summary, dtype=float)
+    if np.any(np.isnan(summary)):
+        return float("inf")
+    return float(np.sqrt(np.sum(((summary - targets)/scales) ** 2)))
+
+#####################################################################
+# Returns, for each of the given particles, the (unnormalized)      #
+# density of the perturbation kernel mixture centered on the        #
+# particles of the previous generation with the given weights       #
+#####################################################################
+def ABC_getKernelDensities(particles, prevParticles, prevWeights,
+    kernelCov):
+    invCov = np.linalg.inv(kernelCov)
+    diffs = particles[:, None, :] - prevParticles[None, :, :]
+    exponents = -.5 * np.einsum("ijk,kl,ijl->ij", diffs, invCov, diffs)
+    return np.exp(exponents).dot(prevWeights)
+
+#####################################################################
+# Simulates the given particles (rows of log impact constants) as a #
+# parallel batch, particle i using seed firstSeed + i, and returns  #
+# the distance of each of their summaries to the targets            #
+#####################################################################
+def ABC_simulate(original, percentMinority, particles, firstSeed,
+    targets, scales, numWorkers, resultCache):
+    trials = [dict(zip(CALIBRATION_PARAMS, np.exp(particle).tolist()),
+        percentMinority=percentMinority, seed=firstSeed + i)
+        for i, particle in enumerate(particles)]
+    summaries = ParallelTrials_runBatch(original, trials, numWorkers,
+        resultCache, Calibration_summarize)
+    return np.array([ABC_getDistance(summary, targets, scales)
+        for summary in summaries])
+
+#####################################################################
+# Runs ABC-SMC for the impact constants of original, with a prior   #
+# uniform (in the log of each constant) within priorFactor of the   #
+# baseImpacts (in the order of CALIBRATION_PARAMS). The targets are #
+# the midpoints of the literature ranges unless given, distances    #
+# being scaled by the widths of the ranges. Each generation keeps   #
+# numParticles particles: the tolerance of the next is the quantile #
+# of their (finite) distances, proposals being drawn from the       #
+# particles and perturbed with a Gaussian kernel (twice their       #
+# weighted covariance) and simulated batchSize at a time over       #
+# numWorkers processes. Stops after numGenerations, once the        #
+# tolerance shrinks by less than minReduction or when the acceptance#
+# rate of a generation (of all the proposals, including those       #
+# outside the prior) falls below minAcceptance. Returns [particles, #
+# weights, tolerance] of the last generation, whose constants are   #
+# written to resultsFile                                            #
+#####################################################################
+def ABC_runSMC(original, percentMinority, baseImpacts, numParticles=1000,
+    numGenerations=10, quantile=.5, priorFactor=4.0, targets=None,
+    batchSize=None, minReduction=.02, minAcceptance=.01, numWorkers=None,
+    resultCache=None, resultsFile="Results\\ABC\\ABC_Posterior.txt"):
+    n = len(CALIBRATION_PARAMS)
+    if batchSize is None:
+        batchSize = numParticles
+
+    ranges = np.asarray(TARGET_RANGES, dtype=float)
+    scales = ranges[:, 1] - ranges[:, 0]
+    if targets is None:
+        targets = ranges.mean(axis=1)
+    targets = np.asarray(targets, dtype=float)
+
+    logBase = np.log(np.asarray(baseImpacts, dtype=float))
+    lower = logBase - np.log(priorFactor)
+    upper = logBase + np.log(priorFactor)
+
+    # Particles are drawn from a separate generator, as the trials run
+    # in this process reseed the global one with their trial seeds
+    randomState = np.random.RandomState()
+    nextSeed = 0
+
+    # Generation 0: samples the prior, keeping the closest particles
+    particles = randomState.uniform(lower, upper, size=(numParticles, n))
+    distances = ABC_simulate(original, percentMinority, particles,
+        nextSeed, targets, scales, numWorkers, resultCache)
+    nextSeed += numParticles
+    weights = np.ones(numParticles)/numParticles
+    tolerance = float("inf")
+
+    for generation in range(1, numGenerations + 1):
+        # Particles with undefined summaries (infinite distances) are
+        # dropped, so the tolerance is a quantile of the finite ones
+        isFinite = np.isfinite(distances)
+        if not isFinite.any():
+            sys.stderr.write("ABC: no particle of generation {} has a "\
+                "finite distance: stopping\n".format(generation - 1))
+            break
+        weights = np.where(isFinite, weights, 0.0)
+        weights = weights/weights.sum()
+
+        newTolerance = float(np.quantile(distances[isFinite], quantile))
+        if newTolerance > (1 - minReduction) * tolerance:
+            break
+        tolerance = newTolerance
+
+        kernelCov = 2 * np.cov(particles.T, aweights=weights) + \
+            1e-12 * np.eye(n)
+
+        # Proposals outside of the prior count towards the acceptance
+        # rate too, so a kernel that only leaves the prior stops
+        accepted, acceptedDistances = [], []
+        numProposed = 0
+        while len(accepted) < numParticles:
+            # Draws proposals from the previous generation and perturbs
+            # them, rejecting those outside of the prior's support
+            sources = randomState.choice(numParticles, size=batchSize,
+                p=weights)
+            proposals = particles[sources] + randomState.\
+                multivariate_normal(np.zeros(n), kernelCov, size=batchSize)
+            inPrior = np.all((proposals >= lower) & (proposals <= upper),
+                axis=1)
+            proposals = proposals[inPrior]
+            numProposed += batchSize
+
+            if len(proposals):
+                proposalDistances = ABC_simulate(original, 
+                    percentMinority, proposals, nextSeed, targets, scales,
+                    numWorkers, resultCache)
+                nextSeed += len(proposals)
+
+                isAccepted = proposalDistances <= tolerance
+                accepted.extend(proposals[isAccepted])
+                acceptedDistances.extend(proposalDistances[isAccepted])
+
+            if len(accepted)/numProposed < minAcceptance and \
+                numProposed >= numParticles:
+                break
+
+        acceptance = len(accepted)/max(numProposed, 1)
+        print("ABC generation {}: tolerance {}, acceptance {}".format(
+            generation, tolerance, acceptance))
+        if len(accepted) < numParticles:
+            sys.stderr.write("ABC acceptance fell below {}: stopping "\
+                "at generation {}\n".format(minAcceptance, generation))
+            break
+
+        newParticles = np.array(accepted[:numParticles])
+
+        # The prior is uniform within its support, so the weights are
+        # the inverse of the proposal (kernel mixture) densities
+        newWeights = 1/ABC_getKernelDensities(newParticles, particles,
+            weights, kernelCov)
+        particles = newParticles
+        weights = newWeights/newWeights.sum()
+        distances = np.array(acceptedDistances[:numParticles])
+
+    ABC_writeResults(particles, weights, tolerance, resultsFile)
+    return [particles, weights, tolerance]
+
+#####################################################################
+# Writes the posterior summary (weighted mean, std and 95% interval #
+# of each impact constant) followed by all the weighted particles   #
+#####################################################################
+def ABC_writeResults(particles, weights, tolerance, resultsFile):
+    impacts = np.exp(particles)
+    means = weights.dot(impacts)
+    stds = np.sqrt(weights.dot((impacts - means) ** 2))
+
+    resultsDir = os.path.dirname(resultsFile)
+    if resultsDir and not os.path.isdir(resultsDir):
+        os.makedirs(resultsDir)
+
+    with open(resultsFile, 'w') as f:
+        writer = csv.writer(f, delimiter=' ')
+        writer.writerow(["Tolerance", tolerance])
+        for i, param in enumerate(CALIBRATION_PARAMS):
+            order = np.argsort(impacts[:, i])
+            cumWeights = np.cumsum(weights[order])
+            bounds = [impacts[order[min(np.searchsorted(cumWeights, q), 
+                len(order) - 1)], i] for q in [.025, .975]]
+            writer.writerow([param, means[i], stds[i]] + bounds)
+
+        writer.writerow(CALIBRATION_PARAMS + ["Weight"])
+        for particle, weight in zip(impacts, weights):
+            writer.writerow(list(particle) + [weight])
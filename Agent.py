@@ -13,6 +13,8 @@ import random
 import numpy as np
 
 from BaseAgent import BaseAgent
+from RandomStreams import SITE_CONCEAL, SITE_CONCEAL_REVERSE, \
+    SITE_DEPRESS, SITE_DEPRESS_REVERSE
 
 import matplotlib.pyplot as plt
 from operator import itemgetter 
@@ -88,7 +90,8 @@ class NonMinorityAgent(BaseAgent):
 
         if self.isDepressed:
             if (time - self.depressStart > TIME_THRESHOLD):
-                rand = random.random()
+                rand = self.network.NetworkBase_getUniform(self.agentID, 
+                    time, SITE_DEPRESS_REVERSE)
                 self.isDepressed = (rand < (1 - self.currentDepression/2))
             return
 
@@ -101,7 +104,8 @@ class NonMinorityAgent(BaseAgent):
         self.currentDepression = self.Agent_getLogistic(baseProb) \
             * FINAL_SCALE
 
-        rand = random.random()
+        rand = self.network.NetworkBase_getUniform(self.agentID, time, 
+            SITE_DEPRESS)
         self.isDepressed = (rand < self.currentDepression and \
             self.currentDepression > DEPRESSION_THRESHOLD)
         if self.isDepressed:
@@ -203,7 +207,8 @@ class MinorityAgent(BaseAgent):
         # depressive condition can disappear
         TIME_THRESHOLD = 5
         
-        rand = random.random()
+        rand = self.network.NetworkBase_getUniform(self.agentID, time, 
+            SITE_CONCEAL)
         self.isConcealed = (rand < self.probConceal)
 
         if self.isConcealed: 
@@ -212,7 +217,8 @@ class MinorityAgent(BaseAgent):
         # Agents will not alternate between concealed/unconcealed rapidly
         if self.isConcealed:
             if (time - self.concealStart > TIME_THRESHOLD):
-                rand = random.random()
+                rand = self.network.NetworkBase_getUniform(self.agentID, 
+                    time, SITE_CONCEAL_REVERSE)
                 self.isConcealed = (rand < ((1 - self.probConceal/2) \
                     * FINAL_SCALE))
             return
@@ -247,7 +253,8 @@ class MinorityAgent(BaseAgent):
         TIME_THRESHOLD = 20
         NETWORK_IMPACT = .25
 
-        rand = random.random()
+        rand = self.network.NetworkBase_getUniform(self.agentID, time, 
+            SITE_DEPRESS)
         self.isDepressed = (rand < self.currentDepression and \
             self.currentDepression > DEPRESSION_THRESHOLD)
         
@@ -256,7 +263,8 @@ class MinorityAgent(BaseAgent):
 
         if self.isDepressed:
             if (time - self.depressStart > TIME_THRESHOLD):
-                rand = random.random()
+                rand = self.network.NetworkBase_getUniform(self.agentID, 
+                    time, SITE_DEPRESS_REVERSE)
                 self.isDepressed = (rand < ((1 - self.currentDepression/2) 
                     * SCALING_FACTOR)) 
             return
@@ -0,0 +1,114 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: BackgroundWriter.py                                         #
+# Description: Writes buffers out to disk on a background thread so #
+# disk I/O overlaps with the simulation rather than stalling it.    #
+# Full buffers are handed off through a bounded queue (blocking the #
+# simulation when the disk falls behind) and are then cleared and   #
+# recycled through a pool. Buffers are preallocated column arrays   #
+# (ColumnBuffer) filled in place, so once the pool holds as many    #
+# buffers as may be in flight, no buffer memory is allocated per    #
+# snapshot or per flush                                             #
+#####################################################################
+
+import sys
+import threading
+import queue
+import numpy as np
+
+class ColumnBuffer:
+    #################################################################
+    # Preallocates numRows rows of the given columns (dictionary of #
+    # column name to [dtype, width]: an array of width values per   #
+    # row, or of a single value if width is None). Rows are filled  #
+    # in place (columns[name][count]) up to numRows, count being the#
+    # number of rows filled so far                                  #
+    #################################################################
+    def __init__(self, numRows, columns):
+        self.numRows = numRows
+        self.count = 0
+        self.columns = {}
+        for name, (dtype, width) in columns.items():
+            shape = (numRows,) if width is None else (numRows, width)
+            self.columns[name] = np.empty(shape, dtype=dtype)
+
+    #################################################################
+    # Returns whether all the rows of the buffer have been filled   #
+    #################################################################
+    def ColumnBuffer_isFull(self):
+        return self.count >= self.numRows
+
+    #################################################################
+    # Empties the buffer to be filled again (the arrays are kept)   #
+    #################################################################
+    def ColumnBuffer_clear(self):
+        self.count = 0
+
+class BackgroundWriter:
+    #################################################################
+    # Starts the thread calling writeBuffer (a function given a full#
+    # ColumnBuffer) on each buffer submitted, holding at most       #
+    # maxPending buffers waiting to be written at once. newBuffer   #
+    # (a function returning an empty ColumnBuffer) is only called   #
+    # when none written out is available to be recycled             #
+    #################################################################
+    def __init__(self, writeBuffer, newBuffer, maxPending=2):
+        self.writeBuffer = writeBuffer
+        self.newBuffer = newBuffer
+        self.pending = queue.Queue(maxsize=maxPending)
+        self.pool = queue.Queue()
+
+        # First exception raised when writing (raised again on close)
+        self.error = None
+
+        self.thread = threading.Thread(
+            target=self.BackgroundWriter_run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    #################################################################
+    # Returns an empty buffer to be filled, recycled from the pool  #
+    # if any buffer written out has been returned to it             #
+    #################################################################
+    def BackgroundWriter_getBuffer(self):
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            return self.newBuffer()
+
+    #################################################################
+    # Hands a full buffer off to be written: blocks (back-pressure) #
+    # while maxPending buffers are already waiting to be written    #
+    #################################################################
+    def BackgroundWriter_submit(self, buffer):
+        self.pending.put(buffer)
+
+    #################################################################
+    # Body of the thread: writes buffers in order of submission,    #
+    # recycling each once written, until the end marker (None)      #
+    #################################################################
+    def BackgroundWriter_run(self):
+        while True:
+            buffer = self.pending.get()
+            if buffer is None:
+                return
+
+            if self.error is None:
+                try:
+                    self.writeBuffer(buffer)
+                except Exception as e:
+                    sys.stderr.write("Background write failed: {}\n"\
+                        .format(e))
+                    self.error = e
+            buffer.ColumnBuffer_clear()
+            self.pool.put(buffer)
+
+    #################################################################
+    # Waits for all the submitted buffers to be written and stops   #
+    # the thread, raising any error that occured while writing      #
+    #################################################################
+    def BackgroundWriter_close(self):
+        self.pending.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
@@ -16,6 +16,8 @@ import numpy as np
 from Verification import *
 from NetworkBase import NetworkBase
 from Policy import Policy
+from RandomStreams import SITE_CONSTRAINED_CONCEAL, \
+    SITE_CONSTRAINED_DEPRESS
 
 import matplotlib.pyplot as plt
 from operator import itemgetter 
@@ -27,6 +29,14 @@ except ImportError:
     raise ImportError("You must install NetworkX:\
     (http://networkx.lanl.gov/) for SE simulation")
 
+# Agent attributes whose changes are tracked by the network base: each
+# assignment changing a value bumps the version of the field, so the
+# statistics derived from it are only recomputed after it changes (see
+# NetworkBase_getCachedStat)
+TRACKED_FIELDS = frozenset(["attitude", "isMinority", "currentSES",
+    "discrimination", "support", "probConceal", "isConcealed",
+    "currentDepression", "isDepressed"])
+
 #####################################################################
 # A generic base model for agents of the simulation: used to model  #
 # the constituent people in a population                            #
@@ -83,6 +93,20 @@ class BaseAgent:
         # the "discrimination decay" for extended periods of time
         self.hasMultipleStagnant = False
             
+    #################################################################
+    # Sets the attribute as usual, bumping its version on the       #
+    # network base if it is one of the tracked fields and its value #
+    # changed (agents reassign their flags every tick, mostly to the#
+    # values they already hold)                                     #
+    #################################################################
+    def __setattr__(self, name, value):
+        if name in TRACKED_FIELDS and (name not in self.__dict__ or 
+            self.__dict__[name] != value):
+            network = self.__dict__.get("network")
+            if network is not None:
+                network.NetworkBase_bumpVersion(name)
+        self.__dict__[name] = value
+
     #################################################################
     # Provides an output string for printing out agents             #
     #################################################################
@@ -273,9 +297,11 @@ class BaseAgent:
 
             # Checks if agent becomes concealed/depressed (if not default)
             elif step == "conceal": 
-                self.isConcealed = random.random() < \
+                self.isConcealed = self.network.NetworkBase_getUniform(
+                    self.agentID, time, SITE_CONSTRAINED_CONCEAL) < \
                     self.probConceal
 
             elif step == "depress":
-                self.isDepressed = random.random() < \
+                self.isDepressed = self.network.NetworkBase_getUniform(
+                    self.agentID, time, SITE_CONSTRAINED_DEPRESS) < \
                     self.currentDepression
\ No newline at end of file
@@ -0,0 +1,235 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: Calibration.py                                              #
+# Description: Calibrates the impact constants of the simulation    #
+# against the literature: searches for constants whose odds ratios  #
+# and regression values fall within the ranges in the literature    #
+# (those of OddRatiosTest/RegressionValueTest) using CMA-ES, with   #
+# each generation of candidates simulated as one parallel batch     #
+#####################################################################
+
+import sys
+import os
+import csv
+import numpy as np
+
+from SMDSensitivity import Sensitivity_computeOddRatios, \
+    Sensitivity_computeRegressionValues, OR_LABELS, OR_RANGES, \
+    REGRESSION_LABELS, REGRESSION_RANGES
+from ParallelTrials import ParallelTrials_runBatch
+
+# Impact constants being calibrated (named as keyword arguments of
+# Sensitivity_runSimulation)
+CALIBRATION_PARAMS = ["supportDepressionImpact",
+    "concealDiscriminateImpact", "discriminateConcealImpact",
+    "discriminateDepressionImpact", "concealDepressionImpact"]
+
+# Ranges of the values produced by Calibration_summarize, in order
+TARGET_LABELS = OR_LABELS + REGRESSION_LABELS
+TARGET_RANGES = OR_RANGES + REGRESSION_RANGES
+
+# Distance (in range widths) given to values that could not be computed
+UNDEFINED_DISTANCE = 10.0
+
+#####################################################################
+# Summarizes a final simulation by the values compared against the  #
+# literature: its odds ratios followed by its regression values     #
+#####################################################################
+def Calibration_summarize(simulationModel):
+    network = simulationModel.network.networkBase
+    return Sensitivity_computeOddRatios(network) + \
+        Sensitivity_computeRegressionValues(network)
+
+#####################################################################
+# Given summary values (as by Calibration_summarize), returns their #
+# distance from the literature: the sum over the values of how far  #
+# each falls outside of its range, measured in widths of the range  #
+# (0 if all of them are within range)                               #
+#####################################################################
+def Calibration_getDistance(summary):
+    distance = 0.0
+    for value, targetRange in zip(summary, TARGET_RANGES):
+        lower, upper = targetRange
+        if value is None or np.isnan(value):
+            distance += UNDEFINED_DISTANCE
+            continue
+        distance += max(lower - value, value - upper, 0.0)/(upper - lower)
+    return distance
+
+#####################################################################
+# Evaluates the given candidates (rows of log impact constants) by  #
+# the distance of their summaries averaged over replicates. Each    #
+# candidate is first run on racingReplicates replicates: only those #
+# whose distance is at most that of the best by abandonFactor (and  #
+# within the best half of candidates) are run on the remainder up to#
+# numReplicates, the others being abandoned with their partial score#
+# Replicate r uses the common random numbers of seed r, so all the  #
+# candidates see the same draws. Returns the distance of each       #
+# candidate along with whether it was fully evaluated               #
+#####################################################################
+def Calibration_evaluate(original, percentMinority, candidates,
+    numReplicates, racingReplicates, abandonFactor, numWorkers,
+    resultCache):
+    getTrials = lambda candidate, replicates: [dict(
+        zip(CALIBRATION_PARAMS, np.exp(candidate).tolist()),
+        percentMinority=percentMinority, seed=replicate,
+        commonRandom=True) for replicate in replicates]
+
+    summaries = [[] for _ in candidates]
+    stages = [[range(min(racingReplicates, numReplicates)),
+        list(range(len(candidates)))]]
+    distances = np.zeros(len(candidates))
+    isComplete = np.zeros(len(candidates), dtype=bool)
+
+    for replicates, toRun in stages:
+        trials, owners = [], []
+        for i in toRun:
+            curTrials = getTrials(candidates[i], replicates)
+            trials += curTrials
+            owners += [i] * len(curTrials)
+
+        batchResults = ParallelTrials_runBatch(original, trials,
+            numWorkers, resultCache, Calibration_summarize)
+        for i, trialResult in zip(owners, batchResults):
+            summaries[i].append(trialResult)
+
+        for i in toRun:
+            with np.errstate(invalid="ignore"):
+                meanSummary = np.nanmean(summaries[i], axis=0)
+            distances[i] = Calibration_getDistance(meanSummary)
+
+        if len(stages) > 1 or len(replicates) >= numReplicates:
+            isComplete[toRun] = True
+            continue
+
+        # Races the candidates: only promising ones are run further
+        cutoff = min(np.median(distances),
+            distances.min() * abandonFactor)
+        survivors = [i for i in toRun if distances[i] <= cutoff]
+        stages.append([range(len(replicates), numReplicates), survivors])
+
+    return [distances, isComplete]
+
+#####################################################################
+# Calibrates the impact constants of the original simulation against#
+# the literature ranges via CMA-ES (on the log of the constants, so #
+# they remain positive) starting from initialImpacts (in the order  #
+# of CALIBRATION_PARAMS) with step size sigma. Each generation of   #
+# populationSize candidates is evaluated as a parallel batch over   #
+# numWorkers processes (see Calibration_evaluate for the racing of  #
+# the replicates). Stops once a fully evaluated candidate is within #
+# all ranges or after numGenerations. Returns [bestImpacts, distance]#
+# and writes the best found constants and summary to resultsFile    #
+#####################################################################
+def Calibration_calibrate(original, percentMinority, initialImpacts,
+    numGenerations=30, populationSize=None, sigma=.3, numReplicates=4,
+    racingReplicates=1, abandonFactor=2.0, numWorkers=None,
+    resultCache=None,
+    resultsFile="Results\\Calibration\\Calibration_Results.txt"):
+    # Candidates are drawn from a separate generator, as the trials run
+    # in this process reseed the global one with their replicate seeds
+    randomState = np.random.RandomState()
+
+    n = len(CALIBRATION_PARAMS)
+    if populationSize is None:
+        populationSize = 4 + int(3 * np.log(n))
+    mu = populationSize//2
+
+    # Recombination weights and the standard CMA-ES learning rates
+    weights = np.log(mu + .5) - np.log(np.arange(1, mu + 1))
+    weights /= weights.sum()
+    muEff = 1.0/np.sum(weights ** 2)
+
+    cSigma = (muEff + 2)/(n + muEff + 5)
+    dSigma = 1 + 2 * max(0, np.sqrt((muEff - 1)/(n + 1)) - 1) + cSigma
+    cC = (4 + muEff/n)/(n + 4 + 2 * muEff/n)
+    c1 = 2/((n + 1.3) ** 2 + muEff)
+    cMu = min(1 - c1, 2 * (muEff - 2 + 1/muEff)/((n + 2) ** 2 + muEff))
+    expectedNorm = np.sqrt(n) * (1 - 1/(4 * n) + 1/(21 * n ** 2))
+
+    mean = np.log(np.asarray(initialImpacts, dtype=float))
+    C = np.eye(n)
+    pSigma = np.zeros(n)
+    pC = np.zeros(n)
+
+    bestCandidate = mean.copy()
+    bestDistance = float("inf")
+
+    for generation in range(numGenerations):
+        eigenvalues, B = np.linalg.eigh(C)
+        D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+
+        steps = randomState.randn(populationSize, n)
+        offsets = (steps * D).dot(B.T)
+        candidates = mean + sigma * offsets
+
+        distances, isComplete = Calibration_evaluate(original,
+            percentMinority, candidates, numReplicates, racingReplicates,
+            abandonFactor, numWorkers, resultCache)
+
+        # Abandoned candidates are ranked behind all completed ones
+        order = sorted(range(populationSize),
+            key=lambda i: (not isComplete[i], distances[i]))
+        for i in order:
+            if isComplete[i] and distances[i] < bestDistance:
+                bestDistance = float(distances[i])
+                bestCandidate = candidates[i].copy()
+
+        print("Calibration generation {}: best distance {}".format(
+            generation, bestDistance))
+        if bestDistance == 0.0:
+            break
+
+        selected = order[:mu]
+        oldMean = mean
+        mean = weights.dot(candidates[selected])
+        meanStep = (mean - oldMean)/sigma
+
+        # Cumulates the evolution paths and adapts the step size and
+        # covariance (rank-one and rank-mu updates)
+        invSqrtC = B.dot(np.diag(1/D)).dot(B.T)
+        pSigma = (1 - cSigma) * pSigma + np.sqrt(cSigma *
+            (2 - cSigma) * muEff) * invSqrtC.dot(meanStep)
+        pSigmaNorm = np.linalg.norm(pSigma)
+        hSigma = pSigmaNorm/np.sqrt(1 - (1 - cSigma) **
+            (2 * (generation + 1))) < (1.4 + 2/(n + 1)) * expectedNorm
+
+        pC = (1 - cC) * pC + hSigma * np.sqrt(cC * (2 - cC) * muEff) \
+            * meanStep
+        selectedOffsets = (candidates[selected] - oldMean)/sigma
+        C = (1 - c1 - cMu) * C + c1 * (np.outer(pC, pC) +
+            (1 - hSigma) * cC * (2 - cC) * C) + cMu * \
+            (selectedOffsets.T * weights).dot(selectedOffsets)
+        sigma *= np.exp((cSigma/dSigma) * (pSigmaNorm/expectedNorm - 1))
+
+    bestImpacts = np.exp(bestCandidate).tolist()
+    Calibration_writeResults(original, percentMinority, bestImpacts,
+        bestDistance, numReplicates, numWorkers, resultCache, resultsFile)
+    return [bestImpacts, bestDistance]
+
+#####################################################################
+# Writes the calibrated impact constants to resultsFile, along with #
+# the mean literature values they produce and their target ranges   #
+#####################################################################
+def Calibration_writeResults(original, percentMinority, impacts,
+    distance, numReplicates, numWorkers, resultCache, resultsFile):
+    trials = [dict(zip(CALIBRATION_PARAMS, impacts),
+        percentMinority=percentMinority, seed=replicate,
+        commonRandom=True) for replicate in range(numReplicates)]
+    summaries = ParallelTrials_runBatch(original, trials, numWorkers,
+        resultCache, Calibration_summarize)
+    with np.errstate(invalid="ignore"):
+        meanSummary = np.nanmean(summaries, axis=0)
+
+    resultsDir = os.path.dirname(resultsFile)
+    if resultsDir and not os.path.isdir(resultsDir):
+        os.makedirs(resultsDir)
+
+    with open(resultsFile, 'w') as f:
+        writer = csv.writer(f, delimiter=' ')
+        for param, impact in zip(CALIBRATION_PARAMS, impacts):
+            writer.writerow([param, impact])
+        writer.writerow(["Distance", distance])
+        for i in range(len(TARGET_LABELS)):
+            writer.writerow([TARGET_LABELS[i], meanSummary[i],
+                TARGET_RANGES[i][0], TARGET_RANGES[i][1]])
@@ -0,0 +1,118 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: CorrelationTracker.py                                       #
+# Description: Observer of the simulation that tracks, at every     #
+# tick, the correlations among the minority agents' attributes that #
+# are compared against the literature (support, concealment,        #
+# discrimination, depression), separately for concealed and         #
+# unconcealed agents. Uses streaming co-moment accumulators, so no  #
+# per-agent lists are built and the trajectories show when each of  #
+# the relationships forms over the course of the simulation         #
+#####################################################################
+
+import sys
+import os
+import csv
+
+from OnlineStats import CoMoment
+
+# Pairs of agent attributes correlated (in the order of the regression
+# values of Sensitivity_computeRegressionValues)
+CORRELATION_PAIRS = [
+    ["Support_Conceal", "support", "probConceal"],
+    ["Discrimination_Conceal", "discrimination", "probConceal"],
+    ["Discrimination_Depress", "discrimination", "currentDepression"],
+    ["Conceal_Depress", "probConceal", "currentDepression"]
+]
+
+# Groups of minority agents for which correlations are tracked (the
+# overall correlation is obtained by merging the two groups)
+GROUPS = ["Unconcealed", "Concealed", "Overall"]
+
+#####################################################################
+# Returns the correlations of CORRELATION_PAIRS among the minority  #
+# agents of the network base, as a dictionary mapping each of GROUPS#
+# to the list of its correlations (nan where undefined), accumulated#
+# in a single pass over the agents without building any lists       #
+#####################################################################
+def CorrelationTracker_getCorrelations(network):
+    UNCONCEALED_INDEX = 0
+    CONCEALED_INDEX = 1
+
+    accumulators = [[CoMoment() for _ in CORRELATION_PAIRS]
+        for _ in range(2)]
+    for agent in network.Agents.values():
+        if not agent.isMinority:
+            continue
+        groupAccumulators = accumulators[int(agent.isConcealed)]
+        for i, pair in enumerate(CORRELATION_PAIRS):
+            groupAccumulators[i].CoMoment_update(
+                getattr(agent, pair[1]), getattr(agent, pair[2]))
+
+    correlations = dict((group, []) for group in GROUPS)
+    for i in range(len(CORRELATION_PAIRS)):
+        overall = CoMoment()
+        for groupIndex in [UNCONCEALED_INDEX, CONCEALED_INDEX]:
+            curAccumulator = accumulators[groupIndex][i]
+            correlations[GROUPS[groupIndex]].append(
+                curAccumulator.CoMoment_getCorrelation())
+            overall.CoMoment_merge(curAccumulator)
+        correlations["Overall"].append(overall.CoMoment_getCorrelation())
+    return correlations
+
+class CorrelationTracker:
+    #################################################################
+    # Initializes the tracker, which records the correlations every #
+    # sampleRate ticks once added as an observer of the simulation  #
+    #################################################################
+    def __init__(self, sampleRate=1):
+        self.sampleRate = sampleRate
+
+        # Times at which correlations were recorded and, for each
+        # group and pair, the correlation at each of those times
+        self.times = []
+        self.trajectories = dict((group, [[] for _ in CORRELATION_PAIRS])
+            for group in GROUPS)
+
+    #################################################################
+    # Observer hook called (via ObserverSink) after each tick:      #
+    # records the correlations of the current tick (as computed by  #
+    # CorrelationTracker_getCorrelations)                           #
+    #################################################################
+    def Observer_observeTick(self, network, time):
+        if time % self.sampleRate:
+            return
+
+        correlations = CorrelationTracker_getCorrelations(network)
+        self.times.append(time)
+        for group in GROUPS:
+            for i in range(len(CORRELATION_PAIRS)):
+                self.trajectories[group][i].append(correlations[group][i])
+
+    #################################################################
+    # Returns the correlation trajectory (one value per recorded    #
+    # time) of the given pair label for the given group             #
+    #################################################################
+    def CorrelationTracker_getTrajectory(self, label, group="Overall"):
+        labels = [pair[0] for pair in CORRELATION_PAIRS]
+        return self.trajectories[group][labels.index(label)]
+
+    #################################################################
+    # Writes the trajectories to resultsFile, with one row per tick #
+    # recorded and a column for each group and pair of attributes   #
+    #################################################################
+    def CorrelationTracker_writeTrajectories(self,
+        resultsFile="Results\\Regression\\Correlation_Trajectories.csv"):
+        resultsDir = os.path.dirname(resultsFile)
+        if resultsDir and not os.path.isdir(resultsDir):
+            os.makedirs(resultsDir)
+
+        columns = ["time"] + ["{}_{}".format(pair[0], group)
+            for group in GROUPS for pair in CORRELATION_PAIRS]
+        with open(resultsFile, 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for t in range(len(self.times)):
+                writer.writerow([self.times[t]] + [self.trajectories[group]
+                    [i][t] for group in GROUPS
+                    for i in range(len(CORRELATION_PAIRS))])
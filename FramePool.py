@@ -0,0 +1,112 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: FramePool.py                                                #
+# Description: Renders frames of the network display on a pool of   #
+# worker processes (Agg backend) so that the simulation keeps       #
+# running while they are drawn. Each worker builds the static scene #
+# once and is then only handed the per-node state of each frame.    #
+# Frames complete out of order but are named by tick, and may be    #
+# assembled into an animated GIF at the end                         #
+#####################################################################
+
+import sys
+import os
+import multiprocessing
+import numpy as np
+
+import matplotlib.pyplot as plt
+
+from NetworkRenderer import NetworkRenderer_create
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Renderer of the worker process (built by FramePool_initWorker)
+workerRenderer = None
+
+#####################################################################
+# Pool initializer: switches the worker to the Agg backend and      #
+# builds its renderer of the scene (see NetworkRenderer_create)     #
+#####################################################################
+def FramePool_initWorker(scene, state, density):
+    global workerRenderer
+    plt.switch_backend("Agg")
+    workerRenderer = NetworkRenderer_create(scene, state, density)
+
+#####################################################################
+# Renders a frame in the worker, given as [time, state, fileName]   #
+#####################################################################
+def FramePool_renderFrame(frame):
+    time, state, fileName = frame
+    workerRenderer.NetworkRenderer_render(time, fileName, state)
+    return fileName
+
+class FramePool:
+    #################################################################
+    # Starts numWorkers (defaults to the number of CPUs) processes  #
+    # rendering frames of the scene, first in the given state (see  #
+    # NetworkRenderer_getSceneState; as a density plot if density). #
+    # At most maxPending frames are queued before submitting blocks #
+    #################################################################
+    def __init__(self, scene, state, numWorkers=None, maxPending=None,
+        density=False):
+        if numWorkers is None:
+            numWorkers = multiprocessing.cpu_count()
+        if maxPending is None:
+            maxPending = 4 * numWorkers
+        self.maxPending = maxPending
+
+        self.pool = multiprocessing.Pool(numWorkers,
+            initializer=FramePool_initWorker,
+            initargs=(scene, state, density))
+
+        # Frames submitted that may still be being rendered
+        self.pending = []
+
+    #################################################################
+    # Submits the frame of the given time (nodes in the given state,#
+    # colors being sent as compact float32 RGBA) to be rendered into#
+    # fileName                                                      #
+    #################################################################
+    def FramePool_submit(self, time, state, fileName):
+        while len(self.pending) >= self.maxPending:
+            self.pending.pop(0).get()
+
+        state = np.asarray(state)
+        if state.dtype != bool:
+            state = state.astype(np.float32)
+        frame = [time, state, fileName]
+        self.pending.append(self.pool.apply_async(FramePool_renderFrame,
+            (frame,)))
+
+    #################################################################
+    # Waits for all the frames to be rendered and stops the workers #
+    #################################################################
+    def FramePool_close(self):
+        try:
+            for result in self.pending:
+                result.get()
+        finally:
+            self.pool.close()
+            self.pool.join()
+        self.pending = []
+
+#####################################################################
+# Assembles the given frame files (in order) into an animated GIF   #
+# (requires PIL): each frame is shown for frameDuration (ms)        #
+#####################################################################
+def FramePool_assembleAnimation(frameFiles, animationFile,
+    frameDuration=200):
+    if Image is None:
+        sys.stderr.write("PIL not installed: cannot create {}\n"\
+            .format(animationFile))
+        return
+    if not frameFiles:
+        return
+
+    frames = [Image.open(frameFile).convert("RGB")
+        for frameFile in frameFiles]
+    frames[0].save(animationFile, save_all=True,
+        append_images=frames[1:], duration=frameDuration, loop=0)
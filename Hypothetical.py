@@ -10,36 +10,61 @@
 
 import sys
 import os
+import random
+import multiprocessing
 from copy import deepcopy
+import numpy as np
 
 from NetworkBase import NetworkBase
 from SexMinDepressionSimulation import *
 
+import ParallelTrials
+from ParallelTrials import ParallelTrials_initWorker
+
+#####################################################################
+# Forks a branch off of the snapshot (simulation paused at the tick #
+# of intervention), applies the intervention given in paramsDict (of#
+# the form {attitude, support, discrimination, conceal, depression, #
+# policy}, with None for attributes not intervened on) and runs the #
+# branch to the end of the timespan. Returns the final branch state #
+#####################################################################
+def Hypothetical_runBranch(snapshot, paramsDict):
+    branch = snapshot.SMDModel_fork()
+    branch.SMDModel_applyIntervention(paramsDict["attitude"], 
+        paramsDict["support"], paramsDict["discrimination"], 
+        paramsDict["conceal"], paramsDict["depression"], 
+        paramsDict["policy"])
+    branch.SMDModel_runTicks()
+    return branch
+
 #####################################################################
 # Defines the generic structure of an intervention (used as template#
-# for all interventions modelled below). Original is the original   #
-# simulation model that was run, attr the attribute to be varied,   #
-# effectiveness being how much of an impact the intervention had,   #
-# and params being the parameters used for simulation, in the form  #
-# of (attitude, support, discrimination, conceal, depression,       # 
-# enforcedPolicy), a tuple                                          #
-#####################################################################
-def Hypothetical_genericTest(original, attr, effectiveness, 
+# for all interventions modelled below). Snapshot is the simulation #
+# model paused at the time of intervention, attr the attribute to be#
+# varied, effectiveness being how much of an impact the intervention#
+# had, and params being the parameters used for simulation, in the  #
+# form of (attitude, support, discrimination, conceal, depression,  # 
+# enforcedPolicy), a dictionary                                     #
+#####################################################################
+def Hypothetical_genericTest(snapshot, attr, effectiveness, 
     paramsDict, results):
     origAttr = results[attr]
     changedAttr = origAttr * effectiveness 
     paramsDict[attr] = changedAttr
 
-    print(paramsDict["policy"])
     if paramsDict["policy"]: 
         paramsDict["policy"] = int(paramsDict["policy"])
 
-    # Converts from the given dictionary format to a tuple
-    params = map(lambda v: paramsDict[v], paramsDict)
+    return Hypothetical_runBranch(snapshot, paramsDict)
 
-    concealTest = deepcopy(original)
-    concealTest.SMDModel_runStreamlineSimulation(*list(params))
-    return concealTest
+#####################################################################
+# Baseline: no intervention is made, so the branch continues along  #
+# as the simulation would have. Returns the final state of the      #
+# simulation, to which all the scenarios below are compared         #
+#####################################################################
+def Hypothetical_Baseline(snapshot, paramsDict, results):
+    copyDict = deepcopy(paramsDict)
+    return Hypothetical_runBranch(snapshot, copyDict)
 
 #####################################################################
 # Scenario 1: Intervene on LGB individuals to improve their mental  #
@@ -47,11 +72,11 @@ def Hypothetical_genericTest(original, attr, effectiveness,
 # without intervening on other variables. Returns the final state of# 
 # the simulation                                                    #
 #####################################################################
-def Hypothetical_LGB_Concealment(original, paramsDict, results):
+def Hypothetical_LGB_Concealment(snapshot, paramsDict, results):
     INTERVENTION_EFFECTIVESS = .75
     attr = "conceal"
     copyDict = deepcopy(paramsDict)
-    return Hypothetical_genericTest(original, attr, 
+    return Hypothetical_genericTest(snapshot, attr, 
         INTERVENTION_EFFECTIVESS, copyDict, results)
 
 #####################################################################
@@ -61,11 +86,11 @@ def Hypothetical_LGB_Concealment(original, paramsDict, results):
 # discrimination without intervening on other variables. Returns the#
 # final state of the simulation                                     #
 #####################################################################
-def Hypothetical_NonLGB_Discrimination(original, paramsDict, results):
+def Hypothetical_NonLGB_Discrimination(snapshot, paramsDict, results):
     INTERVENTION_EFFECTIVESS = .75
     attr = "discrimination"
     copyDict = deepcopy(paramsDict)
-    return Hypothetical_genericTest(original, attr, 
+    return Hypothetical_genericTest(snapshot, attr, 
         INTERVENTION_EFFECTIVESS, copyDict, results)
 
 #####################################################################
@@ -75,11 +100,11 @@ def Hypothetical_NonLGB_Discrimination(original, paramsDict, results):
 # improve attitudes without intervening on other variables. Returns #
 # the final state of the simulation                                 #
 #####################################################################
-def Hypothetical_NonLGB_Attitudes(original, paramsDict, results):
+def Hypothetical_NonLGB_Attitudes(snapshot, paramsDict, results):
     INTERVENTION_EFFECTIVESS = 1.25
     attr = "attitude"
     copyDict = deepcopy(paramsDict)
-    return Hypothetical_genericTest(original, attr, 
+    return Hypothetical_genericTest(snapshot, attr, 
         INTERVENTION_EFFECTIVESS, copyDict, results)
 
 #####################################################################
@@ -89,27 +114,46 @@ def Hypothetical_NonLGB_Attitudes(original, paramsDict, results):
 # model, this intervention would be on the policy level. Returns the#
 # final state of the simulation                                     #
 #####################################################################
-def Hypothetical_Policy(original, paramsDict, results):
+def Hypothetical_Policy(snapshot, paramsDict, results):
     INTERVENTION_EFFECTIVESS = 1.025
     attr = "policy"
     copyDict = deepcopy(paramsDict)
-    return Hypothetical_genericTest(original, attr, 
+    return Hypothetical_genericTest(snapshot, attr, 
         INTERVENTION_EFFECTIVESS, copyDict, results)
 
 #####################################################################
-# Performs all of the hypothetical simulations that were of interest#
-# and compares their effectiveness to the baseline simulation done. #
-# Takes in the original simulation and final simulation as arguments#
-# and outputs the relative effectiveness of each scenario           #
+# Runs a single scenario, given as [scenario, snapshot, paramsDict, #
+# results, seed] (scenario being one of the functions above), the   #
+# global generators being reseeded with seed first, so its branch   #
+# draws the same numbers whichever process it is run in. Returns the#
+# final % depression of its branch. Used by the worker pool         #
 #####################################################################
-def Hypothetical_findEffectiveness(original, final):
+def Hypothetical_runScenario(scenarioSpec):
+    scenario, snapshot, paramsDict, results, seed = scenarioSpec
+    random.seed(seed)
+    np.random.seed(seed)
+    return scenario(snapshot, paramsDict, results).network.networkBase.\
+        NetworkBase_findPercentAttr("depression")
+
+# Scenarios compared, in the order they are run and reported: the 
+# baseline (first) is that to which all the others are compared
+SCENARIOS = [
+    ["baseline", Hypothetical_Baseline],
+    ["conceal", Hypothetical_LGB_Concealment],
+    ["discrimination", Hypothetical_NonLGB_Discrimination],
+    ["attitude", Hypothetical_NonLGB_Attitudes],
+    ["policy", Hypothetical_Policy]
+]
+
+#####################################################################
+# Given the final state of a simulation run from original, returns  #
+# the values the interventions scale (results) and the blank form of#
+# the intervention parameters (paramsDict) as [results, paramsDict] #
+#####################################################################
+def Hypothetical_getInterventionParams(original, final):
     # Indicates the gaps in time between passing of enforced policies
     TIME_GAP = 5
 
-    # Given a simulation x, finds the final % depression
-    getDepress = lambda x: x.network.networkBase.\
-        NetworkBase_findPercentAttr("depression")
-
     network = final.network.networkBase
     finalScore = network.policyScore
 
@@ -133,17 +177,168 @@ def Hypothetical_findEffectiveness(original, final):
         "depression": None, 
         "policy": None
     }
+    return [results, paramsDict]
 
-    baseline = getDepress(original)
-    effects = {
-        "conceal": Hypothetical_LGB_Concealment(original, paramsDict, results),
-        "discrimination": Hypothetical_NonLGB_Discrimination(
-            original, paramsDict, results),
-        "attitude": Hypothetical_NonLGB_Attitudes(original, paramsDict, results),
-        "policy": Hypothetical_Policy(original, paramsDict, results)
-    }
+#####################################################################
+# Performs all of the hypothetical simulations that were of interest#
+# and compares their effectiveness to the baseline simulation done. #
+# Takes in the original simulation and final simulation as arguments#
+# and outputs the relative effectiveness of each scenario. Original #
+# is run once up to interventionTick and each scenario (along with  #
+# the baseline) is forked from that point, the branches being run   #
+# over numWorkers processes (defaults to the number of CPUs). The   #
+# shared history is seeded by seed and branch i (in the order of    #
+# SCENARIOS) by seed + i + 1, so the same results are found however #
+# many processes are used                                           #
+#####################################################################
+def Hypothetical_findEffectiveness(original, final, interventionTick=0,
+    numWorkers=None, seed=0):
+    results, paramsDict = Hypothetical_getInterventionParams(original, 
+        final)
+
+    # The history shared by all the branches is only simulated once
+    random.seed(seed)
+    np.random.seed(seed)
+    snapshot = original.SMDModel_fork()
+    snapshot.SMDModel_runTicks(interventionTick)
 
+    scenarioSpecs = [[scenario, snapshot, paramsDict, results, 
+        seed + i + 1] for i, (_, scenario) in enumerate(SCENARIOS)]
+
+    if numWorkers is None:
+        numWorkers = multiprocessing.cpu_count()
+    numWorkers = min(numWorkers, len(scenarioSpecs))
+
+    if numWorkers <= 1:
+        depressions = list(map(Hypothetical_runScenario, scenarioSpecs))
+    else:
+        pool = multiprocessing.Pool(numWorkers)
+        try:
+            depressions = pool.map(Hypothetical_runScenario, scenarioSpecs)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    baseline = depressions[0]
     effectStr = "Altering {} is {} times as effective as baseline"
-    for effect in effects:
-        curDepress = getDepress(effects[effect])
-        print(effectStr.format(effect, curDepress/baseline))
\ No newline at end of file
+    for i in range(1, len(SCENARIOS)):
+        curDepress = depressions[i]
+        print(effectStr.format(SCENARIOS[i][0], curDepress/baseline))
+
+# Shared history of the replicate the worker process last ran, as 
+# [replicate, interventionTick, snapshot]: the scenarios of a replicate
+# (sent to the same worker in turn) are all forked from it
+workerSnapshot = None
+
+#####################################################################
+# Returns the snapshot of the given replicate: the model copied by  #
+# the worker (see ParallelTrials_initWorker) on the network seeded  #
+# by the replicate, with agents keyed to its random streams, run up #
+# to interventionTick. Only simulated once per replicate per worker #
+#####################################################################
+def Hypothetical_getSnapshot(replicate, interventionTick):
+    global workerSnapshot
+    if workerSnapshot is None or \
+        workerSnapshot[:2] != [replicate, interventionTick]:
+        random.seed(replicate)
+        np.random.seed(replicate)
+
+        snapshot = ParallelTrials.workerModel.SMDModel_fork()
+        snapshot.randomKey = replicate
+        snapshot.SMDModel_setNetwork()
+        snapshot.SMDModel_runTicks(interventionTick)
+        workerSnapshot = [replicate, interventionTick, snapshot]
+    return workerSnapshot[2]
+
+#####################################################################
+# Runs a scenario of a replicate, given as [replicate, scenario     #
+# (index in SCENARIOS), interventionTick, paramsDict, results]. The #
+# global generators (i.e. used by the policy) are reseeded with the #
+# same replicate-derived value before every scenario, so that all   #
+# the scenarios of a replicate share the same network and draws     #
+# (paired). Returns the final % depression of the scenario          #
+#####################################################################
+def Hypothetical_runReplicate(replicateSpec):
+    replicate, scenario, interventionTick, paramsDict, results = \
+        replicateSpec
+    snapshot = Hypothetical_getSnapshot(replicate, interventionTick)
+
+    branchSeed = np.random.RandomState(replicate).randint(2 ** 31)
+    return Hypothetical_runScenario([SCENARIOS[scenario][1], snapshot, 
+        paramsDict, results, branchSeed])
+
+#####################################################################
+# Given the final % depression of each scenario (columns) over the  #
+# replicates (rows), returns the ratio of the mean of each scenario #
+# to that of the baseline (first column) along with the bounds of   #
+# its percentile bootstrap CI, resampling replicates (i.e. pairs)   #
+#####################################################################
+def Hypothetical_getRatioIntervals(depressions, confidence=.95, 
+    numBootstrap=1000):
+    depressions = np.asarray(depressions, dtype=float)
+    means = depressions.mean(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = means[1:]/means[0]
+
+        rows = np.random.randint(len(depressions), 
+            size=(numBootstrap, len(depressions)))
+        bootMeans = depressions[rows].mean(axis=1)
+        bootRatios = bootMeans[:, 1:]/bootMeans[:, [0]]
+
+    alpha = (1 - confidence)/2
+    lower = np.nanpercentile(bootRatios, 100 * alpha, axis=0)
+    upper = np.nanpercentile(bootRatios, 100 * (1 - alpha), axis=0)
+    return [ratios, lower, upper]
+
+#####################################################################
+# Replicated version of Hypothetical_findEffectiveness: runs        #
+# numReplicates paired replicates of the baseline and all scenarios #
+# (each replicate on its own network and random streams, shared by  #
+# its scenarios), every scenario of every replicate being run on its#
+# own over numWorkers processes, and outputs the ratio of           #
+# mean % depression to the baseline's with a confidence interval    #
+#####################################################################
+def Hypothetical_findReplicatedEffectiveness(original, final, 
+    numReplicates=32, interventionTick=0, numWorkers=None, 
+    confidence=.95):
+    results, paramsDict = Hypothetical_getInterventionParams(original, 
+        final)
+
+    # One task per scenario of each replicate, so the scenarios run in
+    # parallel too (those of a replicate being consecutive)
+    replicateSpecs = [[replicate, scenario, interventionTick, paramsDict,
+        results] for replicate in range(numReplicates) 
+        for scenario in range(len(SCENARIOS))]
+
+    if numWorkers is None:
+        numWorkers = multiprocessing.cpu_count()
+    numWorkers = min(numWorkers, len(replicateSpecs))
+
+    global workerSnapshot
+    workerSnapshot = None
+    if numWorkers <= 1:
+        ParallelTrials_initWorker(original)
+        runDepressions = list(map(Hypothetical_runReplicate, 
+            replicateSpecs))
+    else:
+        pool = multiprocessing.Pool(numWorkers, 
+            initializer=ParallelTrials_initWorker, initargs=(original,))
+        try:
+            runDepressions = pool.map(Hypothetical_runReplicate, 
+                replicateSpecs)
+        finally:
+            pool.terminate()
+            pool.join()
+    workerSnapshot = None
+
+    depressions = np.reshape(runDepressions, 
+        (numReplicates, len(SCENARIOS)))
+    ratios, lower, upper = Hypothetical_getRatioIntervals(depressions, 
+        confidence)
+
+    effectStr = "Altering {} is {} times as effective as baseline "\
+        "({}% CI: {} to {}, {} replicates)"
+    for i in range(1, len(SCENARIOS)):
+        print(effectStr.format(SCENARIOS[i][0], ratios[i - 1], 
+            int(100 * confidence), lower[i - 1], upper[i - 1], 
+            numReplicates))
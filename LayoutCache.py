@@ -0,0 +1,264 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: LayoutCache.py                                              #
+# Description: Persistent on-disk store of the node layouts used to #
+# visualize networks, keyed by a hash of the graph's contents (nodes#
+# and edges) and of the layout method, so a layout is only computed #
+# once per network. Also provides a scalable force-directed layout: #
+# vectorized Fruchterman-Reingold in which repulsion is exact only  #
+# between nearby nodes and approximated by the centers of mass of   #
+# the cells of a quadtree (Barnes-Hut style) for the rest           #
+#####################################################################
+
+import sys
+import os
+import json
+import hashlib
+import numpy as np
+
+# Bump manually whenever the layout computations change
+LAYOUT_VERSION = 2
+
+# Supported layout methods
+RANDOM_LAYOUT = "random"
+FORCE_LAYOUT = "force"
+
+# Average number of nodes with which nodes share their finest cell of
+# the force layout quadtree, and the deepest level it may be refined to
+NODES_PER_CELL = 16
+MAX_LEVELS = 16
+
+#####################################################################
+# Returns the hash of the contents of the graph (its sorted nodes   #
+# and undirected edges), identifying the network the layout is for  #
+#####################################################################
+def Layout_getGraphKey(G):
+    nodes = sorted(G.nodes())
+    edges = sorted(sorted(edge) for edge in G.edges())
+    fingerprint = json.dumps([nodes, edges])
+    return hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+
+#####################################################################
+# Returns positions (numNodes x 2) drawn uniformly in the unit      #
+# square from a stream of the given seed (not the simulation's one) #
+#####################################################################
+def Layout_random(numNodes, seed=0):
+    return np.random.RandomState(seed).random_sample((numNodes, 2))
+
+#####################################################################
+# Given the number of nodes and the edges (as an array of pairs of  #
+# node indices), returns positions (numNodes x 2, in unit square)   #
+# after the given iterations of Fruchterman-Reingold from a random  #
+# layout, the repulsion being approximated over a quadtree (see     #
+# Layout_getRepulsion)                                              #
+#####################################################################
+def Layout_force(numNodes, edges, iterations=50, seed=0):
+    positions = Layout_random(numNodes, seed)
+    if numNodes < 2:
+        return positions
+
+    k = np.sqrt(1.0/numNodes)
+    temperature = .1
+    cooling = temperature/(iterations + 1)
+
+    for _ in range(iterations):
+        displacement = Layout_getRepulsion(positions, k)
+
+        # Attraction along the edges: d^2/k towards each other
+        if len(edges):
+            delta = positions[edges[:, 0]] - positions[edges[:, 1]]
+            distance = np.maximum(np.sqrt((delta ** 2).sum(axis=1)),
+                1e-9)
+            attraction = delta * (distance/k)[:, np.newaxis]
+            np.add.at(displacement, edges[:, 0], -attraction)
+            np.add.at(displacement, edges[:, 1], attraction)
+
+        # Moves each node by at most the temperature, which cools
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)),
+            1e-9)
+        positions += displacement * (np.minimum(length, temperature)/
+            length)[:, np.newaxis]
+        temperature -= cooling
+
+    # Rescales the layout back into the unit square
+    positions -= positions.min(axis=0)
+    return positions/max(positions.max(), 1e-9)
+
+#####################################################################
+# Given the positions of the nodes and the coordinates of their cell#
+# at some level of the quadtree, returns the occupied cells of that #
+# level as [keys, cells, counts, centers]: the sorted keys of the   #
+# cells (see Layout_getCellKeys), the cell (index in keys) of each  #
+# node and the node count and center of mass of each cell           #
+#####################################################################
+def Layout_getCellMasses(positions, coords):
+    keys, cells, counts = np.unique(Layout_getCellKeys(coords[:, 0], 
+        coords[:, 1]), return_inverse=True, return_counts=True)
+    centers = np.zeros((len(keys), 2))
+    for axis in range(2):
+        centers[:, axis] = np.bincount(cells, positions[:, axis])/counts
+    return [keys, cells, counts, centers]
+
+#####################################################################
+# Returns the keys identifying the cells of the given coordinates   #
+#####################################################################
+def Layout_getCellKeys(cellX, cellY):
+    return (cellX << MAX_LEVELS) | cellY
+
+#####################################################################
+# Returns the indices (in keys, sorted) of the cells of the given   #
+# coordinates, or -1 for those outside the grid or not occupied     #
+#####################################################################
+def Layout_findCells(keys, cellX, cellY, gridSize):
+    isInside = (cellX >= 0) & (cellX < gridSize) & (cellY >= 0) & \
+        (cellY < gridSize)
+    cellKeys = Layout_getCellKeys(np.where(isInside, cellX, 0), 
+        np.where(isInside, cellY, 0))
+    cells = np.minimum(np.searchsorted(keys, cellKeys), len(keys) - 1)
+    return np.where(isInside & (keys[cells] == cellKeys), cells, -1)
+
+#####################################################################
+# Returns the repulsion (k^2/d away from each other node) on each   #
+# node, Barnes-Hut style over a quadtree of the bounding square of  #
+# the nodes (level l splitting it into 2^l x 2^l cells, only those  #
+# occupied being stored). Opening criterion: a cell is only used as #
+# a whole (its center of mass) if it is not adjacent to the node's  #
+# own cell of its level, so it is seen at an angle of at most about #
+# a cell width; adjacent cells are opened into their children at the#
+# next level. At each level this leaves the at most 27 children of  #
+# the cells adjacent to the node's parent that are not adjacent to  #
+# its cell. The tree is refined until the nodes share their (finest)#
+# cell with about NODES_PER_CELL nodes on average, however they are #
+# clustered: nodes of adjacent finest cells repel exactly           #
+#####################################################################
+def Layout_getRepulsion(positions, k):
+    numNodes = len(positions)
+    lower = positions.min(axis=0)
+    extent = max((positions.max(axis=0) - lower).max(), 1e-9)
+    deepestSize = 2 ** MAX_LEVELS
+    deepestCoords = np.minimum(((positions - lower)/extent * deepestSize)
+        .astype(np.int64), deepestSize - 1)
+
+    # Levels coarser than that of uniformly spread nodes are too coarse
+    numLevels = min(MAX_LEVELS, max(0, int(np.log(numNodes/
+        NODES_PER_CELL)/np.log(4))))
+    while numLevels < MAX_LEVELS:
+        coords = deepestCoords >> (MAX_LEVELS - numLevels)
+        counts = np.unique(Layout_getCellKeys(coords[:, 0], coords[:, 1]),
+            return_counts=True)[1]
+        if (counts ** 2).sum() <= NODES_PER_CELL * numNodes:
+            break
+        numLevels += 1
+
+    repulsion = np.zeros(positions.shape)
+
+    # Far field: the children of the cells around the node's parent 
+    # cell that are not adjacent to its own (none below level 2), as
+    # found once per occupied cell for all of its nodes
+    for level in range(2, numLevels + 1):
+        gridSize = 2 ** level
+        coords = deepestCoords >> (MAX_LEVELS - level)
+        keys, nodeCells, counts, centers = Layout_getCellMasses(positions,
+            coords)
+
+        cellX, cellY = keys >> MAX_LEVELS, keys & (deepestSize - 1)
+        for offsetX in range(6):
+            otherX = 2 * (cellX >> 1) - 2 + offsetX
+            for offsetY in range(6):
+                otherY = 2 * (cellY >> 1) - 2 + offsetY
+                others = np.where((np.abs(otherX - cellX) > 1) | 
+                    (np.abs(otherY - cellY) > 1), Layout_findCells(keys, 
+                    otherX, otherY, gridSize), -1)[nodeCells]
+                nodes = np.nonzero(others >= 0)[0]
+                others = others[nodes]
+
+                delta = positions[nodes] - centers[others]
+                distanceSq = np.maximum((delta ** 2).sum(axis=1), 1e-9)
+                repulsion[nodes] += delta * (counts[others]/
+                    distanceSq)[:, np.newaxis]
+
+    # Near field: exact among the nodes of each 3x3 block of cells
+    gridSize = 2 ** numLevels
+    coords = deepestCoords >> (MAX_LEVELS - numLevels)
+    keys, cells, counts, _ = Layout_getCellMasses(positions, coords)
+    order = np.argsort(cells, kind="mergesort")
+    starts = np.concatenate([[0], np.cumsum(counts)])
+
+    cellX, cellY = keys >> MAX_LEVELS, keys & (deepestSize - 1)
+    neighborCells = np.stack([Layout_findCells(keys, cellX + offsetX,
+        cellY + offsetY, gridSize) for offsetX in (-1, 0, 1) 
+        for offsetY in (-1, 0, 1)], axis=1)
+    for cell in range(len(keys)):
+        members = order[starts[cell]:starts[cell + 1]]
+        neighbors = np.concatenate([order[starts[other]:
+            starts[other + 1]] for other in neighborCells[cell] 
+            if other >= 0])
+
+        delta = positions[members][:, np.newaxis, :] - \
+            positions[neighbors][np.newaxis, :, :]
+        distanceSq = np.maximum((delta ** 2).sum(axis=2), 1e-9)
+        repulsion[members] += (delta/distanceSq[:, :, np.newaxis])\
+            .sum(axis=1)
+    return repulsion * k * k
+
+class LayoutCache:
+    #################################################################
+    # Initializes the cache stored in the given directory           #
+    #################################################################
+    def __init__(self, directory="Results\\Cache\\Layouts"):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    #################################################################
+    # Given the graph and layout (method and its parameters),       #
+    # returns the key: the hash of the graph's contents and layout  #
+    #################################################################
+    def LayoutCache_getKey(self, G, method, iterations, seed):
+        fingerprint = json.dumps([LAYOUT_VERSION, Layout_getGraphKey(G),
+            method, iterations, seed])
+        return hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+
+    #################################################################
+    # Given a key, returns the file in which the layout is stored:  #
+    # layouts are sharded by the first characters of their key      #
+    #################################################################
+    def LayoutCache_getPath(self, key):
+        return os.path.join(self.directory, key[:2], key + ".npz")
+
+    #################################################################
+    # Returns the layout of the graph (dictionary of node to its    #
+    # position) by the given method (RANDOM_LAYOUT or FORCE_LAYOUT, #
+    # run for iterations), loaded from disk if computed before and  #
+    # otherwise computed and stored                                 #
+    #################################################################
+    def LayoutCache_getLayout(self, G, method=RANDOM_LAYOUT,
+        iterations=50, seed=0):
+        key = self.LayoutCache_getKey(G, method, iterations, seed)
+        layoutPath = self.LayoutCache_getPath(key)
+        if os.path.exists(layoutPath):
+            try:
+                with np.load(layoutPath) as stored:
+                    nodes, positions = stored["nodes"], stored["positions"]
+                self.hits += 1
+                return dict(zip(nodes.tolist(), positions))
+            except (IOError, ValueError, KeyError) as e:
+                sys.stderr.write("Discarding unreadable layout {}: {}\n"\
+                    .format(layoutPath, e))
+        self.misses += 1
+
+        nodes = list(G.nodes())
+        if method == FORCE_LAYOUT:
+            index = dict((node, i) for i, node in enumerate(nodes))
+            edges = np.array([[index[u], index[v]] for u, v in G.edges()],
+                dtype=int).reshape(-1, 2)
+            positions = Layout_force(len(nodes), edges, iterations, seed)
+        else:
+            positions = Layout_random(len(nodes), seed)
+
+        layoutDir = os.path.dirname(layoutPath)
+        if not os.path.isdir(layoutDir):
+            os.makedirs(layoutDir)
+        with open(layoutPath, 'wb') as f:
+            np.savez(f, nodes=np.array(nodes), positions=positions)
+        return dict(zip(nodes, positions))
@@ -0,0 +1,156 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: Metrics.py                                                  #
+# Description: Registry of the summary metrics of a network (i.e.   #
+# % depressed, % concealed, mean support), each declaring once which#
+# attribute it reduces over which agents and how. Any set of metrics#
+# is then computed in a single fused pass over the agents, cheap    #
+# enough to record the metrics as time series at every tick         #
+#####################################################################
+
+import sys
+import os
+import csv
+import math
+
+# Populations of agents over which metrics are reduced
+MINORITY = "minority"
+ALL_AGENTS = "all"
+
+# Reductions of the values of an attribute over a population: mean
+# (scaled by the given scale, i.e. a fraction of the maximal total),
+# fraction of agents for which the attribute is true, or the std
+MEAN = "mean"
+FRACTION = "fraction"
+STD = "std"
+
+# Registered metrics by name: [attribute, population, reduction, scale]
+METRICS = {}
+
+#####################################################################
+# Registers the metric of the given name: the reduction (one of MEAN,#
+# FRACTION, STD) of the agent attribute over the population (one of #
+# MINORITY, ALL_AGENTS), divided by scale (for MEAN). Attribute may  #
+# also be the name of a network base property (population None)     #
+#####################################################################
+def Metrics_register(name, attr, population, reduction=MEAN, scale=1.0):
+    METRICS[name] = [attr, population, reduction, scale]
+
+# Metrics of NetworkBase_findPercentAttr (percentage and fractions of
+# minority) along with the support over all agents and policy score
+Metrics_register("depression", "isDepressed", MINORITY, FRACTION)
+Metrics_register("concealed", "isConcealed", MINORITY, FRACTION)
+Metrics_register("discrimination", "discrimination", MINORITY, MEAN, .25)
+Metrics_register("depressionLevel", "currentDepression", MINORITY, MEAN,
+    .25)
+Metrics_register("concealLevel", "probConceal", MINORITY, MEAN, .125)
+Metrics_register("supportMean", "support", ALL_AGENTS, MEAN)
+Metrics_register("supportStd", "support", ALL_AGENTS, STD)
+Metrics_register("minoritySupport", "support", MINORITY, MEAN)
+Metrics_register("attitude", "attitude", ALL_AGENTS, MEAN)
+Metrics_register("policyScore", "policyScore", None)
+
+# Metrics forming the result vector of Sensitivity_runSimulation
+SENSITIVITY_METRICS = ["depression", "concealed", "discrimination",
+    "supportMean", "policyScore"]
+
+#####################################################################
+# Computes the given metrics (names of registered metrics) of the   #
+# network base in a single pass over its agents, accumulating the   #
+# count, sum and sum of squares of each (attribute, population)     #
+# needed. Metrics over no agents are 0. Returns the list of values  #
+# in the order of the names given                                   #
+#####################################################################
+def Metrics_compute(network, names):
+    COUNT_INDEX = 0
+    SUM_INDEX = 1
+    SQUARES_INDEX = 2
+
+    # Accumulators needed by the metrics, keyed by (attr, population)
+    accumulators = {}
+    for name in names:
+        attr, population, reduction, scale = METRICS[name]
+        if population is not None:
+            accumulators[(attr, population)] = [0, 0.0, 0.0]
+
+    minorityKeys = [key for key in accumulators if key[1] == MINORITY]
+    allKeys = [key for key in accumulators if key[1] == ALL_AGENTS]
+
+    for agent in network.Agents.values():
+        curKeys = allKeys
+        if agent.isMinority:
+            curKeys = allKeys + minorityKeys
+        for key in curKeys:
+            value = getattr(agent, key[0])
+            curAccumulator = accumulators[key]
+            curAccumulator[COUNT_INDEX] += 1
+            curAccumulator[SUM_INDEX] += value
+            curAccumulator[SQUARES_INDEX] += value * value
+
+    values = []
+    for name in names:
+        attr, population, reduction, scale = METRICS[name]
+        if population is None:
+            values.append(getattr(network, attr))
+            continue
+
+        count, total, squares = accumulators[(attr, population)]
+        if not count:
+            values.append(0.0)
+        elif reduction == FRACTION:
+            values.append(total/count)
+        elif reduction == MEAN:
+            values.append(total/(count * scale))
+        else:
+            mean = total/count
+            values.append(math.sqrt(max(squares/count - mean * mean, 0.0)))
+    return values
+
+class MetricSeries:
+    #################################################################
+    # Initializes the series of the given metrics, recorded every   #
+    # sampleRate ticks once added as an observer of the simulation  #
+    #################################################################
+    def __init__(self, names=None, sampleRate=1):
+        if names is None:
+            names = sorted(METRICS)
+        self.names = names
+        self.sampleRate = sampleRate
+
+        self.times = []
+        self.series = [[] for _ in names]
+
+    #################################################################
+    # Observer hook called (via ObserverSink) after each tick:      #
+    # records the metrics of the current tick (single pass)         #
+    #################################################################
+    def Observer_observeTick(self, network, time):
+        if time % self.sampleRate:
+            return
+
+        self.times.append(time)
+        for i, value in enumerate(Metrics_compute(network, self.names)):
+            self.series[i].append(value)
+
+    #################################################################
+    # Returns the series (one value per recorded time) of a metric  #
+    #################################################################
+    def MetricSeries_getSeries(self, name):
+        return self.series[self.names.index(name)]
+
+    #################################################################
+    # Writes the series to resultsFile: a row per recorded tick with #
+    # a column for each of the metrics                              #
+    #################################################################
+    def MetricSeries_writeSeries(self,
+        resultsFile="Results\\TimeResults\\Metric_Series.csv"):
+        resultsDir = os.path.dirname(resultsFile)
+        if resultsDir and not os.path.isdir(resultsDir):
+            os.makedirs(resultsDir)
+
+        with open(resultsFile, 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(["time"] + self.names)
+            for t in range(len(self.times)):
+                writer.writerow([self.times[t]] + [curSeries[t]
+                    for curSeries in self.series])
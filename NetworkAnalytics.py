@@ -0,0 +1,158 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: NetworkAnalytics.py                                         #
+# Description: Vectorized analytics of the state of a network: the  #
+# agent attributes and graph edges are extracted once into arrays,  #
+# from which the minority densities, z-scores and all the odds ratio#
+# variants of NetworkBase_getDepressOdds are computed in single     #
+# array passes rather than per agent (and per neighbor) lookups     #
+#####################################################################
+
+import sys
+import os
+import numpy as np
+
+from NetworkBase import DENSITY_DEPENDENCIES, SUPPORT_DEPENDENCIES
+
+# Z-score above which agents are considered supported (NO_SUPPORT) and
+# of high minority density (lower end of cutoffRange), as used by
+# NetworkBase_getDepressOdds
+SUPPORT_CUTOFF = .75
+DENSITY_CUTOFF = .90
+
+#####################################################################
+# Extracts the attributes of all the agents of the network base into#
+# arrays (ordered as network.Agents), returned in a dictionary with #
+# the index of each agentID under "index"                           #
+#####################################################################
+def NetworkAnalytics_getStateArrays(network):
+    agents = list(network.Agents.values())
+    getArray = lambda attr, dtype: np.fromiter((getattr(agent, attr)
+        for agent in agents), dtype=dtype, count=len(agents))
+
+    return {
+        "index": dict((agent.agentID, i) for i, agent in enumerate(agents)),
+        "isMinority": getArray("isMinority", bool),
+        "isConcealed": getArray("isConcealed", bool),
+        "probConceal": getArray("probConceal", float),
+        "support": getArray("support", float),
+        "discrimination": getArray("discrimination", float),
+        "depression": getArray("currentDepression", float)
+    }
+
+#####################################################################
+# Returns the edges of the network's graph as [sources, targets]    #
+# index arrays (in terms of the state array indices), including each#
+# undirected edge in both directions                                #
+#####################################################################
+def NetworkAnalytics_getEdgeArrays(network, state):
+    index = state["index"]
+    edges = network.G.edges()
+    numEdges = len(edges)
+    flat = np.fromiter((index[node] for edge in edges for node in edge),
+        dtype=np.int64, count=2 * numEdges).reshape(numEdges, 2)
+    sources = np.concatenate([flat[:, 0], flat[:, 1]])
+    targets = np.concatenate([flat[:, 1], flat[:, 0]])
+    return [sources, targets]
+
+#####################################################################
+# Computes the minority density of every agent, as by               #
+# NetworkBase_findPercentConnectedMinority: the sum over neighbors  #
+# of probConceal^2 for unconcealed minority neighbors divided by the#
+# number of neighbors (0 for agents without neighbors)              #
+#####################################################################
+def NetworkAnalytics_getDensities(state, edges):
+    sources, targets = edges
+    numAgents = len(state["isMinority"])
+
+    isVisible = state["isMinority"] & ~state["isConcealed"]
+    contributions = np.where(isVisible, state["probConceal"] ** 2, 0.0)
+
+    totals = np.bincount(sources, weights=contributions[targets],
+        minlength=numAgents)
+    degrees = np.bincount(sources, minlength=numAgents)
+    return np.divide(totals, degrees, out=np.zeros(numAgents),
+        where=degrees > 0)
+
+#####################################################################
+# Returns the odds of depression given the depressions of the agents#
+# counted and the number of agents by which the total is divided,   #
+# as in NetworkBase_getDepressOdds (0 if no agents are counted)     #
+#####################################################################
+def NetworkAnalytics_getOdds(depressions, count):
+    if not count:
+        return 0.0
+    prob = np.sum(depressions)/count
+    return prob/(1 - prob)
+
+#####################################################################
+# Returns the ratio of two odds, 0 if the denominator is 0 (as done #
+# in Sensitivity_oddRatioTests)                                     #
+#####################################################################
+def NetworkAnalytics_getRatio(numerator, denominator):
+    if not denominator:
+        return 0.0
+    return numerator/denominator
+
+#####################################################################
+# Computes, for the network base, the values compared against the   #
+# literature (see Sensitivity_computeOddRatios) from arrays: the    #
+# prevalence of discrimination and the minority, support and density#
+# odds ratios. The mean/std of the density and minority support are #
+# shared with the network base's cache of derived statistics        #
+#####################################################################
+def NetworkAnalytics_computeOddRatios(network):
+    MAX_DISCRIMINATE = .25
+
+    state = NetworkAnalytics_getStateArrays(network)
+    isMinority = state["isMinority"]
+    depression = state["depression"]
+    numMinority = int(np.sum(isMinority))
+
+    values = [0.0]
+    if numMinority:
+        values[0] = np.sum(state["discrimination"][isMinority])/\
+            (numMinority * MAX_DISCRIMINATE)
+
+    # Minority: all minority vs. all non-minority agents
+    minDepression = depression[isMinority]
+    minorityOdds = NetworkAnalytics_getOdds(minDepression, numMinority)
+    nonMinorityOdds = NetworkAnalytics_getOdds(depression[~isMinority],
+        len(depression) - numMinority)
+    values.append(NetworkAnalytics_getRatio(minorityOdds, nonMinorityOdds))
+
+    # Support: minority without vs. with support (both over all minority)
+    supportOdds = [0.0, 0.0]
+    if numMinority:
+        minSupport = state["support"][isMinority]
+        network.supportMean, network.supportStd = network.\
+            NetworkBase_getCachedStat("support", SUPPORT_DEPENDENCIES, 
+            lambda: [np.mean(minSupport), np.std(minSupport)])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            supportZ = (minSupport - network.supportMean)/\
+                network.supportStd
+        isSupported = supportZ > SUPPORT_CUTOFF
+        supportOdds = [NetworkAnalytics_getOdds(
+            minDepression[~isSupported], numMinority), 
+            NetworkAnalytics_getOdds(minDepression[isSupported], 
+            numMinority)]
+    values.append(NetworkAnalytics_getRatio(*supportOdds))
+
+    # Density: minority of high density (over those) vs. all minority
+    if numMinority:
+        densities = NetworkAnalytics_getDensities(state,
+            NetworkAnalytics_getEdgeArrays(network, state))
+        network.densityMean, network.densityStd = network.\
+            NetworkBase_getCachedStat("density", DENSITY_DEPENDENCIES, 
+            lambda: [np.mean(densities), np.std(densities)])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            densityZ = (densities[isMinority] - network.densityMean)/\
+                network.densityStd
+        isDense = densityZ > DENSITY_CUTOFF
+        densityOdds = NetworkAnalytics_getOdds(minDepression[isDense],
+            int(np.sum(isDense)))
+    else:
+        densityOdds = 0.0
+    values.append(NetworkAnalytics_getRatio(densityOdds, minorityOdds))
+
+    return [float(value) for value in values]
@@ -8,11 +8,13 @@
 import sys
 import os
 import random
-from numpy import array, zeros, std, mean, sqrt
+from numpy import array, zeros, std, mean, sqrt, fromiter, where, \
+    newaxis
 
 from Verification import *
 from Policy import Policy
 from Switch import switch
+from NetworkRenderer import NetworkRenderer, NetworkRenderer_getScene
 
 import matplotlib.pyplot as plt
 from operator import itemgetter 
@@ -23,6 +25,24 @@ except ImportError:
     raise ImportError("You must install NetworkX:\
     (http://networkx.lanl.gov/) for SE simulation")
 
+# Pseudo-fields versioning the set of agents and the graph (bumped
+# when either is replaced or the edges of the graph change)
+AGENTS_VERSION = "agents"
+GRAPH_VERSION = "graph"
+
+# State fields on which the derived statistics depend
+DENSITY_DEPENDENCIES = ["isMinority", "isConcealed", "probConceal", 
+    GRAPH_VERSION]
+SUPPORT_DEPENDENCIES = ["isMinority", "support"]
+VISUAL_DEPENDENCIES = ["isMinority", "isDepressed", "isConcealed", 
+    GRAPH_VERSION]
+
+# Colors (RGBA) of depressed and non-depressed agents in the display,
+# along with the opacity of concealed agents
+DEPRESSED_COLOR = [1.0, 0.0, 0.0, 1.0]
+NON_DEPRESSED_COLOR = [0.0, 0.0, 1.0, 1.0]
+CONCEALED_OPACITY = .5
+
 class NetworkBase:
     #################################################################
     # Initializes the base of the network with the type it is to be #
@@ -43,18 +63,19 @@ class NetworkBase:
         self.completePolicies = []        
         self.incompletePolicies = []
         
-        # Used for "caching": stores results after first calculation
-        # since remain constant throughout simulation
-        self.networkSES = 0
-        self.localSES = {}
-
-        # Parameters to be set later: default to 0 (False) -> not set
-        # used to determine the mean/std values for density in network
+        # Versions of each agent field (bumped whenever an agent sets
+        # it), of the set of agents and of the graph, along with the
+        # derived statistics cached as [versions, value] by name
+        self.stateVersions = {}
+        self.statCache = {}
+
+        # Last determined mean/std values for density in network (kept
+        # up to date by NetworkBase_setMeanStdDensity)
         self.densityMean = 0 
         self.densityStd = 0
 
-        # Parameters to be set later: default to 0 (False) -> not set
-        # used to determine the mean/std values for support in network
+        # Last determined mean/std values for support in network (kept
+        # up to date by NetworkBase_setMeanStdSupport)
         self.supportMean = 0 
         self.supportStd = 0
 
@@ -62,6 +83,10 @@ class NetworkBase:
         # for the policy score
         self.policyCap = 10 * timeSpan
 
+        # Keyed streams for common random numbers: if not set, agents
+        # draw from the standard (global) random generator
+        self.randomStreams = None
+
     #################################################################
     # Given parameters for initializing the network base, ensures   #
     # it is legal                                                   #  
@@ -76,12 +101,56 @@ class NetworkBase:
     #################################################################
     def NetworkBase_setGraph(self, G):
         self.G = G
+        self.NetworkBase_bumpVersion(GRAPH_VERSION)
 
     #################################################################
     # Given dictionary of agents, assigns them for this network     #
     #################################################################
     def NetworkBase_setAgents(self, agents):
         self.Agents = agents
+        self.NetworkBase_bumpVersion(AGENTS_VERSION)
+
+    #################################################################
+    # Marks the given state field (agent attribute name, or one of  #
+    # AGENTS_VERSION/GRAPH_VERSION) as changed                      #
+    #################################################################
+    def NetworkBase_bumpVersion(self, field):
+        self.stateVersions[field] = self.stateVersions.get(field, 0) + 1
+
+    #################################################################
+    # Returns the statistic called name, which depends on the given #
+    # state fields (and always on the set of agents): the cached    #
+    # value if none of these has changed since it was computed and  #
+    # otherwise the value of compute() (which is then cached)       #
+    #################################################################
+    def NetworkBase_getCachedStat(self, name, dependencies, compute):
+        versions = tuple(self.stateVersions.get(field, 0) 
+            for field in [AGENTS_VERSION] + dependencies)
+        cached = self.statCache.get(name)
+        if cached is not None and cached[0] == versions:
+            return cached[1]
+
+        value = compute()
+        self.statCache[name] = [versions, value]
+        return value
+
+    #################################################################
+    # Given RandomStreams (or None to use the global generator),    #
+    # assigns them as the source of the agents' per-tick draws      #
+    #################################################################
+    def NetworkBase_setRandomStreams(self, randomStreams):
+        self.randomStreams = randomStreams
+
+    #################################################################
+    # Returns a uniform draw in [0, 1) for the decision made by the #
+    # agent with agentID at the given time and decision site: keyed #
+    # by all three if common random numbers are being used          #
+    #################################################################
+    def NetworkBase_getUniform(self, agentID, time, site):
+        if self.randomStreams is None:
+            return random.random()
+        return self.randomStreams.RandomStreams_uniform(agentID, time, 
+            site)
 
     #################################################################
     # Simulates updating all agents in network over a single time   #
@@ -136,6 +205,7 @@ class NetworkBase:
     #################################################################
     def NetworkBase_addEdges(self, nodeList):
         self.G.add_edges_from(nodeList)
+        self.NetworkBase_bumpVersion(GRAPH_VERSION)
 
     #################################################################
     # Given two agents in the graph, respectively with IDs agentID1 #
@@ -143,6 +213,7 @@ class NetworkBase:
     #################################################################
     def NetworkBase_removeEdge(self, agentID1, agentID2):
         self.G.remove_edge(agentID1, agentID2)
+        self.NetworkBase_bumpVersion(GRAPH_VERSION)
 
     #################################################################
     # Returns all the edges present in the graph associated with the#
@@ -454,15 +525,22 @@ class NetworkBase:
     # of density to the corresponding values of the network         #
     #################################################################
     def NetworkBase_setMeanStdDensity(self):
+        self.densityMean, self.densityStd = self.NetworkBase_getCachedStat(
+            "density", DENSITY_DEPENDENCIES, 
+            self.NetworkBase_computeMeanStdDensity)
+
+    #################################################################
+    # Computes the [mean, std] of the density of minority connected #
+    # to each agent over all the agents of the network              #
+    #################################################################
+    def NetworkBase_computeMeanStdDensity(self):
         agents = self.NetworkBase_getAgentArray()
         densityArr = []
         for agent in agents:
             densityArr.append(
                 self.NetworkBase_findPercentConnectedMinority(agent, 
                     firstDegree=True))
-
-        self.densityMean = mean(densityArr)
-        self.densityStd = std(densityArr)
+        return [mean(densityArr), std(densityArr)]
 
     #################################################################
     # Sets the network properties of mean density and std deviation #
@@ -470,6 +548,21 @@ class NetworkBase:
     # also specify whether want the mean/std for just minority/not  #
     #################################################################
     def NetworkBase_setMeanStdSupport(self, onlyMinority=True):
+        if not onlyMinority:
+            return self.NetworkBase_getCachedStat("supportAll", 
+                SUPPORT_DEPENDENCIES, lambda: 
+                self.NetworkBase_computeMeanStdSupport(onlyMinority))
+
+        # Only sets the minority mean/std to the network properties
+        self.supportMean, self.supportStd = self.NetworkBase_getCachedStat(
+            "support", SUPPORT_DEPENDENCIES, 
+            self.NetworkBase_computeMeanStdSupport)
+
+    #################################################################
+    # Computes the [mean, std] of support over the minority agents  #
+    # (or all agents if onlyMinority is False)                      #
+    #################################################################
+    def NetworkBase_computeMeanStdSupport(self, onlyMinority=True):
         if not onlyMinority:
             agents = self.NetworkBase_getAgentArray()
         else: agents = self.NetworkBase_getMinorityNodes()
@@ -477,22 +570,15 @@ class NetworkBase:
         supportArr = []
         for agent in agents:
             supportArr.append(agent.support)
-
-        if not onlyMinority:
-            return [mean(supportArr), std(supportArr)]
-
-        # Only sets the minority mean/std to the network properties
-        self.supportMean = mean(supportArr)
-        self.supportStd = std(supportArr)
+        return [mean(supportArr), std(supportArr)]
 
     #################################################################
     # Given an agent, determines his corresponding z-score for the  #
     # density of LGBs in his network                                #
     #################################################################
     def NetworkBase_getDensityZScore(self, agent):
-        # Sets the densities only if not already determined
-        if not (self.densityMean and self.densityStd):
-            self.NetworkBase_setMeanStdDensity()
+        # Only recomputed if the network has changed since last found
+        self.NetworkBase_setMeanStdDensity()
 
         curVal = self.NetworkBase_findPercentConnectedMinority(agent)
         mean = self.densityMean
@@ -505,9 +591,8 @@ class NetworkBase:
     # support of LGBs in his network                                #
     #################################################################
     def NetworkBase_getSupportZScore(self, agent): 
-        # Sets the densities only if not already determined
-        if not (self.supportMean and self.supportStd):
-            self.NetworkBase_setMeanStdSupport()
+        # Only recomputed if the network has changed since last found
+        self.NetworkBase_setMeanStdSupport()
 
         curVal = agent.support
         mean = self.supportMean
@@ -617,27 +702,30 @@ class NetworkBase:
         return mean(array)
 
     #################################################################
-    # Determines the network average for socio-economic status and  #
-    # storeS as property of network (since const)                   #
+    # Determines the network average for socio-economic status (only#
+    # recomputed if the SES of an agent has changed)                #
     #################################################################
     def NetworkBase_getNetworkSES(self):
-        SEStotal = 0
-        for agent in self.Agents:
-            SEStotal += self.Agents[agent].currentSES
-
-        self.networkSES = SEStotal/len(self.Agents)
-        return self.networkSES
+        return self.NetworkBase_getCachedStat("networkSES", ["currentSES"],
+            lambda: self.NetworkBase_computeNetworkAvg("currentSES"))
 
     #################################################################
     # Determines the network average for sexual minority attitude   #
+    # (only recomputed if the attitude of an agent has changed)     #
     #################################################################
     def NetworkBase_getNetworkAttitude(self):
-        SEStotal = 0
-        for agent in self.Agents:
-            SEStotal += self.Agents[agent].attitude
+        return self.NetworkBase_getCachedStat("networkAttitude", 
+            ["attitude"], 
+            lambda: self.NetworkBase_computeNetworkAvg("attitude"))
 
-        self.networkSES = SEStotal/len(self.Agents)
-        return self.networkSES
+    #################################################################
+    # Computes the average of the given attribute over all agents   #
+    #################################################################
+    def NetworkBase_computeNetworkAvg(self, attr):
+        total = 0
+        for agent in self.Agents:
+            total += getattr(self.Agents[agent], attr)
+        return total/len(self.Agents)
 
     #################################################################
     # Determines the cumulative influence, as defined by the model, #
@@ -668,30 +756,46 @@ class NetworkBase:
         return maxInfluence
 
     #################################################################
-    # Assigns to each nodes the appropriate visual attributes, with #
-    # those nodes with wellness coaches given a color of red and    #
-    # those without blue along with an opacity corresponding to SE  #
+    # Returns the visual attributes of the nodes of the graph as    #
+    # [nodes, shapes, colors]: the node (agentID) list, the marker  #
+    # of each (minorities as squares) and their RGBA colors (red if #
+    # depressed and blue otherwise, half opaque if concealed).      #
+    # Cached: until a minority, depression or concealment flag of an#
+    # agent takes a new value (or the graph changes), the same      #
+    # arrays are returned without a pass over the agents, and the   #
+    # renderers skip their color update on seeing the same array    #
     #################################################################
-    def NetworkBase_addVisualAttributes(self):
-        # Iterate through each of the nodes present in the graph and
-        # finds respective agent
-        for agentID in self.G.nodes():
-            curAgent = self.Agents[agentID]
+    def NetworkBase_getVisualState(self):
+        return self.NetworkBase_getCachedStat("visual", 
+            VISUAL_DEPENDENCIES, self.NetworkBase_computeVisualState)
 
-            # Marks depressed agents as red nodes and blue otherwise
-            self.G.node[agentID]['color'] = 'red'
-            if not curAgent.isDepressed:
-                self.G.node[agentID]['color'] = 'blue'
+    #################################################################
+    # Computes the visual attributes (see getVisualState)           #
+    #################################################################
+    def NetworkBase_computeVisualState(self):
+        nodes = list(self.G.nodes())
+
+        # Displays sexual minority as different shape than others
+        shapes = ['s' if self.Agents[agentID].isMinority else 'o'
+            for agentID in nodes]
+        return [nodes, shapes, self.NetworkBase_getNodeColors(nodes)]
+
+    #################################################################
+    # Returns the RGBA colors of the given nodes (agentIDs) in the  #
+    # display, only visiting their agents (see getVisualState)      #
+    #################################################################
+    def NetworkBase_getNodeColors(self, nodes):
+        agents = [self.Agents[agentID] for agentID in nodes]
+        getArray = lambda attr: fromiter((getattr(agent, attr) 
+            for agent in agents), dtype=bool, count=len(agents))
 
-            # Displays sexual minority as different shape than others
-            self.G.node[agentID]['shape'] = 'o'
-            if curAgent.isMinority:
-                self.G.node[agentID]['shape'] = 's'
+        # Marks depressed agents as red nodes and blue otherwise
+        colors = where(getArray("isDepressed")[:, newaxis], 
+            DEPRESSED_COLOR, NON_DEPRESSED_COLOR)
 
-            # Makes concealed agents less "visible" in display 
-            self.G.node[agentID]['opacity'] = 1.0
-            if curAgent.isConcealed:
-                self.G.node[agentID]['opacity'] = .5
+        # Makes concealed agents less "visible" in display 
+        colors[getArray("isConcealed"), 3] = CONCEALED_OPACITY
+        return colors
 
     #################################################################
     # Provides graphical display of the population, color coded to  #
@@ -702,18 +806,9 @@ class NetworkBase:
     # pos provides the initial layout for the visual display        #
     #################################################################
     def NetworkBase_visualizeNetwork(self, toShow, time, pos):
-        self.NetworkBase_addVisualAttributes()
-
-        plt.figure(figsize=(12,12))
-        for node in self.G.nodes():
-            nx.draw_networkx_nodes(self.G,pos, nodelist=[node], 
-                node_color=self.G.node[node]['color'],
-                node_size=500, node_shape=self.G.node[node]['shape'], 
-                alpha=self.G.node[node]['opacity'])
-        nx.draw_networkx_edges(self.G,pos,width=1.0,alpha=.5)
-
-        plt.title("Sexual Minority vs Depression at Time {}".format(time))
-        plt.savefig("Results\\TimeResults\\timestep{}.png".format(time))
-        if toShow: 
-            plt.show()
-        plt.close()
\ No newline at end of file
+        renderer = NetworkRenderer(NetworkRenderer_getScene(self, pos), 
+            self.NetworkBase_getVisualState()[2])
+        renderer.NetworkRenderer_render(time, 
+            "Results\\TimeResults\\timestep{}.png".format(time), 
+            toShow=toShow)
+        renderer.NetworkRenderer_close()
\ No newline at end of file
@@ -0,0 +1,240 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: NetworkRenderer.py                                          #
+# Description: Renders frames of the network display. The figure,   #
+# the edges and one scatter collection per node shape are built     #
+# once: later frames only update the colors of the nodes that have  #
+# changed, rather than redrawing the graph node by node             #
+#####################################################################
+
+import sys
+import os
+import random
+import numpy as np
+
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+
+#####################################################################
+# Returns the static scene of the network base at the fixed node    #
+# positions pos (dictionary of agentID to coordinates), as [nodes,  #
+# isMinority, coordinates, segments, indices]: the agentIDs of the  #
+# nodes drawn, whether each is a minority (drawn as a square), their#
+# positions, the edge segments drawn and the indices of the nodes   #
+# drawn among those of NetworkBase_getVisualState (None if all are).#
+# For large networks, a level of detail is set by maxNodes (nodes   #
+# drawn, sampled by stratum of visual class so the proportions of   #
+# minority/depressed/concealed are kept) and maxEdges (random subset#
+# of the edges among the nodes drawn, found from the adjacency of   #
+# the nodes drawn rather than all the edges). Sampling uses its own #
+# stream (seeded by seed) so as not to affect the simulation        #
+#####################################################################
+def NetworkRenderer_getScene(network, pos, maxNodes=None, maxEdges=None,
+    seed=0):
+    nodes, shapes, colors = network.NetworkBase_getVisualState()
+    randomStream = random.Random(seed)
+
+    indices = None
+    if maxNodes is not None and len(nodes) > maxNodes:
+        indices = NetworkRenderer_sampleStrata(shapes, colors, maxNodes,
+            randomStream)
+        nodes = [nodes[i] for i in indices]
+
+        # Each edge among the nodes drawn is found from its first node
+        order = dict((node, i) for i, node in enumerate(nodes))
+        edges = [[u, v] for u in nodes for v in network.G.neighbors(u)
+            if order.get(v, -1) > order[u]]
+    else:
+        edges = [[u, v] for u, v in network.G.edges()]
+    if maxEdges is not None and len(edges) > maxEdges:
+        edges = randomStream.sample(edges, maxEdges)
+
+    isMinority = np.fromiter((network.Agents[node].isMinority 
+        for node in nodes), dtype=bool, count=len(nodes))
+    coordinates = np.array([pos[node] for node in nodes])
+    segments = np.array([[pos[u], pos[v]] for u, v in edges]).reshape(
+        -1, 2, 2)
+    return [nodes, isMinority, coordinates, segments, indices]
+
+#####################################################################
+# Returns (sorted) indices of numSamples nodes sampled from each of #
+# the strata (nodes of the same shape and color) in proportion to   #
+# its size, allotting the remaining samples by largest remainder    #
+#####################################################################
+def NetworkRenderer_sampleStrata(shapes, colors, numSamples, 
+    randomStream):
+    strata = {}
+    for i in range(len(shapes)):
+        key = (shapes[i], tuple(colors[i]))
+        strata.setdefault(key, []).append(i)
+
+    keys = sorted(strata)
+    quotas = [len(strata[key]) * numSamples/len(shapes) for key in keys]
+    counts = [int(quota) for quota in quotas]
+    remainders = sorted(range(len(keys)), 
+        key=lambda k: quotas[k] - counts[k], reverse=True)
+    for k in remainders[:numSamples - sum(counts)]:
+        counts[k] += 1
+
+    indices = []
+    for key, count in zip(keys, counts):
+        indices.extend(randomStream.sample(strata[key], count))
+    return sorted(indices)
+
+#####################################################################
+# Returns the state of the nodes drawn in the given scene from which#
+# a frame is rendered: their RGBA colors or, if density, whether    #
+# each of its minority nodes is depressed. Only the nodes drawn are #
+# visited, except for a full scene whose colors are the (cached)    #
+# ones of NetworkBase_getVisualState                                #
+#####################################################################
+def NetworkRenderer_getSceneState(scene, network, density=False):
+    nodes, isMinority, coordinates, segments, indices = scene
+    if density:
+        minorityNodes = [node for node, minority in zip(nodes, isMinority)
+            if minority]
+        return np.fromiter((network.Agents[node].isDepressed 
+            for node in minorityNodes), dtype=bool, 
+            count=len(minorityNodes))
+    if indices is None:
+        return network.NetworkBase_getVisualState()[2]
+    return network.NetworkBase_getNodeColors(nodes)
+
+class NetworkRenderer:
+    #################################################################
+    # Builds the figure displaying the given scene (see getScene)   #
+    # with the nodes initially colored by colors (RGBA per node of  #
+    # the scene, see getSceneState)                                 #
+    #################################################################
+    def __init__(self, scene, colors, nodeSize=500, figSize=(12,12)):
+        nodes, isMinority, coordinates, segments, indices = scene
+
+        self.figure = plt.figure(figsize=figSize)
+        self.axes = self.figure.gca()
+        self.axes.set_xticks([])
+        self.axes.set_yticks([])
+
+        self.axes.add_collection(LineCollection(segments, colors='k',
+            linewidths=1.0, alpha=.5, zorder=1))
+
+        # Collection (and positions of its nodes) for each node shape:
+        # minorities as squares
+        self.collections = []
+        for minority, shape in [[False, 'o'], [True, 's']]:
+            indices = np.nonzero(isMinority == minority)[0]
+            if not len(indices):
+                continue
+            collection = self.axes.scatter(coordinates[indices, 0],
+                coordinates[indices, 1], s=nodeSize, marker=shape,
+                c=colors[indices], edgecolors='face', zorder=2)
+            self.collections.append([indices, collection])
+
+        self.axes.autoscale_view()
+        self.title = self.axes.set_title("")
+
+        # Colors currently displayed (and the array they were read from)
+        self.colors = np.array(colors, dtype=float)
+        self.lastColors = colors
+
+    #################################################################
+    # Brings the node colors up to date with the given colors,      #
+    # updating only the collections holding nodes that changed.     #
+    # Returns the number of nodes whose colors changed              #
+    #################################################################
+    def NetworkRenderer_update(self, colors):
+        if colors is self.lastColors:
+            return 0
+        self.lastColors = colors
+
+        changed = np.any(colors != self.colors, axis=1)
+        numChanged = int(changed.sum())
+        if not numChanged:
+            return 0
+
+        self.colors[changed] = colors[changed]
+        for indices, collection in self.collections:
+            if changed[indices].any():
+                collection.set_facecolors(self.colors[indices])
+        return numChanged
+
+    #################################################################
+    # Renders the frame of the given time, with the nodes in the    #
+    # given state (if given, see getSceneState), to fileName (if    #
+    # given), also displaying it if toShow                          #
+    #################################################################
+    def NetworkRenderer_render(self, time, fileName=None, state=None,
+        toShow=False):
+        if state is not None:
+            self.NetworkRenderer_update(state)
+        self.title.set_text(
+            "Sexual Minority vs Depression at Time {}".format(time))
+
+        if fileName is not None:
+            fileDir = os.path.dirname(fileName)
+            if fileDir and not os.path.isdir(fileDir):
+                os.makedirs(fileDir)
+            self.figure.savefig(fileName)
+        if toShow:
+            plt.show()
+
+    #################################################################
+    # Releases the figure once no more frames are to be rendered    #
+    #################################################################
+    def NetworkRenderer_close(self):
+        plt.close(self.figure)
+
+class DensityRenderer(NetworkRenderer):
+    #################################################################
+    # Builds the figure displaying the given scene (see getScene) as#
+    # hexagonal cells (gridSize across) colored by the fraction of  #
+    # the minority nodes in each that are depressed (red, as given  #
+    # by isDepressed per minority node of the scene, see            #
+    # getSceneState), over the edges of the scene: the cells drawn  #
+    # are bounded by the grid                                       #
+    #################################################################
+    def __init__(self, scene, isDepressed, gridSize=40, figSize=(12,12)):
+        nodes, isMinority, coordinates, segments, indices = scene
+        self.gridSize = gridSize
+
+        self.figure = plt.figure(figsize=figSize)
+        self.axes = self.figure.gca()
+        self.axes.set_xticks([])
+        self.axes.set_yticks([])
+
+        self.axes.add_collection(LineCollection(segments, colors='k',
+            linewidths=.5, alpha=.2, zorder=1))
+
+        self.coordinates = coordinates[isMinority]
+        self.cells = None
+        self.lastState = None
+        self.title = self.axes.set_title("")
+        self.NetworkRenderer_update(isDepressed)
+
+    #################################################################
+    # Recomputes the depression rate of each cell from whether each #
+    # of the minority nodes is depressed (skipped if none changed). #
+    # Returns the number of minority nodes                          #
+    #################################################################
+    def NetworkRenderer_update(self, isDepressed):
+        if self.lastState is not None and \
+            np.array_equal(isDepressed, self.lastState):
+            return len(isDepressed)
+        self.lastState = isDepressed
+
+        if self.cells is not None:
+            self.cells.remove()
+        self.cells = self.axes.hexbin(self.coordinates[:, 0], 
+            self.coordinates[:, 1], C=isDepressed.astype(float), 
+            gridsize=self.gridSize, reduce_C_function=np.mean, 
+            cmap="coolwarm", vmin=0.0, vmax=1.0, mincnt=1, zorder=2)
+        return len(isDepressed)
+
+#####################################################################
+# Returns the renderer of the given scene first in the given state  #
+# (see getSceneState): a DensityRenderer if density, otherwise a    #
+# NetworkRenderer                                                   #
+#####################################################################
+def NetworkRenderer_create(scene, state, density=False):
+    if density:
+        return DensityRenderer(scene, state)
+    return NetworkRenderer(scene, state)
@@ -0,0 +1,138 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: OnlineStats.py                                              #
+# Description: Streaming (single pass, constant memory) statistics  #
+# accumulators, used where the values of interest are too many to   #
+# keep or arrive incrementally (i.e. replicates of simulation runs) #
+#####################################################################
+
+import sys
+import os
+import math
+from statistics import NormalDist
+
+#####################################################################
+# Returns the two-sided critical value for the given level of the   #
+# Student t distribution with the given degrees of freedom (normal  #
+# if None): exact for 1 and 2 degrees, otherwise by the Cornish-    #
+# Fisher expansion about the normal value (within 1% from 3 on)     #
+#####################################################################
+def OnlineStats_getCriticalValue(confidence, degrees=None):
+    p = (1 + confidence)/2
+    if degrees == 1:
+        return math.tan(math.pi * (p - .5))
+    if degrees == 2:
+        return (2 * p - 1)/math.sqrt(2 * p * (1 - p))
+
+    z = NormalDist().inv_cdf(p)
+    if degrees is None:
+        return z
+    terms = [(z ** 3 + z)/4, 
+        (5 * z ** 5 + 16 * z ** 3 + 3 * z)/96,
+        (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z)/384,
+        (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 
+            945 * z)/92160]
+    return z + sum(term/degrees ** (i + 1) for i, term in 
+        enumerate(terms))
+
+class WelfordStats:
+    #################################################################
+    # Initializes the running mean/variance (via Welford's method)  #
+    # of each of numValues values observed together                 #
+    #################################################################
+    def __init__(self, numValues):
+        self.count = 0
+        self.means = [0.0] * numValues
+        self.M2 = [0.0] * numValues
+
+    #################################################################
+    # Adds an observation (a list of numValues values) to the stats #
+    #################################################################
+    def WelfordStats_update(self, values):
+        self.count += 1
+        for i, value in enumerate(values):
+            delta = value - self.means[i]
+            self.means[i] += delta/self.count
+            self.M2[i] += delta * (value - self.means[i])
+
+    #################################################################
+    # Returns the current means of all the values                   #
+    #################################################################
+    def WelfordStats_getMeans(self):
+        return list(self.means)
+
+    #################################################################
+    # Returns the current (sample) variances of all the values      #
+    #################################################################
+    def WelfordStats_getVariances(self):
+        if self.count < 2:
+            return [float("inf")] * len(self.means)
+        return [M2/(self.count - 1) for M2 in self.M2]
+
+    #################################################################
+    # Returns the half-widths of the (Student t) confidence intervals#
+    # of the means of all the values at the given confidence level  #
+    #################################################################
+    def WelfordStats_getHalfWidths(self, confidence=.95):
+        if self.count < 2:
+            return [float("inf")] * len(self.means)
+        critical = OnlineStats_getCriticalValue(confidence, self.count - 1)
+        return [critical * math.sqrt(variance/max(self.count, 1))
+            for variance in self.WelfordStats_getVariances()]
+
+class CoMoment:
+    #################################################################
+    # Initializes the running co-moment of a pair of values (x, y)  #
+    # along with their means and second moments, from which their   #
+    # correlation is found in a single pass with constant memory    #
+    #################################################################
+    def __init__(self):
+        self.count = 0
+        self.meanX = 0.0
+        self.meanY = 0.0
+        self.M2X = 0.0
+        self.M2Y = 0.0
+        self.C = 0.0
+
+    #################################################################
+    # Adds a single observation of the pair to the accumulator      #
+    #################################################################
+    def CoMoment_update(self, x, y):
+        self.count += 1
+        deltaX = x - self.meanX
+        self.meanX += deltaX/self.count
+        deltaY = y - self.meanY
+        self.meanY += deltaY/self.count
+
+        self.M2X += deltaX * (x - self.meanX)
+        self.M2Y += deltaY * (y - self.meanY)
+        self.C += deltaX * (y - self.meanY)
+
+    #################################################################
+    # Merges the observations of another accumulator into this one  #
+    # (the pairwise formulas of Chan et al.), as if all had been    #
+    # added to this accumulator                                     #
+    #################################################################
+    def CoMoment_merge(self, other):
+        if not other.count:
+            return
+        count = self.count + other.count
+        deltaX = other.meanX - self.meanX
+        deltaY = other.meanY - self.meanY
+        scale = self.count * other.count/count
+
+        self.M2X += other.M2X + deltaX * deltaX * scale
+        self.M2Y += other.M2Y + deltaY * deltaY * scale
+        self.C += other.C + deltaX * deltaY * scale
+        self.meanX += deltaX * other.count/count
+        self.meanY += deltaY * other.count/count
+        self.count = count
+
+    #################################################################
+    # Returns the (Pearson) correlation of the pair observed so far,#
+    # nan if undefined (fewer than two values or no variation)      #
+    #################################################################
+    def CoMoment_getCorrelation(self):
+        if self.count < 2 or self.M2X <= 0 or self.M2Y <= 0:
+            return float("nan")
+        return self.C/math.sqrt(self.M2X * self.M2Y)
@@ -0,0 +1,109 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: ParallelPlots.py                                            #
+# Description: Draws batches of the sensitivity/impact plots across #
+# a pool of worker processes, using the object-oriented Agg API     #
+# (no global pyplot state). Each plot's PNG carries a hash of its   #
+# data and style, so plots whose inputs have not changed since they #
+# were last drawn are skipped entirely                              #
+#####################################################################
+
+import sys
+import os
+import json
+import hashlib
+import multiprocessing
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image
+
+# Bump manually whenever the style of the plots changes (so all plots
+# are redrawn) and PNG metadata key under which the hash is stored
+PLOT_VERSION = 1
+HASH_KEY = "ContentHash"
+
+#####################################################################
+# Returns the plot specification (dictionary of its file, the kind  #
+# of plot: "scatter" or "line", the data and the labels/title, None #
+# for those not drawn) from which a plot is drawn and hashed        #
+#####################################################################
+def ParallelPlots_getSpec(fileName, kind, xArray, yArray, xLabel=None,
+    yLabel=None, title=None):
+    return {
+        "fileName": fileName,
+        "kind": kind,
+        "x": [float(x) for x in xArray],
+        "y": [float(y) for y in yArray],
+        "xLabel": xLabel,
+        "yLabel": yLabel,
+        "title": title
+    }
+
+#####################################################################
+# Returns the hash of the plot specification (data and style)       #
+#####################################################################
+def ParallelPlots_getHash(spec):
+    fingerprint = json.dumps([PLOT_VERSION, spec], sort_keys=True)
+    return hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+
+#####################################################################
+# Returns whether the plot on disk was drawn from the given spec    #
+# (only the PNG header with its metadata is read)                   #
+#####################################################################
+def ParallelPlots_isCurrent(spec):
+    try:
+        with Image.open(spec["fileName"]) as image:
+            return image.info.get(HASH_KEY) == \
+                ParallelPlots_getHash(spec)
+    except (IOError, ValueError):
+        return False
+
+#####################################################################
+# Draws the plot of the given spec to its file (on a figure of its  #
+# own), storing the hash of the spec in the PNG metadata            #
+#####################################################################
+def ParallelPlots_draw(spec):
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot(111)
+
+    if spec["kind"] == "scatter":
+        axes.scatter(spec["x"], spec["y"])
+    else:
+        axes.plot(spec["x"], spec["y"])
+    if spec["xLabel"] is not None: axes.set_xlabel(spec["xLabel"])
+    if spec["yLabel"] is not None: axes.set_ylabel(spec["yLabel"])
+    if spec["title"] is not None: axes.set_title(spec["title"])
+
+    plotDir = os.path.dirname(spec["fileName"])
+    if plotDir and not os.path.isdir(plotDir):
+        os.makedirs(plotDir)
+    figure.savefig(spec["fileName"],
+        metadata={HASH_KEY: ParallelPlots_getHash(spec)})
+    return spec["fileName"]
+
+#####################################################################
+# Draws all the given plot specs whose files are not current, using #
+# numWorkers processes (defaults to the number of CPUs; 1 draws them#
+# serially in this process). Returns the number of plots drawn      #
+#####################################################################
+def ParallelPlots_drawBatch(specs, numWorkers=None):
+    toDraw = [spec for spec in specs if not ParallelPlots_isCurrent(spec)]
+    if not toDraw:
+        return 0
+
+    if numWorkers is None:
+        numWorkers = multiprocessing.cpu_count()
+    numWorkers = min(numWorkers, len(toDraw))
+
+    if numWorkers <= 1:
+        list(map(ParallelPlots_draw, toDraw))
+    else:
+        pool = multiprocessing.Pool(numWorkers)
+        try:
+            pool.map(ParallelPlots_draw, toDraw)
+        finally:
+            pool.close()
+            pool.join()
+    return len(toDraw)
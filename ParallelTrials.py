@@ -0,0 +1,114 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: ParallelTrials.py                                           #
+# Description: Runs batches of independent simulation trials (as    #
+# performed by Sensitivity_runSimulation) across a pool of worker   #
+# processes. Used by the analyses that require many thousands of    #
+# trials, namely global sensitivity analysis and calibration        #
+#####################################################################
+
+import sys
+import os
+import multiprocessing
+from copy import deepcopy
+
+# Model each worker process copies for its trials: set once per worker
+# (by the pool initializer) rather than sent along with every trial
+workerModel = None
+
+#####################################################################
+# Pool initializer: stores the model trials are to be copied from   #
+#####################################################################
+def ParallelTrials_initWorker(original):
+    global workerModel
+    workerModel = original
+
+#####################################################################
+# Runs a single trial, given as [trial, summarize] where trial is   #
+# the dictionary of keyword arguments for Sensitivity_runSimulation #
+# and summarize an optional function mapping the final simulation to#
+# the values to return (the standard result vector if None)         #
+#####################################################################
+def ParallelTrials_runTrial(trialSpec):
+    # Imported here: SMDSensitivity (through SexMinDepressionSimulation)
+    # imports the analyses built on this module
+    from SMDSensitivity import Sensitivity_runSimulation
+
+    trial, summarize = trialSpec
+    curTrial = deepcopy(workerModel)
+    trialResult = Sensitivity_runSimulation(curTrial, **trial)
+    if summarize is not None:
+        return summarize(curTrial)
+    return trialResult
+
+#####################################################################
+# Given the parameters of a trial (keyword arguments as passed to   #
+# Sensitivity_runSimulation), returns its result cache fingerprint  #
+#####################################################################
+def ParallelTrials_getCacheParams(original, trial, summarize):
+    from SMDSensitivity import Sensitivity_getTrialParams
+
+    params = Sensitivity_getTrialParams(original, **trial)
+    if summarize is not None:
+        params["summary"] = summarize.__name__
+    return params
+
+#####################################################################
+# Runs all the given trials (each a dictionary of keyword arguments #
+# for Sensitivity_runSimulation, i.e. percentMinority, the impact   #
+# constants, any constrained attributes and seed) on copies of the  #
+# original simulation model using numWorkers processes (defaults to #
+# the number of CPUs; 1 runs serially in this process). Trials found#
+# in resultCache are not rerun (unseeded trials are never cached).  #
+# If summarize (a module-level function) is given, it is applied to #
+# each final simulation and its values returned instead of the      #
+# standard result vector.                                           #
+# Returns the list of results in the same order as the trials       #
+#####################################################################
+def ParallelTrials_runBatch(original, trials, numWorkers=None,
+    resultCache=None, summarize=None):
+    results = [None] * len(trials)
+
+    toRun = []
+    for i, trial in enumerate(trials):
+        if resultCache is not None and trial.get("seed") is not None:
+            cacheParams = ParallelTrials_getCacheParams(original,
+                trial, summarize)
+            results[i] = resultCache.ResultCache_get(cacheParams)
+        if results[i] is None:
+            toRun.append(i)
+
+    if not toRun:
+        return results
+
+    if numWorkers is None:
+        numWorkers = multiprocessing.cpu_count()
+    numWorkers = min(numWorkers, len(toRun))
+
+    trialSpecs = [[trials[i], summarize] for i in toRun]
+    if numWorkers <= 1:
+        ParallelTrials_initWorker(original)
+        runResults = map(ParallelTrials_runTrial, trialSpecs)
+    else:
+        # Several trials are sent to a worker at once to amortize the
+        # communication costs over large batches of short trials
+        chunkSize = max(1, len(trialSpecs)//(numWorkers * 4))
+        pool = multiprocessing.Pool(numWorkers,
+            initializer=ParallelTrials_initWorker, initargs=(original,))
+        runResults = pool.imap(ParallelTrials_runTrial, trialSpecs,
+            chunkSize)
+
+    try:
+        for i, trialResult in zip(toRun, runResults):
+            results[i] = [float(value) for value in trialResult]
+            if resultCache is not None and \
+                trials[i].get("seed") is not None:
+                cacheParams = ParallelTrials_getCacheParams(original,
+                    trials[i], summarize)
+                resultCache.ResultCache_put(cacheParams, results[i])
+    finally:
+        if numWorkers > 1:
+            pool.terminate()
+            pool.join()
+
+    return results
@@ -14,6 +14,7 @@ import numpy as np
 
 from Verification import *
 from Switch import switch
+from RandomStreams import SITE_POLICY, NETWORK_ID
 
 import matplotlib.pyplot as plt
 from operator import itemgetter 
@@ -160,7 +161,7 @@ class Policy:
     def Policy_considerPolicy(self, network, time, policyCap):
         probAdd = self.Policy_getProbability(network, policyCap)
 
-        rand = random.random()
+        rand = network.NetworkBase_getUniform(NETWORK_ID, time, SITE_POLICY)
         if rand < probAdd:
             self.isPassed = True
             network.NetworkBase_addToPolicies(self, time)
\ No newline at end of file
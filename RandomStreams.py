@@ -0,0 +1,58 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: RandomStreams.py                                            #
+# Description: Keyed random streams used for common random numbers. #
+# Each uniform draw is a hash of (key, agent, tick, decision site), #
+# so that trials sharing a key see the same draws at each decision  #
+# regardless of how many draws were made elsewhere in the trial.    #
+# Differences between such trials are then due to their parameters #
+# rather than to Monte Carlo noise                                  #
+#####################################################################
+
+import sys
+import os
+
+# Decision sites at which agents (or the network) draw uniforms
+SITE_CONCEAL = 0
+SITE_CONCEAL_REVERSE = 1
+SITE_DEPRESS = 2
+SITE_DEPRESS_REVERSE = 3
+SITE_CONSTRAINED_CONCEAL = 4
+SITE_CONSTRAINED_DEPRESS = 5
+SITE_POLICY = 6
+
+# Agent ID used for the draws made by the network itself
+NETWORK_ID = -1
+
+MASK_64 = (1 << 64) - 1
+
+#####################################################################
+# Scrambles a 64 bit integer (the SplitMix64 finalizer): small       #
+# changes to the input change about half of the output bits          #
+#####################################################################
+def RandomStreams_mix(x):
+    x = (x + 0x9E3779B97F4A7C15) & MASK_64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return x ^ (x >> 31)
+
+class RandomStreams:
+    #################################################################
+    # Initializes the streams for the given (integer) key: trials   #
+    # with equal keys draw the same numbers at each decision        #
+    #################################################################
+    def __init__(self, key):
+        self.key = key
+        self.keyHash = RandomStreams_mix(key & MASK_64)
+
+    #################################################################
+    # Returns the uniform draw in [0, 1) for the given agent at the #
+    # given tick and decision site (one of the SITE constants)      #
+    #################################################################
+    def RandomStreams_uniform(self, agentID, tick, site):
+        x = RandomStreams_mix(self.keyHash ^ (agentID & MASK_64))
+        x = RandomStreams_mix(x ^ (tick & MASK_64))
+        x = RandomStreams_mix(x ^ site)
+
+        # Uses the top 53 bits (a double's precision) of the hash
+        return (x >> 11) * (1.0/(1 << 53))
@@ -0,0 +1,97 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: ReplicateController.py                                      #
+# Description: Sequential replicate stopping for simulation trials. #
+# Rather than running a fixed number of replicates at each point of #
+# a sweep, replicates are launched in batches and each point stops  #
+# once the confidence intervals of its outputs are narrow enough,   #
+# so computation goes to the noisy points of the sweep             #
+#####################################################################
+
+import sys
+import os
+
+from OnlineStats import WelfordStats
+from ParallelTrials import ParallelTrials_runBatch
+
+# Number of outputs in the result vector of Sensitivity_runSimulation
+NUM_OUTPUTS = 5
+
+class ReplicateController:
+    #################################################################
+    # Initializes the controller: targetHalfWidths maps the index of#
+    # each output of interest (0: depression, 1: concealment, ...) to#
+    # the CI half-width it must reach (i.e. {0: .005} for +-0.5%    #
+    # depressed). Each point runs minReplicates at first and then   #
+    # batchSize more per round, stopping at the targets (at level   #
+    # confidence) or after maxReplicates. Replicate r of each point #
+    # uses seed r (on common random numbers if commonRandom), with  #
+    # trials spread over numWorkers processes and cached in the     #
+    # resultCache if given                                          #
+    #################################################################
+    def __init__(self, targetHalfWidths, minReplicates=4, batchSize=4,
+        maxReplicates=64, confidence=.95, commonRandom=False,
+        numWorkers=None, resultCache=None):
+        self.targetHalfWidths = targetHalfWidths
+        self.minReplicates = minReplicates
+        self.batchSize = batchSize
+        self.maxReplicates = maxReplicates
+        self.confidence = confidence
+        self.commonRandom = commonRandom
+        self.numWorkers = numWorkers
+        self.resultCache = resultCache
+
+    #################################################################
+    # Determines whether the given point (with stats accumulated so #
+    # far) has reached its targets or the replicate cap             #
+    #################################################################
+    def ReplicateController_isDone(self, stats):
+        if stats.count >= self.maxReplicates:
+            return True
+        if stats.count < max(self.minReplicates, 2):
+            return False
+
+        halfWidths = stats.WelfordStats_getHalfWidths(self.confidence)
+        for output in self.targetHalfWidths:
+            if halfWidths[output] > self.targetHalfWidths[output]:
+                return False
+        return True
+
+    #################################################################
+    # Runs replicates of each of the given grid points (dictionaries #
+    # of keyword arguments for Sensitivity_runSimulation, without a #
+    # seed) on copies of original until every point is done. Each   #
+    # round runs the next batch of all unfinished points together.  #
+    # Returns, for each point, [means, halfWidths, numReplicates]   #
+    #################################################################
+    def ReplicateController_runGrid(self, original, trials):
+        allStats = [WelfordStats(NUM_OUTPUTS) for _ in trials]
+        active = list(range(len(trials)))
+
+        while active:
+            batchPoints, batchTrials = [], []
+            for point in active:
+                stats = allStats[point]
+                numNew = self.batchSize
+                if not stats.count:
+                    numNew = max(self.minReplicates, 2)
+                numNew = min(numNew, self.maxReplicates - stats.count)
+
+                for replicate in range(stats.count, stats.count + numNew):
+                    trial = dict(trials[point])
+                    trial["seed"] = replicate
+                    trial["commonRandom"] = self.commonRandom
+                    batchPoints.append(point)
+                    batchTrials.append(trial)
+
+            batchResults = ParallelTrials_runBatch(original, batchTrials,
+                self.numWorkers, self.resultCache)
+            for point, trialResult in zip(batchPoints, batchResults):
+                allStats[point].WelfordStats_update(trialResult)
+
+            active = [point for point in active if not
+                self.ReplicateController_isDone(allStats[point])]
+
+        return [[stats.WelfordStats_getMeans(),
+            stats.WelfordStats_getHalfWidths(self.confidence),
+            stats.count] for stats in allStats]
@@ -0,0 +1,188 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: ResultCache.py                                              #
+# Description: Persistent on-disk store for the results of single   #
+# sensitivity trials. Each entry is keyed by a fingerprint of every #
+# parameter that determines the trial (network, impact constants,   #
+# constrained attributes, seed) salted with the model code version, #
+# so re-running a sweep only pays for the trials not yet computed   #
+#####################################################################
+
+import sys
+import os
+import json
+import hashlib
+
+# Bump manually whenever the meaning of a stored result changes (i.e.
+# the format of the result vector) without the model files changing
+CACHE_VERSION = 1
+
+# Files defining the model dynamics, its setup and the result vector:
+# their contents are hashed into the salt so that editing the model
+# invalidates all stored results
+MODEL_FILES = ["Agent.py", "BaseAgent.py", "AgentFactory.py",
+    "NetworkBase.py", "Policy.py", "ERNetwork.py", "SWNetwork.py",
+    "ASFNetwork.py", "RandomStreams.py", "Metrics.py",
+    "SexMinDepressionSimulation.py", "SMDSensitivity.py"]
+
+#####################################################################
+# Determines the code-version salt for cache keys: combination of   #
+# the manual version and a digest of the model source files         #
+#####################################################################
+def ResultCache_getSalt():
+    sourceDir = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha1(str(CACHE_VERSION).encode("utf-8"))
+    for fileName in MODEL_FILES:
+        filePath = os.path.join(sourceDir, fileName)
+        if os.path.exists(filePath):
+            with open(filePath, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+class ResultCache:
+    #################################################################
+    # Initializes the cache stored in the given directory, which is #
+    # kept below maxBytes on disk by evicting the least recently    #
+    # used entries (last use is tracked by the file modified time)  #
+    #################################################################
+    def __init__(self, directory="Results\\Cache\\Trials",
+        maxBytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.salt = ResultCache_getSalt()
+
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        # Sizes of all entries currently on disk (by path), used so
+        # the total size need not be recomputed on every insertion
+        self.entrySizes = {}
+        for entryPath in self.ResultCache_getEntryPaths():
+            self.entrySizes[entryPath] = os.path.getsize(entryPath)
+        self.totalBytes = sum(self.entrySizes.values())
+
+    #################################################################
+    # Returns the paths of all the entries presently in the cache   #
+    #################################################################
+    def ResultCache_getEntryPaths(self):
+        entryPaths = []
+        for root, dirs, files in os.walk(self.directory):
+            for fileName in files:
+                if fileName.endswith(".json"):
+                    entryPaths.append(os.path.join(root, fileName))
+        return entryPaths
+
+    #################################################################
+    # Given the dictionary of parameters defining a trial, returns  #
+    # its key: the hash of the (sorted) parameters and the salt     #
+    #################################################################
+    def ResultCache_getKey(self, params):
+        fingerprint = json.dumps([self.salt, params], sort_keys=True)
+        return hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+
+    #################################################################
+    # Given a key, returns the file in which the entry is stored:   #
+    # entries are sharded by the first characters of their key      #
+    #################################################################
+    def ResultCache_getPath(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    #################################################################
+    # Returns the stored result vector for the trial defined by the #
+    # given parameters or None if the trial has not been cached     #
+    #################################################################
+    def ResultCache_get(self, params):
+        entryPath = self.ResultCache_getPath(
+            self.ResultCache_getKey(params))
+        try:
+            with open(entryPath, 'r') as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return None
+
+        # Marks the entry as recently used for the LRU eviction
+        os.utime(entryPath, None)
+        self.hits += 1
+        return entry["result"]
+
+    #################################################################
+    # Stores the result vector of the trial defined by the given    #
+    # parameters. Entries are written to a temporary file and then  #
+    # renamed, so readers never see partially written entries       #
+    #################################################################
+    def ResultCache_put(self, params, result):
+        entryPath = self.ResultCache_getPath(
+            self.ResultCache_getKey(params))
+        entryDir = os.path.dirname(entryPath)
+        if not os.path.isdir(entryDir):
+            os.makedirs(entryDir)
+
+        entry = {
+            "params": params,
+            "result": [float(value) for value in result]
+        }
+
+        tempPath = "{}.{}.tmp".format(entryPath, os.getpid())
+        with open(tempPath, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tempPath, entryPath)
+
+        self.totalBytes -= self.entrySizes.get(entryPath, 0)
+        self.entrySizes[entryPath] = os.path.getsize(entryPath)
+        self.totalBytes += self.entrySizes[entryPath]
+
+        if self.totalBytes > self.maxBytes:
+            self.ResultCache_evict()
+
+    #################################################################
+    # Removes the least recently used entries until the cache is    #
+    # back within its size bound                                    #
+    #################################################################
+    def ResultCache_evict(self):
+        lastUsed = []
+        for entryPath in list(self.entrySizes):
+            try:
+                lastUsed.append((os.path.getmtime(entryPath), entryPath))
+            except OSError:
+                # Entry removed externally (i.e. by another process)
+                self.totalBytes -= self.entrySizes.pop(entryPath)
+        lastUsed.sort()
+
+        for _, entryPath in lastUsed:
+            if self.totalBytes <= self.maxBytes:
+                break
+            try:
+                os.remove(entryPath)
+            except OSError:
+                pass
+            self.totalBytes -= self.entrySizes.pop(entryPath)
+
+    #################################################################
+    # Generator over all entries in the cache (whose salt matches   #
+    # the current code version), yielding [params, result] for each #
+    #################################################################
+    def ResultCache_getEntries(self):
+        for entryPath in list(self.entrySizes):
+            try:
+                with open(entryPath, 'r') as f:
+                    entry = json.load(f)
+            except (IOError, OSError, ValueError):
+                continue
+
+            # Entries of other code versions are not reachable by key
+            key = os.path.basename(entryPath)[:-len(".json")]
+            if key != self.ResultCache_getKey(entry["params"]):
+                continue
+            yield [entry["params"], entry["result"]]
+
+    #################################################################
+    # Provides a summary of the cache usage for the current session #
+    #################################################################
+    def __str__(self):
+        return "Cache hits: {}, misses: {}, entries: {}, bytes: {}"\
+            .format(self.hits, self.misses, len(self.entrySizes),
+            self.totalBytes)
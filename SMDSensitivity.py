@@ -12,12 +12,18 @@ import sys
 import os
 import shutil
 import csv
+import json
+import hashlib
 import random,itertools
 from copy import deepcopy
 import numpy as np
 from PIL import Image
 
 from SexMinDepressionSimulation import *
+from NetworkAnalytics import NetworkAnalytics_computeOddRatios
+from Metrics import Metrics_compute, SENSITIVITY_METRICS
+from CorrelationTracker import CorrelationTracker_getCorrelations, GROUPS
+from ParallelPlots import ParallelPlots_getSpec, ParallelPlots_drawBatch
 import matplotlib.pyplot as plt
 from operator import itemgetter 
 
@@ -36,15 +42,6 @@ def generateEmpty(n):
     for _ in range(n):
         yield []
 
-#####################################################################
-# Given a number n, generates that many "double empty arrays" (of   #
-# the form [[], []])                                                #
-#####################################################################
-def generateDoubleEmpty(n):
-    for _ in range(n):
-        first, second = (generateEmpty(2))
-        yield [first, second]
-
 #####################################################################
 # Given a number n and an array, generates that particular number of# 
 # equivalent arrays. Note: simply yields pointers to the same array #
@@ -53,6 +50,18 @@ def generateMultiple(n, arr):
     for _ in range(n):
         yield arr
 
+# Ranges (from literature) of the OR values, in the order computed by
+# Sensitivity_computeOddRatios: prevalence of discrimination and the
+# minority, support and density ORs of depression
+OR_LABELS = ["Discrimination", "Minority", "Support", "Depression"]
+OR_RANGES = [[.175, .259], [1.55, 2.65], [1.5, 4.7], [0.4, 1.2]]
+
+# Ranges (from literature) of the regression values, in the order 
+# computed by Sensitivity_computeRegressionValues
+REGRESSION_LABELS = ["Support_Conceal", "Discrimination_Conceal", 
+    "Discrimination_Depress", "Conceal_Depress"]
+REGRESSION_RANGES = [[-.40, -.30], [-.20, -.10], [.20, .30], [.22, .33]]
+
 #####################################################################
 # Defines test on which an additional test (to determine whether a  #
 # given value is in a specified range) is provided                  #
@@ -70,21 +79,12 @@ class OddRatiosTest(RangeTest):
         self.ORTestVals = valuesArr
 
     def test_odd_ratios(self):
-        # Defines ranges (from literature) of OR values
-        discriminateTestRange = [.175, .259]
-        minTestRange = [1.55, 2.65]
-        supportTestRange = [1.5, 4.7]
-        depressTestRange = [0.4, 1.2]
-
-        ORRanges = [discriminateTestRange, minTestRange, \
-            supportTestRange, depressTestRange]
-        labels = ["Discrimination", "Minority", "Support", "Depression"]
-
         errorStr = "{} not in range"
 
-        for i in range(0, len(ORRanges)):
-            self.assertInRange(self.ORTestVals[i], curRange[i][0], 
-                curRange[i][1], errorStr.format("{} OR".format(labels[i])))
+        for i in range(0, len(OR_RANGES)):
+            self.assertInRange(self.ORTestVals[i], OR_RANGES[i][0], 
+                OR_RANGES[i][1], errorStr.format("{} OR".format(
+                    OR_LABELS[i])))
 
 #####################################################################
 # Performs tests to ensure the regression values both match the     #
@@ -123,7 +123,7 @@ class RegressionValueTest(RangeTest):
         negError = "{} should be < 0"
 
         for negativeVal in shouldBeNegative:
-            self.assertTrue(self.regressionValues[positiveVal] < 0,
+            self.assertTrue(self.regressionValues[negativeVal] < 0,
                 negError.format(labels[negativeVal]))
         for positiveVal in shouldBePositive:
             self.assertTrue(self.regressionValues[positiveVal] > 0,
@@ -135,29 +135,18 @@ class RegressionValueTest(RangeTest):
     # the simulation                                                #
     #################################################################
     def test_numerical_values(self):
-        # Defines ranges (from literature) of regression values
-        supportConcealTestRange = [-.40, -.30] 
-        discriminationConcealTestRange = [-.20, -.10]
-        discriminationDepressTestRange = [.20, .30]
-        concealDepressTestRange = [.22, .33]
-
-        regressionRanges = [supportConcealTestRange,                        \
-            discriminationConcealTestRange, discriminationDepressTestRange, \
-            concealDepressTestRange]
-
         # Denotes where the respective variables are in regressions 
         # val array
         testIndices = [3, 5, 8, 10]
-        labels = ["Support_Conceal", "Discrimination_Conceal", \
-            "Discrimination_Depress", "Conceal_Depress"]
 
         errorStr = "{} not in range"
 
-        for i in range(0, len(regressionRanges)):
+        for i in range(0, len(REGRESSION_RANGES)):
             testIndex = testIndices[i]
             self.assertInRange(self.regressionValues[testIndex], 
-                curRange[i][0], curRange[i][1], errorStr.format(
-                    "{} Regression".format(labels[i])))
+                REGRESSION_RANGES[i][0], REGRESSION_RANGES[i][1], 
+                errorStr.format("{} Regression".format(
+                    REGRESSION_LABELS[i])))
 
 #####################################################################
 # Given the parameters needed for running simulation, executes the  #
@@ -167,21 +156,48 @@ class RegressionValueTest(RangeTest):
 # parameters are passed in with non-None values). All constrained   #
 # variables set the corresponding attribute of agents to the given  #
 # value, aside from enforcedPolicy, which externally imposes certain#
-# policies to be injected into the simulation at specific times     #
+# policies to be injected into the simulation at specific times. If #
+# a seed is given, the random generators are seeded with it before  #
+# running and, if commonRandom is also set, the agents draw from the#
+# keyed streams of the seed (common random numbers: trials with the #
+# same seed share the draws of each agent, tick and decision). If a #
+# resultCache is given, previously computed trials are read from    #
+# (and new ones written to) the cache: only seeded trials are, since#
+# an unseeded trial is a fresh random realization every time        #
 #####################################################################
 def Sensitivity_runSimulation(simulationModel, percentMinority, 
     supportDepressionImpact, concealDiscriminateImpact, 
     discriminateConcealImpact, discriminateDepressionImpact, 
     concealDepressionImpact, attitude=None, support=None, 
     discrimination=None, conceal=None, depression=None, 
-    enforcedPolicy=None):
-
-    ATTR_POS = 0
-    PERCENT_POS = 1
+    enforcedPolicy=None, seed=None, commonRandom=False, 
+    resultCache=None):
 
     if percentMinority > 1.0:
         percentMinority = 1.0
 
+    if seed is None:
+        resultCache = None
+
+    if resultCache is not None:
+        trialParams = Sensitivity_getTrialParams(simulationModel, 
+            percentMinority, supportDepressionImpact, 
+            concealDiscriminateImpact, discriminateConcealImpact, 
+            discriminateDepressionImpact, concealDepressionImpact, 
+            attitude, support, discrimination, conceal, depression, 
+            enforcedPolicy, seed, commonRandom)
+        cachedTrial = resultCache.ResultCache_get(trialParams)
+        if cachedTrial is not None:
+            return cachedTrial
+
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+
+    simulationModel.randomKey = None
+    if commonRandom and seed is not None:
+        simulationModel.randomKey = seed
+
     simulationModel.percentMinority = percentMinority
     simulationModel.supportDepressionImpact = supportDepressionImpact
     simulationModel.concealDiscriminateImpact = concealDiscriminateImpact
@@ -192,20 +208,45 @@ def Sensitivity_runSimulation(simulationModel, percentMinority,
     simulationModel.SMDModel_runStreamlineSimulation(attitude, support, 
         discrimination, conceal, depression, enforcedPolicy)
 
+    # All the results are reduced in a single pass over the agents
     network = simulationModel.network.networkBase
+    curTrial = Metrics_compute(network, SENSITIVITY_METRICS)
 
-    # Each entry has its second value corresponding to the "getPercentage"
-    # for the findPercentAttr method
-    tests = [["depression", False], ["concealed", False], \
-        ["discrimination", True]]
-    curTrial = list(map(lambda test : network.NetworkBase_findPercentAttr(
-        test[ATTR_POS], getPercentage=test[PERCENT_POS]), tests))
-    curTrial.append(network.NetworkBase_setMeanStdSupport(
-        onlyMinority=False)[0])
-    curTrial.append(network.policyScore)
+    if resultCache is not None:
+        resultCache.ResultCache_put(trialParams, curTrial)
 
     return curTrial
 
+#####################################################################
+# Given the parameters of a trial (as passed to runSimulation),     #
+# returns the dictionary fingerprinting the trial for result caching#
+#####################################################################
+def Sensitivity_getTrialParams(simulationModel, percentMinority, 
+    supportDepressionImpact, concealDiscriminateImpact, 
+    discriminateConcealImpact, discriminateDepressionImpact, 
+    concealDepressionImpact, attitude=None, support=None, 
+    discrimination=None, conceal=None, depression=None, 
+    enforcedPolicy=None, seed=None, commonRandom=False):
+    return {
+        "networkType": simulationModel.networkType,
+        "numAgents": simulationModel.numAgents,
+        "timeSpan": simulationModel.timeSpan,
+        "seed": seed,
+        "commonRandom": commonRandom,
+        "percentMinority": percentMinority,
+        "supportDepressionImpact": supportDepressionImpact,
+        "concealDiscriminateImpact": concealDiscriminateImpact,
+        "discriminateConcealImpact": discriminateConcealImpact,
+        "discriminateDepressionImpact": discriminateDepressionImpact,
+        "concealDepressionImpact": concealDepressionImpact,
+        "attitude": attitude,
+        "support": support,
+        "discrimination": discrimination,
+        "conceal": conceal,
+        "depression": depression,
+        "enforcedPolicy": enforcedPolicy
+    }
+
 #####################################################################
 # Given an array formatted as [[DepressResult, ConcealResult]...],  #
 # as is the case for the results for each of the sensitivity trials #
@@ -229,39 +270,49 @@ def Sensitivity_splitResults(indVarScales, mixedArr, label):
     return finalArr
 
 #####################################################################
-# Produces graphical display for the sensitivity results of all     #
-# other variables aside from network type: plots line plot for each.#
-# graphType can be specified as either "regression" or "impact"     #
-# (strings), which will display the graph accordingly. isCompiled   #
-# indicates whether or not image is to be compiled (changes labels) #
+# Produces the specs of the graphical display (see ParallelPlots) of#
+# the sensitivity results of all other variables aside from network #
+# type: a line plot for each. graphType can be specified as either  #
+# "regression" or "impact" (strings), which will display the graph  #
+# accordingly. isCompiled indicates whether or not image is to be   #
+# compiled (adds a plot with the compiled labels)                   #
 #####################################################################
-def Sensitivity_plotGraphs(xArray, yArray, xLabel, yLabel, 
+def Sensitivity_getPlotSpecs(xArray, yArray, xLabel, yLabel, 
     graphType, isCompiled=False):
     if graphType == "regression":
-        xScale = [.75, 1.25]
-        plt.scatter(xArray,yArray)
+        kind = "scatter"
         folder = "Regression"
     else:
-        xScale = [1.0, 1.0]
-        plt.plot(xArray, yArray)
+        kind = "line"
         if graphType == "impact":
             folder = "Impact\\{}".format(xLabel)
         else:
             folder = "Sensitivity\\{}".format(xLabel)
 
+    specs = []
     if isCompiled:
-        if xLabel == "Policy_Score": plt.ylabel(yLabel)
-        if yLabel == "Support": plt.xlabel(xLabel)
+        compiledX, compiledY = None, None
+        if xLabel == "Policy_Score": compiledY = yLabel
+        if yLabel == "Support": compiledX = xLabel
 
-        plt.savefig("Results\\{}\\Temp\\{}vs{}.png".format(folder, 
-            xLabel, yLabel))
+        specs.append(ParallelPlots_getSpec("Results\\{}\\Temp\\{}vs{}.png"\
+            .format(folder, xLabel, yLabel), kind, xArray, yArray, 
+            compiledX, compiledY))
 
-    plt.xlabel(xLabel)
-    plt.ylabel(yLabel)
-    plt.title('{} Vs. {}'.format(xLabel, yLabel))
+    specs.append(ParallelPlots_getSpec("Results\\{}\\{}vs{}.png".format(
+        folder, xLabel, yLabel), kind, xArray, yArray, xLabel, yLabel, 
+        '{} Vs. {}'.format(xLabel, yLabel)))
+    return specs
 
-    plt.savefig("Results\\{}\\{}vs{}.png".format(folder, xLabel, yLabel))
-    plt.close()
+#####################################################################
+# Produces graphical display for the sensitivity results (see       #
+# getPlotSpecs) in this process: skipped if the plots on disk were  #
+# drawn from the same data                                          #
+#####################################################################
+def Sensitivity_plotGraphs(xArray, yArray, xLabel, yLabel, 
+    graphType, isCompiled=False):
+    ParallelPlots_drawBatch(Sensitivity_getPlotSpecs(xArray, yArray, 
+        xLabel, yLabel, graphType, isCompiled), numWorkers=1)
 
 #####################################################################
 # Performs all the tests for odds ratios to check if results match  #
@@ -270,46 +321,12 @@ def Sensitivity_plotGraphs(xArray, yArray, xLabel, yLabel,
 def Sensitivity_oddRatioTests(original):
     network = original.network.networkBase
 
-    ONLY_WANT_WITH = 2
-    ONLY_WANT_WITHOUT = 1
-    IRRELEVANT = 0
-
-    labels = ["Minority_Depress", "Support_Depress", "Density_Depress"]
-    minTest = [ONLY_WANT_WITH, ONLY_WANT_WITHOUT]
-    supportTest = [ONLY_WANT_WITHOUT, ONLY_WANT_WITH]
-    depressTest = [True, False]
-    ORTests = [minTest, supportTest, depressTest]
-
-    ORresults, values = generateEmpty(2)
-
-    discriminateTestRange = network.\
-        NetworkBase_findPercentAttr(attr="discrimination", getPercentage=True)
-    ORresults.append(["Minority_Discrimination_Prevalence", \
-            discriminateTestRange])
-    values.append(discriminateTestRange)
-
-    # Iterates through each of the odds ratio tests and performs
-    # from the above testing values
-    args = [ONLY_WANT_WITH, IRRELEVANT, False]
-    copy = list(args)
-    for i in range (0, len(ORTests)):
-        print("Performing {} odds ratio test".format(labels[i]))
-        test = ORTests[i]
-        originalSet = False
-        for trial in test:
-            args[i] = trial
-            trialResult = network.NetworkBase_getDepressOdds(
-                onlyMinority=args[0], withSupport=args[1], 
-                checkDensity=args[2])
-            if not originalSet:
-                currentOR = trialResult
-                originalSet = True
-            else:
-                if trialResult: currentOR /= trialResult
-                else: currentOR = 0.0
-        ORresults.append([labels[i], currentOR])
-        values.append(currentOR)
-        args = list(copy)
+    labels = ["Minority_Discrimination_Prevalence", "Minority_Depress", 
+        "Support_Depress", "Density_Depress"]
+    for label in labels[1:]:
+        print("Performing {} odds ratio test".format(label))
+    values = Sensitivity_computeOddRatios(network)
+    ORresults = [[labels[i], values[i]] for i in range(len(labels))]
 
     # Performs numerical analysis on sensitivity trials
     resultsFile = "Results\\Impact\\Impact_OR.txt"
@@ -319,52 +336,60 @@ def Sensitivity_oddRatioTests(original):
         for OR in ORresults:
             writer.writerow(OR)
 
+#####################################################################
+# Given a network base (at the end of a simulation), computes its   #
+# values corresponding to those in the literature (OR_RANGES): the  #
+# prevalence of discrimination followed by the odds ratios of       #
+# depression for minority vs. not, no support vs. support, and for  #
+# high minority density vs. overall. Computed from arrays of the    #
+# network state (same values as NetworkBase_getDepressOdds gives)   #
+#####################################################################
+def Sensitivity_computeOddRatios(network):
+    return NetworkAnalytics_computeOddRatios(network)
+
+#####################################################################
+# Given a network base (at the end of a simulation), computes its   #
+# correlations (over all minority agents) corresponding to those in #
+# the literature (REGRESSION_RANGES). Correlations undefined for the#
+# network (i.e. no variation in an attribute) are given as nan      #
+#####################################################################
+def Sensitivity_computeRegressionValues(network):
+    return CorrelationTracker_getCorrelations(network)["Overall"]
+
 #####################################################################
 # Similarly performs correlation tests to identify value of r btween#
-# the parameters and the final result (depression/concealment)      #
+# the parameters and the final result (depression/concealment). The #
+# correlations (for unconcealed, concealed, and all minority agents)#
+# are streamed by CorrelationTracker; agent values are only gathered#
+# for the scatter plots of each test                                #
 #####################################################################
 def Sensitivity_regressionTests(original):
-    UNCONCEALED_INDEX = 0
-    CONCEALED_INDEX = 1
-    OVERALL_INDEX = 2
-
     # Used to determine the names of files (length of "_vs_" string)
     SEPARATOR_LENGTH = 4
 
-    print(original.network.networkBase.\
-        NetworkBase_findPercentAttr(attr="depression", getPercentage=False))
-
-    # Each of these arrays will be used for regression analysis, but
-    # as there are very distinct behaviors for concealed vs. not, we
-    # consider here separating them into arrays and analyzing separate
-    supportArr, concealArr, discriminationArr, \
-        depressionArr = generateDoubleEmpty(4)
-
-    minAgents = original.network.networkBase.NetworkBase_getMinorityNodes()
-    for agent in minAgents:
-        # The first entry of above arrays contains values corresponding
-        # to unconcealed agents and the second for concealed
-        concealIndex = int(agent.isConcealed)
-
-        supportArr[concealIndex].append(agent.support)
-        concealArr[concealIndex].append(agent.probConceal)
-        discriminationArr[concealIndex].append(agent.discrimination)
-        depressionArr[concealIndex].append(agent.currentDepression)
+    network = original.network.networkBase
+    print(network.NetworkBase_findPercentAttr(attr="depression", 
+        getPercentage=False))
 
     labels = ["Support_vs_Concealment", "Concealment_vs_Discrimination", \
         "Discrimination_vs_Depression", "Concealment_vs_Depression"]
 
+    # Agent attributes plotted in each test (structured as [a, b] when
+    # testing a vs. b) and the index of the corresponding pair in the
+    # correlations of CorrelationTracker (correlation is symmetric)
     tests = {
-        1: [supportArr, concealArr],
-        2: [concealArr, discriminationArr],
-        3: [discriminationArr, depressionArr], 
-        4: [concealArr, depressionArr]
+        1: ["support", "probConceal", 0],
+        2: ["probConceal", "discrimination", 1],
+        3: ["discrimination", "currentDepression", 2], 
+        4: ["probConceal", "currentDepression", 3]
     }
 
+    correlations = CorrelationTracker_getCorrelations(network)
+    minAgents = network.NetworkBase_getMinorityNodes()
     finalResults = {}
 
-    # Goes through tests defined in above dictionary (structured as 
-    # [a, b] when testing a vs. b) and performs regression analysis
+    # Goes through tests defined in above dictionary and plots each
+    # along with its correlations for each group of minority agents
     for test in tests:
         testLabel = labels[test - 1]
         print("Performing {} regression analysis".format(testLabel))
@@ -374,23 +399,13 @@ def Sensitivity_regressionTests(original):
         xLabel = testLabel[:endIndex]
         yLabel = testLabel[startIndex:]
 
-        xArrUnconceal = tests[test][0][UNCONCEALED_INDEX]
-        xArrConceal = tests[test][0][CONCEALED_INDEX]
-        yArrUnconceal = tests[test][1][UNCONCEALED_INDEX] 
-        yArrConceal = tests[test][1][CONCEALED_INDEX]
-
-        xArr = xArrUnconceal + xArrConceal
-        yArr = yArrUnconceal + yArrConceal
-
+        xAttr, yAttr, pairIndex = tests[test]
+        xArr = [getattr(agent, xAttr) for agent in minAgents]
+        yArr = [getattr(agent, yAttr) for agent in minAgents]
         Sensitivity_plotGraphs(xArr, yArr, xLabel, yLabel, "regression")
 
-        # Adds both the unconcealed and concealed test results to the
-        # corresponding dictionary entry
-        finalResults[test] = [np.corrcoef(xArrUnconceal, 
-            yArrUnconceal)[0][1]]
-        finalResults[test].append(np.corrcoef(xArrConceal, 
-            yArrConceal)[0][1])
-        finalResults[test].append(np.corrcoef(xArr, yArr)[0][1])
+        finalResults[test] = [correlations[group][pairIndex] 
+            for group in GROUPS]
 
     resultsFile = "Results\\Regression\\Regression_Values.txt"
     with open(resultsFile, 'w') as f:
@@ -399,20 +414,25 @@ def Sensitivity_regressionTests(original):
         for result in finalResults:
             testLabel = labels[result - 1]
             currentResult = finalResults[result]
-            row = [testLabel, \
-                "Unconcealed: " + str(currentResult[UNCONCEALED_INDEX]), \
-                "Concealed: " + str(currentResult[CONCEALED_INDEX]),     \
-                "Overall: " + str(currentResult[OVERALL_INDEX])]
+            row = [testLabel] + ["{}: {}".format(GROUPS[i], 
+                currentResult[i]) for i in range(len(GROUPS))]
             writer.writerow(row)
 
 #####################################################################
 # Performs sensitivity tests to check the various impact ratings on #
-# their influence on the output of the simulation                   #
+# their influence on the output of the simulation. Trials are looked#
+# up in (and added to) resultCache if one is provided. If a journal #
+# is given, trials already journaled are skipped and each completed #
+# trial is appended to it. If a randomKey is given, all the trials  #
+# use the common random numbers of that key. If a replicate         #
+# controller is given, each point is the mean of the replicates run #
+# by the controller (rather than a single trial)                    #
 #####################################################################
 def Sensitivity_impactTests(original, percentMinority, 
     supportDepressionImpact,  concealDiscriminateImpact, 
     discriminateConcealImpact, discriminateDepressionImpact, 
-    concealDepressionImpact):
+    concealDepressionImpact, resultCache=None, journal=None, 
+    randomKey=None, controller=None):
     finalResults = []
     params = [percentMinority, supportDepressionImpact,   \
     concealDiscriminateImpact, discriminateConcealImpact, \
@@ -424,6 +444,11 @@ def Sensitivity_impactTests(original, percentMinority,
         "ConcealDiscrimination_Impact", "DiscriminateConceal_Impact", \
         "DiscriminationDepression_Impact", "ConcealDepression_Impact"]
 
+    # Names of the parameters (as passed to runSimulation)
+    paramNames = ["percentMinority", "supportDepressionImpact", \
+        "concealDiscriminateImpact", "discriminateConcealImpact", \
+        "discriminateDepressionImpact", "concealDepressionImpact"]
+
     varyTrials = [.50, 1.0, 2.0, 3.0, 4.0, 5.0, 10.0]
     for i in range(0, len(params)):
         print("Performing {} sensitivity analysis".format(labels[i]))
@@ -432,17 +457,14 @@ def Sensitivity_impactTests(original, percentMinority,
         for trial in varyTrials: 
             toVary[i] *= trial
             changeParams.append(toVary[i])
-
-            # Ensures that, when sensitivity analysis is conducted, the network
-            # is equivalent to the one that was originally used (keeps constant)
-            curTrial = deepcopy(original)
-            trialResult = Sensitivity_runSimulation(curTrial, toVary[0], 
-                toVary[1], toVary[2], toVary[3], toVary[4], toVary[5])
-
-            trials.append(trialResult)
+            trials.append(dict(zip(paramNames, toVary)))
             toVary[i] = params[i]
+
+        trialResults = Sensitivity_runTrials(original, "impact", 
+            labels[i], changeParams, trials, resultCache, journal, 
+            randomKey, controller)
         splitTrial = Sensitivity_splitResults(changeParams, 
-            trials, labels[i])
+            trialResults, labels[i])
         finalResults.append(splitTrial)
 
     Sensitivity_printImpactResults(finalResults)
@@ -450,9 +472,19 @@ def Sensitivity_impactTests(original, percentMinority,
 #####################################################################
 # Performs sensitivity analyses on the different parameters of      #
 # interest in the simulation (i.e. concealment, support, depression #
-# policies, discrimination) on the final outcomes/results           #
-#####################################################################
-def Sensitivity_sensitivityTests(original):
+# policies, discrimination) on the final outcomes/results. Trials   #
+# are looked up in (and added to) resultCache if one is provided. If#
+# a journal is given, trials already journaled are skipped and each #
+# completed trial is appended to it. If adaptive, each range is     #
+# sampled adaptively (refining only where the response bends by     #
+# more than its noise) rather than at all of its evenly spaced      #
+# points. If a randomKey is given, all trials use its common random #
+# numbers. If a replicate controller is given, each point is the    #
+# mean of the replicates run by the controller (rather than a single#
+# trial)                                                            #
+#####################################################################
+def Sensitivity_sensitivityTests(original, resultCache=None, 
+    journal=None, adaptive=False, randomKey=None, controller=None):
     NUM_TRIALS = 100
     INDEP_DELTA = 1.0/NUM_TRIALS
     ATTITUDE_DELTA = INDEP_DELTA * 2
@@ -480,40 +512,248 @@ def Sensitivity_sensitivityTests(original):
     for test in sensitivityTests:
         print("Performing {} sensitivity test".format(test))
         curRange = sensitivityTests[test]
-        originalVal = curRange[1]
-        trials = []
+        runTrials = lambda values: Sensitivity_runTrials(original, 
+            "sensitivity", test, values, [Sensitivity_getSensitivityTrial(
+            original, sensitivityTests, test, value) for value in values], 
+            resultCache, journal, randomKey, controller)
+
+        if adaptive:
+            # Replicates are single trials, each on a seed of its own,
+            # that bypass the journal
+            runReplicate = lambda value, replicate: \
+                Sensitivity_runSimulation(deepcopy(original), 
+                seed=Sensitivity_getTrialSeed("sensitivity", test, value, 
+                randomKey, replicate), commonRandom=(randomKey is not None),
+                resultCache=resultCache, **Sensitivity_getSensitivityTrial(
+                original, sensitivityTests, test, value))
+            values, trials = Sensitivity_adaptiveRange(
+                lambda value: runTrials([value])[0], curRange[0][0], 
+                curRange[0][-1], maxPoints=len(curRange[0]), 
+                runReplicate=runReplicate)
+        else:
+            values = curRange[0]
+            trials = runTrials(values)
 
-        for value in curRange[0]:
-            curTrial = deepcopy(original)
-            curRange[1] = value
-            
-            attitude = sensitivityTests["Attitude"][1]
-            support = sensitivityTests["Support"][1]
-            discrimination = sensitivityTests["Discrimination"][1]
-            conceal = sensitivityTests["Concealment"][1]
-            depression = sensitivityTests["Depression"][1]
-            percentMinority = sensitivityTests["Minority_Percentage"][1]
-            enforcedPolicy = sensitivityTests["Policy_Score"][1]
-
-            trialResult = Sensitivity_runSimulation(curTrial, 
-                percentMinority, curTrial.supportDepressionImpact, 
-                curTrial.concealDiscriminateImpact, curTrial.discriminateConcealImpact, 
-                curTrial.discriminateDepressionImpact, 
-                curTrial.concealDepressionImpact, attitude, support, 
-                discrimination, conceal, depression, enforcedPolicy)
-            trials.append(trialResult)
-
-        curRange[1] = originalVal
-        splitTrial = Sensitivity_splitResults(curRange[0], 
-            trials, test)
+        splitTrial = Sensitivity_splitResults(values, trials, test)
         finalResults.append(splitTrial)  
 
     Sensitivity_displaySensitivityResults(finalResults)
 
+#####################################################################
+# Returns the trial (dictionary of keyword arguments to             #
+# runSimulation) of the sensitivity test with the given label, with #
+# its variable set to value (all others remaining at their defaults #
+# in sensitivityTests)                                              #
+#####################################################################
+def Sensitivity_getSensitivityTrial(original, sensitivityTests, test, 
+    value):
+    curRange = sensitivityTests[test]
+    originalVal = curRange[1]
+    curRange[1] = value
+
+    trial = {
+        "percentMinority": sensitivityTests["Minority_Percentage"][1],
+        "supportDepressionImpact": original.supportDepressionImpact,
+        "concealDiscriminateImpact": original.concealDiscriminateImpact,
+        "discriminateConcealImpact": original.discriminateConcealImpact,
+        "discriminateDepressionImpact": \
+            original.discriminateDepressionImpact,
+        "concealDepressionImpact": original.concealDepressionImpact,
+        "attitude": sensitivityTests["Attitude"][1],
+        "support": sensitivityTests["Support"][1],
+        "discrimination": sensitivityTests["Discrimination"][1],
+        "conceal": sensitivityTests["Concealment"][1],
+        "depression": sensitivityTests["Depression"][1],
+        "enforcedPolicy": sensitivityTests["Policy_Score"][1]
+    }
+
+    curRange[1] = originalVal
+    return trial
+
+#####################################################################
+# Runs the trials (dictionaries of keyword arguments to             #
+# runSimulation) of the sweep of the given stage and label, where   #
+# values are the corresponding values of the independent variable.  #
+# Journaled trials are not rerun and completed ones are journaled.  #
+# Trials are either run once each on copies of the original (seeded #
+# by Sensitivity_getTrialSeed, so they can be cached) or, if a      #
+# replicate controller is given, replicated until their CIs are     #
+# narrow enough. Returns the list of result vectors (the means if   #
+# replicated)                                                       #
+#####################################################################
+def Sensitivity_runTrials(original, stage, label, values, trials, 
+    resultCache=None, journal=None, randomKey=None, controller=None):
+    results = [Sensitivity_getJournaled(journal, stage, label, value) 
+        for value in values]
+    toRun = [i for i in range(len(trials)) if results[i] is None]
+
+    if controller is not None:
+        replicated = controller.ReplicateController_runGrid(original, 
+            [trials[i] for i in toRun])
+        runResults = [pointStats[0] for pointStats in replicated]
+    else:
+        runResults = []
+        for i in toRun:
+            # Ensures that, when sensitivity analysis is conducted, the 
+            # network is equivalent to the one that was originally used
+            curTrial = deepcopy(original)
+            runResults.append(Sensitivity_runSimulation(curTrial, 
+                seed=Sensitivity_getTrialSeed(stage, label, values[i], 
+                randomKey), commonRandom=(randomKey is not None), 
+                resultCache=resultCache, **trials[i]))
+
+    for i, trialResult in zip(toRun, runResults):
+        Sensitivity_journalTrial(journal, stage, label, values[i], 
+            trialResult)
+        results[i] = trialResult
+    return results
+
+#####################################################################
+# Returns the seed of the trial of the sweep of the given stage and #
+# label at value: randomKey if given (all trials then sharing its   #
+# common random numbers), otherwise derived from the hash of stage, #
+# label and value, so a rerun of the sweep draws the same numbers   #
+# (and finds its trials in the result cache). Further replicates of #
+# the trial are seeded by the following seeds                       #
+#####################################################################
+def Sensitivity_getTrialSeed(stage, label, value, randomKey=None, 
+    replicate=0):
+    if randomKey is not None:
+        return randomKey + replicate
+    fingerprint = json.dumps([stage, label, value])
+    seed = int(hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:8], 
+        16)
+    return (seed + replicate) % 2 ** 31
+
+#####################################################################
+# Adaptively samples runTrial (taking the value of the independent  #
+# variable and returning the result vector) over [lower, upper]:    #
+# starts from an evenly spaced coarse grid and repeatedly bisects   #
+# the interval whose depression or concealment response is worst    #
+# approximated by the linear interpolation of its neighbors, until  #
+# none is off by more than the error budget or maxPoints trials have#
+# been run. The budget of each response is tolerance (in its units, #
+# fractions of the minority: .005 is half a percentage point) or, if#
+# runReplicate (running the given replicate of a value as a single  #
+# trial, each replicate on its own seed) is given, NOISE_MULTIPLE   #
+# times the noise of the response if larger, its standard deviation #
+# being estimated from numReplicates replicates at the middle of the#
+# range. Curved and steep regions are thus finely sampled, while    #
+# linear regions and variations within noise stay coarse. Returns   #
+# [values, results] both sorted by the independent variable         #
+#####################################################################
+def Sensitivity_adaptiveRange(runTrial, lower, upper, coarsePoints=11, 
+    tolerance=.005, maxPoints=100, runReplicate=None, numReplicates=5):
+    # Indices of the responses (depression, concealment) in results
+    RESPONSES = [0, 1]
+
+    # Interpolation errors within this many standard deviations of the
+    # (replicate) noise cannot be told apart from it
+    NOISE_MULTIPLE = 3.0
+
+    # Intervals narrower than this fraction of range are not bisected
+    MIN_WIDTH = 1.0/200
+
+    step = (upper - lower)/(coarsePoints - 1)
+    samples = {}
+    for i in range(coarsePoints):
+        value = lower + step * i
+        samples[value] = runTrial(value)
+
+    budgets = [tolerance] * len(RESPONSES)
+    if runReplicate is not None:
+        middle = lower + step * (coarsePoints//2)
+        replicates = [runReplicate(middle, replicate) 
+            for replicate in range(numReplicates)]
+        for i, response in enumerate(RESPONSES):
+            noise = np.std([replicate[response] for replicate in 
+                replicates], ddof=1)
+
+            # The error of a point off the line of its two neighbors
+            # has 1.5 times the variance of the noise (even spacing)
+            budgets[i] = max(tolerance, NOISE_MULTIPLE * noise * 
+                np.sqrt(1.5))
+
+    minWidth = (upper - lower) * MIN_WIDTH
+    while len(samples) < maxPoints:
+        values = sorted(samples)
+
+        # Error of each interior point relative to the budgets: its
+        # distance from the line through its neighbors
+        errors = [0.0] * len(values)
+        for j in range(1, len(values) - 1):
+            left, mid, right = values[j - 1], values[j], values[j + 1]
+            fraction = (mid - left)/(right - left)
+            for response, budget in zip(RESPONSES, budgets):
+                predicted = samples[left][response] + fraction * \
+                    (samples[right][response] - samples[left][response])
+                errors[j] = max(errors[j], 
+                    abs(samples[mid][response] - predicted)/budget)
+
+        # Bisects the interval with the worst error at its endpoints
+        worstError = 1.0
+        worstInterval = None
+        for j in range(len(values) - 1):
+            left, right = values[j], values[j + 1]
+            error = max(errors[j], errors[j + 1])
+            if right - left >= minWidth and error > worstError:
+                worstError = error
+                worstInterval = [left, right]
+
+        if worstInterval is None:
+            break
+
+        midpoint = (worstInterval[0] + worstInterval[1])/2
+        samples[midpoint] = runTrial(midpoint)
+
+    values = sorted(samples)
+    return [values, [samples[value] for value in values]]
+
+#####################################################################
+# Returns the journaled result of the trial of the given stage and  #
+# label at value, or None if no journal is used or trial not run    #
+#####################################################################
+def Sensitivity_getJournaled(journal, stage, label, value):
+    if journal is None:
+        return None
+    return journal.SweepJournal_getResult(stage, label, value)
+
+#####################################################################
+# Appends the result of a completed trial to journal (if given)     #
+#####################################################################
+def Sensitivity_journalTrial(journal, stage, label, value, result):
+    if journal is not None:
+        journal.SweepJournal_record(stage, label, value, result)
+
+#####################################################################
+# Rebuilds the results of the impact and sensitivity sweeps from the#
+# trials recorded in the journal alone (without running any of the #
+# simulations) and produces the corresponding plots/text outputs    #
+#####################################################################
+def Sensitivity_rebuildFromJournal(journal, showImpact=True, 
+    showSensitivity=True):
+    stages = [["impact", showImpact, Sensitivity_printImpactResults], 
+        ["sensitivity", showSensitivity, 
+        Sensitivity_displaySensitivityResults]]
+
+    for stage, shouldShow, displayResults in stages:
+        labels = journal.SweepJournal_getLabels(stage)
+        if not (shouldShow and labels):
+            continue
+
+        print("Rebuilding {} results from journal".format(stage))
+        finalResults = []
+        for label in labels:
+            values, trials = journal.SweepJournal_getSweep(stage, label)
+            finalResults.append(Sensitivity_splitResults(values, 
+                trials, label))
+        displayResults(finalResults)
+
 #####################################################################
 # Prints the results of correlation analysis to separate csv file   #
 #####################################################################
-def Sensitivity_displaySensitivityResults(finalResults):
+def Sensitivity_displaySensitivityResults(finalResults, numWorkers=None):
+    specs = []
     for subResult in finalResults:
         plots = {
             1: "Depression", 
@@ -527,8 +767,11 @@ def Sensitivity_displaySensitivityResults(finalResults):
         label = subResult[-1]
 
         for plot in plots:
-            Sensitivity_plotGraphs(xArr, subResult[plot], label, 
-                plots[plot], "sensitivity", isCompiled=True)
+            specs.extend(Sensitivity_getPlotSpecs(xArr, subResult[plot], 
+                label, plots[plot], "sensitivity", isCompiled=True))
+
+    # Plots are drawn in parallel, only redrawing those whose data changed
+    ParallelPlots_drawBatch(specs, numWorkers)
     Sensitivity_displayCompiledResults()
 
 #####################################################################
@@ -568,7 +811,9 @@ def Sensitivity_displayCompiledResults():
 # graphically displays the sensitivity of the results (in conceal   #
 # and depression) as a function of the impact ratings               #
 #####################################################################
-def Sensitivity_printImpactResults(finalResults):
+def Sensitivity_printImpactResults(finalResults, numWorkers=None):
+    specs = []
+
     # Performs numerical analysis on sensitivity trials
     resultsFile = "Results\\Impact\\Impact_Correlation.txt"
     with open(resultsFile, 'w') as f:
@@ -598,20 +843,30 @@ def Sensitivity_printImpactResults(finalResults):
             writer.writerow(row)
 
             for plot in plots:
-                Sensitivity_plotGraphs(xArr, subResult[plot], label, 
-                    plots[plot], "impact")
+                specs.extend(Sensitivity_getPlotSpecs(xArr, 
+                    subResult[plot], label, plots[plot], "impact"))
+
+    # Plots are drawn in parallel, only redrawing those whose data changed
+    ParallelPlots_drawBatch(specs, numWorkers)
 
 #####################################################################
 # Conducts sensitivity tests for each of the paramaters of interest #
 # and produces graphical displays for each (appropriately named).   #
 # Can also use showOdd and showRegression to respectively choose    #
-# to specifically perform odd ratio/regression sensitivity tests    #
+# to specifically perform odd ratio/regression sensitivity tests.   #
+# resultCache (if given) is used to skip previously run trials and  #
+# journal (if given) to record progress of (and resume) the sweeps. #
+# adaptive samples the sensitivity ranges adaptively (see above),   #
+# randomKey (if given) runs all trials on common random numbers and #
+# controller (if given) replicates each point until its CI is narrow#
 #####################################################################
 def Sensitivity_sensitivitySimulation(percentMinority, 
     supportDepressionImpact, concealDiscriminateImpact, 
     discriminateConcealImpact, discriminateDepressionImpact, 
     concealDepressionImpact, original, final, showOdd=True, 
-    showImpact=True, showRegression=True, showSensitivity=True):
+    showImpact=True, showRegression=True, showSensitivity=True, 
+    resultCache=None, journal=None, adaptive=False, randomKey=None, 
+    controller=None):
     if showOdd:
         Sensitivity_oddRatioTests(final)
 
@@ -622,7 +877,9 @@ def Sensitivity_sensitivitySimulation(percentMinority,
         Sensitivity_impactTests(original, percentMinority, 
             supportDepressionImpact, concealDiscriminateImpact, 
             discriminateConcealImpact, discriminateDepressionImpact, 
-            concealDepressionImpact)
+            concealDepressionImpact, resultCache, journal, randomKey, 
+            controller)
 
     if showSensitivity:
-        Sensitivity_sensitivityTests(original)
\ No newline at end of file
+        Sensitivity_sensitivityTests(original, resultCache, journal, 
+            adaptive, randomKey, controller)
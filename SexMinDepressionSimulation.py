@@ -14,6 +14,19 @@ from copy import deepcopy
 import numpy as np
 
 from NetworkBase import NetworkBase
+from RandomStreams import RandomStreams
+from ResultCache import ResultCache
+from SweepJournal import SweepJournal
+from SobolSensitivity import Sobol_sensitivityAnalysis
+from ReplicateController import ReplicateController
+from Surrogate import Surrogate_runTrainingTrials, Surrogate_fromCache, \
+    Surrogate_answerQueries
+from CorrelationTracker import CorrelationTracker
+from Metrics import MetricSeries
+from SimulationSinks import *
+from TrajectoryStore import TrajectoryStore
+from TransitionLog import TransitionRecorder
+from LayoutCache import LayoutCache, RANDOM_LAYOUT, FORCE_LAYOUT
 from ERNetwork import ERNetwork
 from ASFNetwork import ASFNetwork
 from SWNetwork import SWNetwork
@@ -58,13 +71,22 @@ class SMDSimulationModel:
         self.discriminateDepressionImpact = discriminateDepressionImpact
         self.concealDepressionImpact = concealDepressionImpact
 
+        # Key of the common random number streams used by the agents
+        # of networks set from here on (None to use global generator)
+        self.randomKey = None
+
+        # Tick up to which the current network has been run (reset
+        # each time a new network is set)
+        self.curTick = 0
+
         self.SMDModel_setNetwork()
         
     #################################################################
     # Based on the specified value of the network type, generates   #
     # and sets the network accordingly. Sets the initial value of   #
     # simulation to those specified in the parameters (attitude_0   #
-    # corresponds to initial value of attitude, etc...)             #
+    # corresponds to initial value of attitude, etc...). If a random#
+    # key is set, the network draws from the corresponding streams  #
     #################################################################
     def SMDModel_setNetwork(self, attitude_0=None, 
         support_0=None, discrimination_0=None, conceal_0=None, 
@@ -85,6 +107,11 @@ class SMDSimulationModel:
                 support_0, discrimination_0, conceal_0, 
                 depression_0, policyScore_0)
 
+        if self.randomKey is not None:
+            self.network.networkBase.NetworkBase_setRandomStreams(
+                RandomStreams(self.randomKey))
+        self.curTick = 0
+
     #################################################################
     # Given parameters for initializing the simulation, ensures they#
     # are legal                                                     # 
@@ -106,40 +133,6 @@ class SMDSimulationModel:
 
         return True
 
-    #################################################################
-    # Writes the header of the CSV file to be given as output in the#
-    # specified file                                                #
-    #################################################################
-    def SMDModel_writeSimulationHeader(self, resultsFile):
-        if resultsFile is not None:
-            columns = ['time', 'agentID', 'attitude', 
-            'isMinority', 'discrimination', 'support', 'probConceal',
-            'isConcealed', 'currentDepression', 'isDepressed',
-            'policy points']
-            with open(resultsFile, 'w') as f:
-                writer = csv.writer(f)
-                writer.writerow(columns)
-
-    #################################################################
-    # Writes the current data/parameters corresponding to each agent#
-    # in the network at the current time step, given the current    #
-    # time in the simulation and the file to be written to          #
-    #################################################################
-    def SMDModel_writeSimulationData(self, time, resultsFile):
-        if resultsFile is not None:
-            with open(resultsFile, 'a') as f:
-                writer = csv.writer(f)
-                Agents = self.network.networkBase.Agents
-                for agent in Agents:
-                    curAgent = Agents[agent]
-                    row = [time, curAgent.agentID, curAgent.attitude, 
-                    curAgent.isMinority, curAgent.discrimination, 
-                    curAgent.support, curAgent.probConceal, 
-                    curAgent.isConcealed, curAgent.currentDepression, 
-                    curAgent.isDepressed, curAgent.network.policyScore]
-
-                    writer.writerow(row)
-
     #################################################################
     # Creates a bar graph comparing two specified values (val1,val2)#
     # outputting result into file with fileName. Uses label, title  #
@@ -198,58 +191,30 @@ class SMDSimulationModel:
 
     #################################################################
     # Runs simulation over the desired timespan and produces/outputs#
-    # results in CSV file specified along with displaying graphics  #
+    # results in CSV file specified along with displaying graphics: #
+    # frames are rendered on renderWorkers processes (in this one if#
+    # 0) and assembled into animationFile (GIF) if one is given.    #
+    # Large networks are drawn with at most maxNodes nodes and      #
+    # maxEdges edges, or as density cells if density (RenderSink).  #
+    # Nodes are placed by the layout method (see LayoutCache), only #
+    # computed the first time the network is visualized. The run    #
+    # starts from tick 0 on the current network; any further sinks  #
+    # (i.e. ObserverSinks) are also handed its views                #
     #################################################################
-    def SMDModel_runSimulation(self, resultsFile):
-        self.SMDModel_writeSimulationHeader(resultsFile)
-
-        # Converts from years to "ticks" (represent 2 week span)
-        numTicks = self.timeSpan * 26
-        pos = nx.random_layout(self.network.G)
-
-        beforeDepressLevels = []
-        afterDepressLevels = []     
-
-        timeLabels = ["Before", "After"]
-        curNetwork = self.network.networkBase
-
-        agents = curNetwork.NetworkBase_getMinorityNodes()
-        for agent in agents:
-            if agent.isMinority:
-                beforeDepressLevels.append(agent.currentDepression)
-        preAvgDepression = curNetwork.\
-            NetworkBase_getMinorityDepressionAvg()
-
-        for i in range(0, numTicks):
-            if i % 10 == 0:
-                self.SMDModel_writeSimulationData(i, resultsFile)   
-
-                print("Plotting time step {}".format(i))
-                self.network.networkBase.\
-                    NetworkBase_visualizeNetwork(False, i, pos)
-
-            # Updates the agents in the network base and copies those
-            # to the network
-            self.network.networkBase.NetworkBase_timeStep(i, 
-                self.supportDepressionImpact, self.concealDiscriminateImpact, 
-                self.discriminateConcealImpact, self.discriminateDepressionImpact, 
-                self.concealDepressionImpact)
-            self.network.Agents = self.network.networkBase.Agents 
-
-        for agent in agents:
-            if agent.isMinority:
-                afterDepressLevels.append(agent.currentDepression)
-        postAvgDepression = curNetwork.\
-            NetworkBase_getMinorityDepressionAvg()
-
-        avgDepressLevels = [preAvgDepression, postAvgDepression]
-
-        self.SMDModel_createBarResults(beforeDepressLevels, 
-            afterDepressLevels, "depressBar",
-            "Depression", "Individual Depression Levels Chart")
+    def SMDModel_runSimulation(self, resultsFile, renderWorkers=0, 
+        animationFile=None, maxNodes=None, maxEdges=None, density=False,
+        layout=RANDOM_LAYOUT, sinks=None):
+        pos = LayoutCache().LayoutCache_getLayout(self.network.G, layout)
+        runSinks = [RenderSink(pos, numWorkers=renderWorkers, 
+            animationFile=animationFile, maxNodes=maxNodes, 
+            maxEdges=maxEdges, density=density), DepressionBarSink(self)]
+        if resultsFile is not None:
+            runSinks.insert(0, CSVSink(resultsFile))
+        if sinks is not None:
+            runSinks.extend(sinks)
 
-        self.SMDModel_createSingleBars(timeLabels, avgDepressLevels, 
-            "Average_Depression_Level", "Time")
+        self.curTick = 0
+        self.SMDModel_runSinks(runSinks)
 
     #################################################################
     # Runs simulation over the desired timespan without producing   #
@@ -257,24 +222,18 @@ class SMDSimulationModel:
     # parameters allows manual sets the corresponding attribute (for#
     # all of the agents) to the specified value. If none is given,  #
     # (should be the case if not running sensitivity/hypotheticals) #
-    # agents follow given default update behavior for the attribute #
+    # agents follow given default update behavior for the attribute.#
+    # The run starts from tick 0 on the current network             #
     #################################################################
     def SMDMOdel_runConstSimulation(self, attitude=None, 
         support=None, discrimination=None, conceal=None, 
         depression=None, enforcedPolicy=None):
-        # Converts from years to "ticks" (represent 2 week span)    
-        numTicks = self.timeSpan * 26
-
-        for i in range(0, numTicks):
-            # Updates the agents in the network base and copies those
-            # to the network
-            self.network.networkBase.NetworkBase_timeStep(i, 
-                self.supportDepressionImpact, self.concealDiscriminateImpact, 
-                self.discriminateConcealImpact, self.discriminateDepressionImpact, 
-                self.concealDepressionImpact, attitude, support, 
-                discrimination, conceal, depression, enforcedPolicy)
-            
-            self.network.Agents = self.network.networkBase.Agents
+        stepArgs = {"attitude": attitude, "support": support, 
+            "discrimination": discrimination, "conceal": conceal, 
+            "depression": depression, "policyScore": enforcedPolicy}
+        self.curTick = 0
+        for view in self.SMDModel_iterTicks(stepArgs=stepArgs):
+            pass
           
     #################################################################
     # Runs simulation over the desired timespan without producing   #
@@ -282,25 +241,103 @@ class SMDSimulationModel:
     # parameters allows manual sets for the initial value of the    #
     # parameter in the simulation. Simulation then runs as normal.  #
     # If none is given, agents follow given default update behavior #
-    # for the attribute                                             #
+    # for the attribute. If sinks are given, they are handed the    #
+    # views of the run (see SMDModel_runSinks)                      #
     #################################################################
     def SMDModel_runStreamlineSimulation(self, attitude_0=None, 
         support_0=None, discrimination_0=None, conceal_0=None, 
-        depression_0=None, policyScore_0=None):
-        # Converts from years to "ticks" (represent 2 week span)    
-        numTicks = self.timeSpan * 26
+        depression_0=None, policyScore_0=None, sinks=None):
         self.SMDModel_setNetwork(attitude_0, support_0, discrimination_0, 
             conceal_0, depression_0, policyScore_0)
+        if sinks:
+            self.SMDModel_runSinks(sinks)
+        else:
+            self.SMDModel_runTicks()
+
+    #################################################################
+    # Advances the current network (without visible output) from    #
+    # the tick it was last run to up to endTick (exclusive): runs to#
+    # the end of the timespan if no endTick is given. Allows runs to#
+    # be paused (i.e. to be snapshot) and then resumed              #
+    #################################################################
+    def SMDModel_runTicks(self, endTick=None):
+        for view in self.SMDModel_iterTicks(endTick):
+            pass
+
+    #################################################################
+    # Generator stepping the current network from the tick it was   #
+    # last run to up to endTick (as SMDModel_runTicks), yielding a  #
+    # read-only TickView of the network at the start of each tick   #
+    # before it is stepped. stepArgs are the keyword arguments that #
+    # fix attributes at each step (see NetworkBase_timeStep), if any#
+    #################################################################
+    def SMDModel_iterTicks(self, endTick=None, stepArgs=None):
+        # Converts from years to "ticks" (represent 2 week span)    
+        numTicks = self.timeSpan * 26
+        if endTick is None or endTick > numTicks:
+            endTick = numTicks
+        if stepArgs is None:
+            stepArgs = {}
+
+        curNetwork = self.network.networkBase
+        for i in range(self.curTick, endTick):
+            yield TickView(i, curNetwork)
 
-        for i in range(0, numTicks):
             # Updates the agents in the network base and copies those
             # to the network
-            self.network.networkBase.NetworkBase_timeStep(i, 
+            curNetwork.NetworkBase_timeStep(i, 
                 self.supportDepressionImpact, self.concealDiscriminateImpact, 
                 self.discriminateConcealImpact, self.discriminateDepressionImpact, 
-                self.concealDepressionImpact)
+                self.concealDepressionImpact, **stepArgs)
             
-            self.network.Agents = self.network.networkBase.Agents
+            self.network.Agents = curNetwork.Agents
+            self.curTick = i + 1
+
+    #################################################################
+    # Runs the current network up to endTick (as SMDModel_runTicks),#
+    # handing the view of each tick to every sink (see              #
+    # SimulationSinks) sampling it, and closing all the sinks at end#
+    #################################################################
+    def SMDModel_runSinks(self, sinks, endTick=None, stepArgs=None):
+        for view in self.SMDModel_iterTicks(endTick, stepArgs):
+            for sink in sinks:
+                if sink.Sink_wants(view.time):
+                    sink.Sink_consume(view)
+
+        for sink in sinks:
+            sink.Sink_close(self.network.networkBase)
+
+    #################################################################
+    # Returns an independent copy of the simulation in its current  #
+    # state, which may be run on (forked) without affecting this one#
+    #################################################################
+    def SMDModel_fork(self):
+        return deepcopy(self)
+
+    #################################################################
+    # Intervenes on the simulation at its current tick: sets each of#
+    # the given attributes to the specified value on the agents it  #
+    # applies to (attitude for non-minority agents, others for those#
+    # of minority), in the same manner as the initial values given  #
+    # when setting the network. Unspecified attributes are unchanged#
+    #################################################################
+    def SMDModel_applyIntervention(self, attitude=None, support=None, 
+        discrimination=None, conceal=None, depression=None, 
+        policyScore=None):
+        curNetwork = self.network.networkBase
+        for agent in curNetwork.Agents.values():
+            if not agent.isMinority:
+                if attitude is not None: agent.attitude = attitude
+                continue
+
+            if support is not None: agent.support = support
+            if discrimination is not None: 
+                agent.discrimination = discrimination
+            if conceal is not None: agent.probConceal = conceal
+            if depression is not None: agent.currentDepression = depression
+
+        if policyScore is not None:
+            curNetwork.policyScore = policyScore
 
 #####################################################################
 # Given the paramters of the simulation (upon being prompted on)    #
@@ -315,11 +352,104 @@ def main():
     showRegression = False
     showSensitivity = True
 
+    # Stores results of sensitivity trials on disk so that re-running
+    # the analysis only simulates trials not previously run (each sweep
+    # trial is seeded by its stage, label and value to be cacheable)
+    useResultCache = True
+    maxCacheBytes = 64 * 1024 * 1024
+
+    # Number of processes over which batches of trials are spread (None
+    # uses all of the available CPUs)
+    numWorkers = None
+
+    # Journals each completed sweep trial to disk: resumeSweep skips
+    # trials journaled by an interrupted run and onlyReplot rebuilds
+    # the plots from the journal without running any simulations
+    useJournal = True
+    resumeSweep = False
+    onlyReplot = False
+    journalFile = "Results\\Sensitivity\\Journal.txt"
+
+    # Samples sensitivity ranges adaptively (only refining where the
+    # response changes sharply) instead of at evenly spaced points
+    adaptiveSensitivity = False
+
+    # If set, every sweep trial uses the common random numbers of this
+    # key, so neighboring points differ only by the parameter changed
+    commonRandomKey = None
+
+    # If set, replicates each sweep point until the CI half-width of
+    # its percent depressed is within replicateHalfWidth (or until
+    # maxReplicates have been run) rather than running it once
+    replicateHalfWidth = None
+    maxReplicates = 64
+
+    # Global sensitivity (Sobol indices) over the impact constants and
+    # minority percentage: runs sobolSamples x 8 simulations
+    performSobol = False
+    sobolSamples = 512
+
+    # Searches for the impact constants whose ORs and regression values
+    # fall within the literature ranges (starting from those below)
+    performCalibration = False
+    calibrationGenerations = 30
+
+    # Approximate Bayesian computation of the posterior of the impact
+    # constants given the literature ranges (abcParticles per generation)
+    performABC = False
+    abcParticles = 1000
+
+    # "What if" queries (i.e. {"concealDepressionImpact": 1.5}) answered
+    # instantly by an emulator fit on the cached trials (needs cache),
+    # first running (or finding cached) its seeded training trials
+    surrogateQueries = []
+    surrogateTrainingTrials = 100
+
+    # Tracks the correlations of the regression analysis at each tick
+    # of the simulation, writing their trajectories over time
+    trackCorrelations = False
+
+    # Records all the registered metrics (i.e. % depressed) every tick
+    recordMetricSeries = False
+
+    # Stores the complete state of every agent at every tick (binary,
+    # memory-mapped: read back with TrajectoryStore.TrajectoryReader)
+    storeTrajectory = False
+    trajectoryDir = "Results\\Trajectory"
+
+    # Logs only the transitions of the agents' flags (with keyframes of
+    # the full state): read back with TransitionLog.TransitionReplayer
+    logTransitions = False
+    transitionDir = "Results\\Transitions"
+
     # Only runs streamlined simulation (no graphical/textual output)
     onlyStreamlined = True 
 
-    # Conducts the hypothetical tests that are of interest in study
+    # Processes rendering the frames of full runs (0 renders them in
+    # this process, None uses all CPUs) and the GIF they are assembled
+    # into (None to not assemble them)
+    renderWorkers = None
+    animationFile = None
+
+    # Level of detail of the frames for large networks: at most this
+    # many nodes (stratified sample) and edges are drawn, or density
+    # cells colored by the rate of depression if renderDensity
+    renderMaxNodes = 2000
+    renderMaxEdges = 5000
+    renderDensity = False
+
+    # Layout of the frames (RANDOM_LAYOUT or FORCE_LAYOUT), cached on
+    # disk for each network so it is only computed once
+    layoutMethod = RANDOM_LAYOUT
+
+    # Conducts the hypothetical tests that are of interest in study:
+    # interventions are made at interventionTick (0 at the start)
     performHypothetical = False
+    interventionTick = 0
+
+    # If set, the hypotheticals are run over this many paired replicates
+    # and reported with confidence intervals rather than run once
+    hypotheticalReplicates = None
 
     # ER, SW, or ASF
     networkType = "ER"
@@ -342,21 +472,124 @@ def main():
         discriminateConcealImpact, discriminateDepressionImpact, 
         concealDepressionImpact)
     original = deepcopy(simulationModel)    
+
+    # Observers of the state at the end of each tick, written out (by
+    # the given method of each) once the run is over
+    observerSinks = []
+    if trackCorrelations:
+        observerSinks.append(ObserverSink(CorrelationTracker(), 
+            "CorrelationTracker_writeTrajectories"))
+    if recordMetricSeries:
+        observerSinks.append(ObserverSink(MetricSeries(), 
+            "MetricSeries_writeSeries"))
+    if storeTrajectory:
+        observerSinks.append(ObserverSink(TrajectoryStore(trajectoryDir, 
+            timeSpan * 26), "TrajectoryStore_close"))
+    if logTransitions:
+        observerSinks.append(ObserverSink(TransitionRecorder(
+            transitionDir), "TransitionRecorder_close"))
     
     if onlyStreamlined: 
-        simulationModel.SMDModel_runStreamlineSimulation()
+        simulationModel.SMDModel_runStreamlineSimulation(
+            sinks=observerSinks)
     else:
-        simulationModel.SMDModel_runSimulation(resultsFile)
+        simulationModel.SMDModel_runSimulation(resultsFile, 
+            renderWorkers, animationFile, renderMaxNodes, renderMaxEdges, 
+            renderDensity, layoutMethod, observerSinks)
+
+    resultCache = None
+    if useResultCache:
+        resultCache = ResultCache(maxBytes=maxCacheBytes)
 
     if checkSensitivity:
-        Sensitivity_sensitivitySimulation(percentMinority, 
-            supportDepressionImpact, concealDiscriminateImpact, 
+        journal = None
+        if useJournal or onlyReplot:
+            journalSettings = [networkType, timeSpan, numAgents, 
+                percentMinority, supportDepressionImpact, 
+                concealDiscriminateImpact, discriminateConcealImpact, 
+                discriminateDepressionImpact, concealDepressionImpact]
+            if onlyReplot: journalSettings = None
+            journal = SweepJournal(journalFile, journalSettings, 
+                resume=(resumeSweep or onlyReplot))
+
+        controller = None
+        if replicateHalfWidth is not None:
+            DEPRESSION_INDEX = 0
+            controller = ReplicateController(
+                {DEPRESSION_INDEX: replicateHalfWidth}, 
+                maxReplicates=maxReplicates, 
+                commonRandom=(commonRandomKey is not None), 
+                numWorkers=numWorkers, resultCache=resultCache)
+
+        if onlyReplot:
+            Sensitivity_rebuildFromJournal(journal, showImpact, 
+                showSensitivity)
+        else:
+            Sensitivity_sensitivitySimulation(percentMinority, 
+                supportDepressionImpact, concealDiscriminateImpact, 
+                discriminateConcealImpact, discriminateDepressionImpact, 
+                concealDepressionImpact, original, simulationModel, 
+                showOdd, showImpact, showRegression, showSensitivity, 
+                resultCache, journal, adaptiveSensitivity, commonRandomKey, 
+                controller)
+
+        if journal is not None:
+            journal.SweepJournal_close()
+
+    if performSobol:
+        baseParams = [percentMinority, supportDepressionImpact, 
+            concealDiscriminateImpact, discriminateConcealImpact, 
+            discriminateDepressionImpact, concealDepressionImpact]
+        Sobol_sensitivityAnalysis(original, baseParams, sobolSamples, 
+            numWorkers=numWorkers, resultCache=resultCache)
+
+    # The calibrations are imported here: they are built on SMDSensitivity,
+    # which itself imports this module
+    if performCalibration:
+        from Calibration import Calibration_calibrate
+        initialImpacts = [supportDepressionImpact, 
+            concealDiscriminateImpact, discriminateConcealImpact, 
+            discriminateDepressionImpact, concealDepressionImpact]
+        bestImpacts, distance = Calibration_calibrate(original, 
+            percentMinority, initialImpacts, calibrationGenerations, 
+            numWorkers=numWorkers, resultCache=resultCache)
+        print("Calibrated impacts: {} (distance {})".format(bestImpacts, 
+            distance))
+
+    if performABC:
+        from ABCSMC import ABC_runSMC
+        baseImpacts = [supportDepressionImpact, concealDiscriminateImpact, 
             discriminateConcealImpact, discriminateDepressionImpact, 
-            concealDepressionImpact, original, simulationModel, 
-            showOdd, showImpact, showRegression, showSensitivity)
+            concealDepressionImpact]
+        ABC_runSMC(original, percentMinority, baseImpacts, abcParticles, 
+            numWorkers=numWorkers, resultCache=resultCache)
+
+    if surrogateQueries and resultCache is None:
+        sys.stderr.write("Surrogate queries need the result cache "\
+            "(useResultCache)\n")
+    elif surrogateQueries:
+        baseParams = {
+            "percentMinority": percentMinority,
+            "supportDepressionImpact": supportDepressionImpact,
+            "concealDiscriminateImpact": concealDiscriminateImpact,
+            "discriminateConcealImpact": discriminateConcealImpact,
+            "discriminateDepressionImpact": discriminateDepressionImpact,
+            "concealDepressionImpact": concealDepressionImpact
+        }
+        Surrogate_runTrainingTrials(original, baseParams, resultCache, 
+            surrogateTrainingTrials, numWorkers)
+        surrogate = Surrogate_fromCache(resultCache, original)
+        if surrogate is not None:
+            Surrogate_answerQueries(surrogate, baseParams, surrogateQueries)
 
     if performHypothetical:
-        Hypothetical_findEffectiveness(original, simulationModel)
+        if hypotheticalReplicates is None:
+            Hypothetical_findEffectiveness(original, simulationModel, 
+                interventionTick, numWorkers)
+        else:
+            Hypothetical_findReplicatedEffectiveness(original, 
+                simulationModel, hypotheticalReplicates, interventionTick, 
+                numWorkers)
 
     print("Terminating simulation...")
 
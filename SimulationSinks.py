@@ -0,0 +1,246 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: SimulationSinks.py                                          #
+# Description: Read-only views of the simulation at each tick, as   #
+# yielded by SMDModel_iterTicks, and the sinks that consume them    #
+# (results CSV, rendered frames, depression bar charts, or any of   #
+# the existing observers) each at its own sampling rate. A run only #
+# pays for the outputs whose sinks it is given                      #
+#####################################################################
+
+import sys
+import os
+
+from TrajectoryWriter import TrajectoryWriter
+from NetworkRenderer import *
+from FramePool import FramePool, FramePool_assembleAnimation
+
+class TickView:
+    __slots__ = ["time", "network"]
+
+    #################################################################
+    # Creates the view of the network base at the start of the given#
+    # tick (before it is stepped). The view is not a copy: it is    #
+    # only valid until the simulation is advanced past that tick    #
+    #################################################################
+    def __init__(self, time, network):
+        object.__setattr__(self, "time", time)
+        object.__setattr__(self, "network", network)
+
+    #################################################################
+    # Views cannot be modified: sinks only observe the simulation   #
+    #################################################################
+    def __setattr__(self, name, value):
+        raise AttributeError("Tick views are read-only")
+
+    #################################################################
+    # Returns the values of the given attribute of all the agents   #
+    # (in the order of the network base's agents) as a tuple        #
+    #################################################################
+    def TickView_getAttr(self, attr):
+        return tuple(getattr(agent, attr) for agent in
+            self.network.Agents.values())
+
+    #################################################################
+    # Returns the policy score of the network at the viewed tick    #
+    #################################################################
+    def TickView_getPolicyScore(self):
+        return self.network.policyScore
+
+class Sink:
+    #################################################################
+    # Base of all sinks: consumes a view every sampleRate ticks     #
+    #################################################################
+    def __init__(self, sampleRate=1):
+        self.sampleRate = sampleRate
+
+    #################################################################
+    # Returns whether the sink consumes the view of the given tick  #
+    #################################################################
+    def Sink_wants(self, time):
+        return time % self.sampleRate == 0
+
+    #################################################################
+    # Consumes the view of a tick (overriden by each of the sinks)  #
+    #################################################################
+    def Sink_consume(self, view):
+        pass
+
+    #################################################################
+    # Called once the run is over (with the network in its final    #
+    # state) to write out and release anything held by the sink     #
+    #################################################################
+    def Sink_close(self, network):
+        pass
+
+class CSVSink(Sink):
+    #################################################################
+    # Writes the state of all the agents to the results CSV (see    #
+    # TrajectoryWriter) every sampleRate ticks                      #
+    #################################################################
+    def __init__(self, resultsFile, sampleRate=10):
+        Sink.__init__(self, sampleRate)
+        self.writer = TrajectoryWriter(resultsFile)
+
+    #################################################################
+    # Buffers a snapshot of the agents at the viewed tick           #
+    #################################################################
+    def Sink_consume(self, view):
+        self.writer.TrajectoryWriter_snapshot(view.time, view.network)
+
+    #################################################################
+    # Writes out any buffered snapshots and closes the CSV          #
+    #################################################################
+    def Sink_close(self, network):
+        self.writer.TrajectoryWriter_close()
+
+class RenderSink(Sink):
+    #################################################################
+    # Plots the network (at the fixed node positions pos) to a PNG  #
+    # every sampleRate ticks. Frames are rendered on numWorkers     #
+    # processes (see FramePool; defaults to the number of CPUs) or, #
+    # if numWorkers is 0, in this process reusing a single figure.  #
+    # The frames are assembled into animationFile if one is given.  #
+    # Large networks are drawn at a level of detail of maxNodes and #
+    # maxEdges (see NetworkRenderer_getScene) or as density cells if#
+    # density                                                       #
+    #################################################################
+    def __init__(self, pos, sampleRate=10, numWorkers=0, 
+        animationFile=None, maxNodes=None, maxEdges=None, density=False):
+        Sink.__init__(self, sampleRate)
+        self.pos = pos
+        self.numWorkers = numWorkers
+        self.animationFile = animationFile
+        self.maxNodes = maxNodes
+        self.maxEdges = maxEdges
+        self.density = density
+
+        self.scene = None
+        self.renderer = None
+        self.framePool = None
+        self.frameFiles = []
+
+    #################################################################
+    # Plots the network at the viewed tick                          #
+    #################################################################
+    def Sink_consume(self, view):
+        print("Plotting time step {}".format(view.time))
+        fileName = "Results\\TimeResults\\timestep{}.png"\
+            .format(view.time)
+        if self.scene is None:
+            # Density cells aggregate all the nodes: only edges thinned
+            maxNodes = self.maxNodes
+            if self.density:
+                maxNodes = None
+            self.scene = NetworkRenderer_getScene(view.network, self.pos,
+                maxNodes, self.maxEdges)
+        state = NetworkRenderer_getSceneState(self.scene, view.network,
+            self.density)
+        self.frameFiles.append(fileName)
+
+        if self.numWorkers == 0:
+            if self.renderer is None:
+                self.renderer = NetworkRenderer_create(self.scene, state,
+                    self.density)
+            self.renderer.NetworkRenderer_render(view.time, fileName, 
+                state)
+            return
+
+        if self.framePool is None:
+            self.framePool = FramePool(self.scene, state, 
+                self.numWorkers, density=self.density)
+        self.framePool.FramePool_submit(view.time, state, fileName)
+
+    #################################################################
+    # Waits for (or releases the figure of) the rendered frames and #
+    # assembles them into the animation                             #
+    #################################################################
+    def Sink_close(self, network):
+        if self.renderer is not None:
+            self.renderer.NetworkRenderer_close()
+            self.renderer = None
+        if self.framePool is not None:
+            self.framePool.FramePool_close()
+            self.framePool = None
+        if self.animationFile is not None:
+            FramePool_assembleAnimation(self.frameFiles, 
+                self.animationFile)
+
+class DepressionBarSink(Sink):
+    #################################################################
+    # Records the depression of the minority agents on the first    #
+    # view and, once closed, produces the before/after bar charts of#
+    # the given simulation model                                    #
+    #################################################################
+    def __init__(self, model):
+        Sink.__init__(self)
+        self.model = model
+        self.beforeDepressLevels = None
+        self.preAvgDepression = None
+
+    #################################################################
+    # Records the depression levels before the run (first view)     #
+    #################################################################
+    def Sink_consume(self, view):
+        if self.beforeDepressLevels is not None:
+            return
+        self.beforeDepressLevels = [agent.currentDepression for agent in
+            view.network.NetworkBase_getMinorityNodes()]
+        self.preAvgDepression = view.network.\
+            NetworkBase_getMinorityDepressionAvg()
+
+    #################################################################
+    # Produces the bar charts of depression before and after        #
+    #################################################################
+    def Sink_close(self, network):
+        if self.beforeDepressLevels is None:
+            return
+        afterDepressLevels = [agent.currentDepression for agent in
+            network.NetworkBase_getMinorityNodes()]
+        postAvgDepression = network.NetworkBase_getMinorityDepressionAvg()
+
+        self.model.SMDModel_createBarResults(self.beforeDepressLevels,
+            afterDepressLevels, "depressBar",
+            "Depression", "Individual Depression Levels Chart")
+        self.model.SMDModel_createSingleBars(["Before", "After"],
+            [self.preAvgDepression, postAvgDepression],
+            "Average_Depression_Level", "Time")
+
+class ObserverSink(Sink):
+    #################################################################
+    # Adapts an observer (i.e. TrajectoryStore, MetricSeries: object#
+    # whose Observer_observeTick method takes the network base and a#
+    # tick, to be called with the state at the end of the tick) to a#
+    # sink, calling closeMethod (the name of its method to call at  #
+    # the end, if any) once closed. As the view at the start of a   #
+    # tick is the state at the end of the previous one, every view  #
+    # is handed to the observer for the tick stepped before it, and #
+    # the final state for the last tick stepped once closed         #
+    #################################################################
+    def __init__(self, observer, closeMethod=None):
+        Sink.__init__(self)
+        self.observer = observer
+        self.closeMethod = closeMethod
+
+        # Tick last viewed (being stepped until the next view)
+        self.lastTime = None
+
+    #################################################################
+    # Calls the observer with the end state of the previous tick    #
+    #################################################################
+    def Sink_consume(self, view):
+        if self.lastTime is not None:
+            self.observer.Observer_observeTick(view.network, 
+                self.lastTime)
+        self.lastTime = view.time
+
+    #################################################################
+    # Calls the observer with the end state of the last tick and the#
+    # closing method of the observer (if one was given)             #
+    #################################################################
+    def Sink_close(self, network):
+        if self.lastTime is not None:
+            self.observer.Observer_observeTick(network, self.lastTime)
+            self.lastTime = None
+        if self.closeMethod is not None:
+            getattr(self.observer, self.closeMethod)()
@@ -0,0 +1,232 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: SobolSensitivity.py                                         #
+# Description: Global (variance-based) sensitivity analysis of the  #
+# simulation outputs on the impact constants and minority percentage#
+# varied jointly. Draws quasi-random Saltelli samples, runs them in #
+# parallel batches and computes the first-order and total Sobol     #
+# indices (with bootstrap confidence intervals) of each output      #
+#####################################################################
+
+import sys
+import os
+import csv
+import numpy as np
+
+from ParallelTrials import ParallelTrials_runBatch
+
+# Number of bits used for the points of the Sobol sequence
+SOBOL_BITS = 32
+
+# Direction numbers (Joe & Kuo) for the dimensions of Sobol sequence
+# past the first, in the form [s, a, [m_1, ..., m_s]]
+SOBOL_DIRECTIONS = [
+    [1, 0, [1]],
+    [2, 1, [1, 3]],
+    [3, 1, [1, 3, 1]],
+    [3, 2, [1, 1, 1]],
+    [4, 1, [1, 1, 3, 3]],
+    [4, 4, [1, 3, 5, 13]],
+    [5, 2, [1, 1, 5, 5, 17]],
+    [5, 4, [1, 1, 5, 5, 5]],
+    [5, 7, [1, 1, 7, 11, 19]],
+    [5, 11, [1, 1, 5, 1, 1]],
+    [5, 13, [1, 1, 1, 3, 11]],
+    [5, 14, [1, 3, 5, 5, 31]],
+    [6, 1, [1, 3, 3, 9, 7, 49]],
+    [6, 13, [1, 1, 1, 15, 21, 21]],
+    [6, 16, [1, 3, 1, 13, 27, 49]]
+]
+
+# Parameters varied in the analysis (named as the keyword arguments of
+# Sensitivity_runSimulation) and the labels of the simulation outputs
+SOBOL_PARAMS = ["percentMinority", "supportDepressionImpact",
+    "concealDiscriminateImpact", "discriminateConcealImpact",
+    "discriminateDepressionImpact", "concealDepressionImpact"]
+SOBOL_OUTPUTS = ["Depression", "Concealment", "Discrimination",
+    "Support", "Policy_Score"]
+
+#####################################################################
+# Determines the (integer) direction numbers of the first dim       #
+# dimensions of the Sobol sequence                                  #
+#####################################################################
+def Sobol_getDirections(dim):
+    if dim > len(SOBOL_DIRECTIONS) + 1:
+        sys.stderr.write("Sobol sequence supports at most {} "\
+            "dimensions".format(len(SOBOL_DIRECTIONS) + 1))
+        return None
+
+    directions = np.zeros((dim, SOBOL_BITS), dtype=np.uint64)
+    for i in range(SOBOL_BITS):
+        directions[0][i] = 1 << (SOBOL_BITS - 1 - i)
+
+    for d in range(1, dim):
+        s, a, m = SOBOL_DIRECTIONS[d - 1]
+        curDirections = [0] * SOBOL_BITS
+        for i in range(SOBOL_BITS):
+            if i < s:
+                curDirections[i] = m[i] << (SOBOL_BITS - 1 - i)
+                continue
+
+            curDirections[i] = curDirections[i - s] ^ \
+                (curDirections[i - s] >> s)
+            for k in range(1, s):
+                if (a >> (s - 1 - k)) & 1:
+                    curDirections[i] ^= curDirections[i - k]
+        directions[d] = curDirections
+    return directions
+
+#####################################################################
+# Generates the first numPoints points (skipping the origin) of the #
+# dim-dimensional Sobol sequence, as an array of values in [0, 1)   #
+#####################################################################
+def Sobol_getSequence(numPoints, dim):
+    directions = Sobol_getDirections(dim)
+    points = np.zeros((numPoints, dim))
+
+    # Gray code construction: each point is obtained from the previous
+    # by flipping the direction of the lowest zero bit of its index
+    curPoint = np.zeros(dim, dtype=np.uint64)
+    for n in range(numPoints):
+        lowZero = 0
+        index = n
+        while index & 1:
+            index >>= 1
+            lowZero += 1
+        curPoint ^= directions[:, lowZero]
+        points[n] = curPoint / float(2 ** SOBOL_BITS)
+    return points
+
+#####################################################################
+# Produces the Saltelli sampling matrices given the number of base  #
+# samples and bounds of each parameter ([lower, upper] for each).   #
+# Returns [A, B, AB], where A and B are numSamples x D matrices and #
+# AB[i] is A with its ith column taken from B                       #
+#####################################################################
+def Sobol_getSaltelliSamples(numSamples, bounds):
+    D = len(bounds)
+    sequence = Sobol_getSequence(numSamples, 2 * D)
+
+    # Both halves of the sequence (for A and B) span the same bounds
+    lower = np.tile([bound[0] for bound in bounds], 2)
+    upper = np.tile([bound[1] for bound in bounds], 2)
+    scaled = lower + sequence * (upper - lower)
+
+    A = scaled[:, :D]
+    B = scaled[:, D:]
+    AB = []
+    for i in range(D):
+        curAB = A.copy()
+        curAB[:, i] = B[:, i]
+        AB.append(curAB)
+    return [A, B, AB]
+
+#####################################################################
+# Given the outputs on the Saltelli samples (fA, fB of length N and #
+# fAB being D x N), computes the first-order (Saltelli) and total   #
+# (Jansen) Sobol indices of every parameter. Rows can be given to   #
+# compute the indices only on a (bootstrap) subset of samples       #
+#####################################################################
+def Sobol_getIndices(fA, fB, fAB, rows=None):
+    if rows is not None:
+        fA, fB, fAB = fA[rows], fB[rows], fAB[:, rows]
+
+    variance = np.var(np.concatenate([fA, fB]))
+    if not variance:
+        zeros = np.zeros(len(fAB))
+        return [zeros, zeros]
+
+    firstOrder = np.mean(fB * (fAB - fA), axis=1)/variance
+    total = .5 * np.mean((fA - fAB) ** 2, axis=1)/variance
+    return [firstOrder, total]
+
+#####################################################################
+# Computes the Sobol indices along with their confidence intervals  #
+# (percentile bootstrap over the base samples at the given level)   #
+# Returns [first, firstCI, total, totalCI], where the CIs are D x 2 #
+#####################################################################
+def Sobol_bootstrapIndices(fA, fB, fAB, numBootstrap=200, level=.95):
+    firstOrder, total = Sobol_getIndices(fA, fB, fAB)
+
+    N = len(fA)
+    firstSamples, totalSamples = [], []
+    for _ in range(numBootstrap):
+        rows = np.random.randint(0, N, N)
+        curFirst, curTotal = Sobol_getIndices(fA, fB, fAB, rows)
+        firstSamples.append(curFirst)
+        totalSamples.append(curTotal)
+
+    percentiles = [100 * (1 - level)/2, 100 * (1 + level)/2]
+    firstCI = np.percentile(firstSamples, percentiles, axis=0).T
+    totalCI = np.percentile(totalSamples, percentiles, axis=0).T
+    return [firstOrder, firstCI, total, totalCI]
+
+#####################################################################
+# Performs the global sensitivity analysis: baseParams gives the    #
+# default value of each of SOBOL_PARAMS, each of which is varied    #
+# over [low, high] multiples of its default (unless explicit bounds #
+# are given as a list of [lower, upper]). Runs numSamples x (D + 2) #
+# simulations on numWorkers processes (results looked up in/added   #
+# to resultCache if given) and writes the indices of each output to #
+# resultsFile. Returns dictionary mapping output to its indices     #
+#####################################################################
+def Sobol_sensitivityAnalysis(original, baseParams, numSamples=512,
+    bounds=None, numBootstrap=200, numWorkers=None, resultCache=None,
+    resultsFile="Results\\Sobol\\Sobol_Indices.txt"):
+    BOUND_MULTIPLIERS = [.50, 2.0]
+    MAX_MINORITY = 1.0
+
+    if bounds is None:
+        bounds = [[value * BOUND_MULTIPLIERS[0],
+            value * BOUND_MULTIPLIERS[1]] for value in baseParams]
+        bounds[0][1] = min(bounds[0][1], MAX_MINORITY)
+
+    D = len(SOBOL_PARAMS)
+    A, B, AB = Sobol_getSaltelliSamples(numSamples, bounds)
+
+    # Trials of the same base sample share their (common random number)
+    # seed, so differences within each sample are due to parameters
+    trials = []
+    for matrix in [A, B] + AB:
+        for row in range(numSamples):
+            trial = dict(zip(SOBOL_PARAMS, matrix[row].tolist()))
+            trial["seed"] = row
+            trial["commonRandom"] = True
+            trials.append(trial)
+
+    print("Performing Sobol analysis ({} simulations)".format(
+        len(trials)))
+    results = np.array(ParallelTrials_runBatch(original, trials,
+        numWorkers, resultCache))
+    results = results.reshape(D + 2, numSamples, len(SOBOL_OUTPUTS))
+
+    finalResults = {}
+    for output in range(len(SOBOL_OUTPUTS)):
+        fA = results[0, :, output]
+        fB = results[1, :, output]
+        fAB = results[2:, :, output]
+        finalResults[SOBOL_OUTPUTS[output]] = Sobol_bootstrapIndices(
+            fA, fB, fAB, numBootstrap)
+
+    Sobol_writeResults(finalResults, resultsFile)
+    return finalResults
+
+#####################################################################
+# Writes the Sobol indices (and their CIs) of each output to file   #
+#####################################################################
+def Sobol_writeResults(finalResults, resultsFile):
+    resultsDir = os.path.dirname(resultsFile)
+    if resultsDir and not os.path.isdir(resultsDir):
+        os.makedirs(resultsDir)
+
+    with open(resultsFile, 'w') as f:
+        writer = csv.writer(f, delimiter=' ')
+        writer.writerow(["Output", "Parameter", "First_Order",
+            "First_Lower", "First_Upper", "Total", "Total_Lower",
+            "Total_Upper"])
+        for output in finalResults:
+            firstOrder, firstCI, total, totalCI = finalResults[output]
+            for i in range(len(SOBOL_PARAMS)):
+                writer.writerow([output, SOBOL_PARAMS[i], firstOrder[i],
+                    firstCI[i][0], firstCI[i][1], total[i],
+                    totalCI[i][0], totalCI[i][1]])
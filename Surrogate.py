@@ -0,0 +1,216 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: Surrogate.py                                                #
+# Description: Surrogate emulator of the simulation outputs as a    #
+# function of the impact constants and minority percentage. A       #
+# Gaussian process is fit on previously run (cached) trials and     #
+# then answers "what if" queries instantly with an uncertainty,     #
+# flagging queries that fall outside the region it was trained on.  #
+# Only seeded trials are cached, so a seeded training sweep can be  #
+# run to provide them                                               #
+#####################################################################
+
+import sys
+import os
+import numpy as np
+
+from ParallelTrials import ParallelTrials_runBatch
+
+# Inputs of the emulator (named as keyword arguments of runSimulation)
+SURROGATE_PARAMS = ["percentMinority", "supportDepressionImpact",
+    "concealDiscriminateImpact", "discriminateConcealImpact",
+    "discriminateDepressionImpact", "concealDepressionImpact"]
+SURROGATE_OUTPUTS = ["Depression", "Concealment", "Discrimination",
+    "Support", "Policy_Score"]
+
+# Trial parameters that must be unset (unconstrained) for a cached
+# trial to be used as training data for the emulator
+CONSTRAINED_PARAMS = ["attitude", "support", "discrimination",
+    "conceal", "depression", "enforcedPolicy"]
+
+#####################################################################
+# Computes the squared exponential kernel between the rows of X1 and#
+# X2 (inputs already scaled by the length scales)                   #
+#####################################################################
+def Surrogate_getKernel(X1, X2):
+    sqDistances = (np.sum(X1 ** 2, axis=1)[:, None]
+        + np.sum(X2 ** 2, axis=1)[None, :] - 2 * X1.dot(X2.T))
+    return np.exp(-.5 * np.maximum(sqDistances, 0.0))
+
+class SurrogateModel:
+    #################################################################
+    # Initializes an (unfit) emulator. Queries outside the training #
+    # bounds by more than boundsTolerance (as a fraction of the     #
+    # range of each input) or whose predictive std is more than     #
+    # maxRelativeStd of the output's std are flagged as needing a   #
+    # real simulation. At most maxPoints trials are used to fit     #
+    #################################################################
+    def __init__(self, boundsTolerance=.05, maxRelativeStd=.5,
+        maxPoints=1000):
+        self.boundsTolerance = boundsTolerance
+        self.maxRelativeStd = maxRelativeStd
+        self.maxPoints = maxPoints
+        self.isFit = False
+
+    #################################################################
+    # Fits the emulator on inputs X (n x len(SURROGATE_PARAMS)) and #
+    # outputs Y (n x len(SURROGATE_OUTPUTS)). The length scale and  #
+    # noise (shared by all outputs) are chosen by maximizing the    #
+    # marginal likelihood over a grid of candidate values           #
+    #################################################################
+    def SurrogateModel_fit(self, X, Y):
+        LENGTH_SCALES = [.1, .2, .35, .5, .75, 1.0, 1.5, 2.5]
+        NOISE_LEVELS = [1e-4, 1e-3, 1e-2, 5e-2, .1, .25]
+
+        X = np.asarray(X, dtype=float)
+        Y = np.asarray(Y, dtype=float)
+        if len(X) > self.maxPoints:
+            rows = np.random.choice(len(X), self.maxPoints, replace=False)
+            X, Y = X[rows], Y[rows]
+
+        # Inputs are scaled to the unit cube of the training region and
+        # outputs standardized, so one set of hyperparameters fits all
+        self.lower = X.min(axis=0)
+        self.ranges = X.max(axis=0) - self.lower
+        self.ranges[self.ranges == 0] = 1.0
+        self.yMean = Y.mean(axis=0)
+        self.yStd = Y.std(axis=0)
+        self.yScale = np.where(self.yStd == 0, 1.0, self.yStd)
+
+        unitX = (X - self.lower)/self.ranges
+        standardY = (Y - self.yMean)/self.yScale
+
+        bestLikelihood = -np.inf
+        for lengthScale in LENGTH_SCALES:
+            K = Surrogate_getKernel(unitX/lengthScale, unitX/lengthScale)
+            for noise in NOISE_LEVELS:
+                try:
+                    L = np.linalg.cholesky(K + noise * np.eye(len(K)))
+                except np.linalg.LinAlgError:
+                    continue
+                alpha = np.linalg.solve(L.T, np.linalg.solve(L, standardY))
+
+                # Log marginal likelihood summed over the outputs
+                likelihood = -.5 * np.sum(standardY * alpha) \
+                    - standardY.shape[1] * np.sum(np.log(np.diag(L)))
+                if likelihood > bestLikelihood:
+                    bestLikelihood = likelihood
+                    self.lengthScale = lengthScale
+                    self.noise = noise
+                    self.alpha = alpha
+                    Linv = np.linalg.inv(L)
+                    self.Kinv = Linv.T.dot(Linv)
+
+        self.trainX = unitX/self.lengthScale
+        self.isFit = True
+
+    #################################################################
+    # Given a query (dictionary of SURROGATE_PARAMS values, or list #
+    # in that order), returns [means, stds, inRegion]: the predicted#
+    # outputs, their standard deviations, and whether the emulator  #
+    # can be trusted there (False if it should be simulated instead)#
+    #################################################################
+    def SurrogateModel_predict(self, query):
+        if isinstance(query, dict):
+            query = [query[param] for param in SURROGATE_PARAMS]
+
+        unitQuery = (np.asarray(query, dtype=float) - self.lower) \
+            /self.ranges
+        kernel = Surrogate_getKernel(unitQuery[None, :]/self.lengthScale,
+            self.trainX)[0]
+
+        means = self.yMean + kernel.dot(self.alpha) * self.yScale
+        variance = 1.0 + self.noise - kernel.dot(self.Kinv).dot(kernel)
+        relativeStd = np.sqrt(max(variance, 0.0))
+        # Outputs constant over the training data are predicted exactly
+        stds = relativeStd * self.yStd
+
+        inBounds = np.all(unitQuery >= -self.boundsTolerance) and \
+            np.all(unitQuery <= 1.0 + self.boundsTolerance)
+        inRegion = bool(inBounds and relativeStd <= self.maxRelativeStd)
+        return [means, stds, inRegion]
+
+#####################################################################
+# Collects the cached trials run on networks like that of original  #
+# (same type, size and time span) without constrained attributes,   #
+# returning [X, Y] formatted for fitting the emulator               #
+#####################################################################
+def Surrogate_getTrainingData(resultCache, original):
+    X, Y = [], []
+    for params, result in resultCache.ResultCache_getEntries():
+        if params.get("summary") is not None:
+            continue
+        if params["networkType"] != original.networkType or \
+            params["numAgents"] != original.numAgents or \
+            params["timeSpan"] != original.timeSpan:
+            continue
+        if any(params[param] is not None for param in CONSTRAINED_PARAMS):
+            continue
+
+        X.append([params[param] for param in SURROGATE_PARAMS])
+        Y.append(result)
+    return [X, Y]
+
+#####################################################################
+# Runs the seeded training sweep of the emulator: numTrials trials  #
+# whose SURROGATE_PARAMS are drawn uniformly over [low, high]       #
+# multiples of their defaults in baseParams (dictionary) from a     #
+# stream of the given seed, trial i being seeded by seed + i. The   #
+# trials are run on numWorkers processes and added to resultCache,  #
+# so a rerun only finds them there                                  #
+#####################################################################
+def Surrogate_runTrainingTrials(original, baseParams, resultCache, 
+    numTrials=100, numWorkers=None, seed=0):
+    BOUND_MULTIPLIERS = [.50, 2.0]
+    MAX_MINORITY = 1.0
+
+    randomStream = np.random.RandomState(seed)
+    trials = []
+    for i in range(numTrials):
+        trial = {}
+        for param in SURROGATE_PARAMS:
+            lower = baseParams[param] * BOUND_MULTIPLIERS[0]
+            upper = baseParams[param] * BOUND_MULTIPLIERS[1]
+            if param == "percentMinority":
+                upper = min(upper, MAX_MINORITY)
+            trial[param] = float(randomStream.uniform(lower, upper))
+        trial["seed"] = seed + i
+        trials.append(trial)
+
+    print("Running surrogate training trials ({} simulations)".format(
+        numTrials))
+    ParallelTrials_runBatch(original, trials, numWorkers, resultCache)
+
+#####################################################################
+# Fits an emulator on the trials of resultCache matching original.  #
+# Returns the fit SurrogateModel, or None if too few trials cached  #
+#####################################################################
+def Surrogate_fromCache(resultCache, original, minPoints=20):
+    X, Y = Surrogate_getTrainingData(resultCache, original)
+    if len(X) < minPoints:
+        sys.stderr.write("Surrogate needs at least {} cached trials "\
+            "({} found): run Surrogate_runTrainingTrials first\n"\
+            .format(minPoints, len(X)))
+        return None
+
+    surrogate = SurrogateModel()
+    surrogate.SurrogateModel_fit(X, Y)
+    return surrogate
+
+#####################################################################
+# Answers each of the given queries (dictionaries of parameters that#
+# differ from baseParams, itself a dictionary of SURROGATE_PARAMS)  #
+# with the emulator, printing the predictions of each output        #
+#####################################################################
+def Surrogate_answerQueries(surrogate, baseParams, queries):
+    for query in queries:
+        curParams = dict(baseParams)
+        curParams.update(query)
+        means, stds, inRegion = surrogate.SurrogateModel_predict(curParams)
+
+        print("What if {}:".format(query))
+        for i in range(len(SURROGATE_OUTPUTS)):
+            print("    {}: {} +- {}".format(SURROGATE_OUTPUTS[i],
+                means[i], stds[i]))
+        if not inRegion:
+            print("    Outside of training region: run full simulation")
@@ -0,0 +1,143 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: SweepJournal.py                                             #
+# Description: Crash-safe progress journal for sensitivity sweeps.  #
+# Each completed trial is appended as a single line to the journal  #
+# file, so that an interrupted sweep can be resumed (skipping those #
+# grid points already completed) and all results can be rebuilt for #
+# plotting from the journal alone                                   #
+#####################################################################
+
+import sys
+import os
+import json
+
+class SweepJournal:
+    #################################################################
+    # Opens the journal stored at journalFile. settings should hold #
+    # the parameters shared by all trials of the sweep (network type#
+    # size, impact constants...): if resume is True and the journal #
+    # was written with the same settings, completed trials are kept #
+    # otherwise the journal is started over. If settings are None,  #
+    # any journal is accepted (i.e. only rebuilding plots from it)  #
+    #################################################################
+    def __init__(self, journalFile="Results\\Sensitivity\\Journal.txt",
+        settings=None, resume=False):
+        self.journalFile = journalFile
+        self.settings = settings
+
+        # Maps (stage, label) to the dictionary of completed trials of
+        # that sweep, keyed by the value of the independent variable
+        self.sweeps = {}
+        self.sweepOrder = []
+
+        journalDir = os.path.dirname(journalFile)
+        if journalDir and not os.path.isdir(journalDir):
+            os.makedirs(journalDir)
+
+        if resume and os.path.exists(journalFile):
+            if not self.SweepJournal_load():
+                sys.stderr.write("Journal settings differ from current "\
+                    "settings: starting new journal\n")
+                resume = False
+
+        if not resume or not os.path.exists(journalFile):
+            self.sweeps = {}
+            self.sweepOrder = []
+            self.fd = os.open(journalFile,
+                os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND)
+            self.SweepJournal_writeLine({"settings": settings})
+        else:
+            self.fd = os.open(journalFile, os.O_WRONLY | os.O_APPEND)
+
+    #################################################################
+    # Reads all the completed trials in the journal. Lines that can #
+    # not be parsed (a trial interrupted mid-write) are ignored.    #
+    # Returns False if the journal was written for other settings   #
+    #################################################################
+    def SweepJournal_load(self):
+        with open(self.journalFile, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+
+                if "settings" in record:
+                    if self.settings is not None and \
+                        record["settings"] != self.settings:
+                        return False
+                    continue
+
+                self.SweepJournal_addRecord(record["stage"],
+                    record["label"], record["value"], record["result"])
+        return True
+
+    #################################################################
+    # Writes a single record to the journal: the entire line is     #
+    # passed in one write to a file opened for appending and synced #
+    # to disk before returning, so a crash can at most lose the     #
+    # trial being written (and never corrupt previous ones)         #
+    #################################################################
+    def SweepJournal_writeLine(self, record):
+        line = "\n" + json.dumps(record) + "\n"
+        os.write(self.fd, line.encode("utf-8"))
+        os.fsync(self.fd)
+
+    #################################################################
+    # Adds the result of a trial to the in-memory view of journal   #
+    #################################################################
+    def SweepJournal_addRecord(self, stage, label, value, result):
+        sweepKey = (stage, label)
+        if sweepKey not in self.sweeps:
+            self.sweeps[sweepKey] = {}
+            self.sweepOrder.append(sweepKey)
+        self.sweeps[sweepKey][repr(float(value))] = [value, result]
+
+    #################################################################
+    # Returns the result of the trial of the given stage ("impact"  #
+    # or "sensitivity") and label at the given value of independent #
+    # variable, or None if the trial has not yet been completed     #
+    #################################################################
+    def SweepJournal_getResult(self, stage, label, value):
+        sweep = self.sweeps.get((stage, label), {})
+        completed = sweep.get(repr(float(value)))
+        if completed is None:
+            return None
+        return completed[1]
+
+    #################################################################
+    # Appends the result of a completed trial to the journal        #
+    #################################################################
+    def SweepJournal_record(self, stage, label, value, result):
+        result = [float(entry) for entry in result]
+        self.SweepJournal_writeLine({"stage": stage, "label": label,
+            "value": value, "result": result})
+        self.SweepJournal_addRecord(stage, label, value, result)
+
+    #################################################################
+    # Returns the labels of all the sweeps of the given stage, in   #
+    # the order in which they were first journaled                  #
+    #################################################################
+    def SweepJournal_getLabels(self, stage):
+        return [label for (curStage, label) in self.sweepOrder
+            if curStage == stage]
+
+    #################################################################
+    # Returns the completed trials of a sweep formatted as          #
+    # [[values], [results]], sorted by the independent variable     #
+    #################################################################
+    def SweepJournal_getSweep(self, stage, label):
+        completed = sorted(self.sweeps.get((stage, label), {}).values(),
+            key=lambda trial: trial[0])
+        values = [trial[0] for trial in completed]
+        results = [trial[1] for trial in completed]
+        return [values, results]
+
+    #################################################################
+    # Closes the underlying journal file                            #
+    #################################################################
+    def SweepJournal_close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
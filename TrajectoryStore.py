@@ -0,0 +1,268 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: TrajectoryStore.py                                          #
+# Description: Binary store of the complete per-tick state of every #
+# agent. Each float attribute is a preallocated, memory-mapped .npy #
+# block (ticks x agents) and each boolean attribute is bit-packed   #
+# (8 agents per byte). The reader maps the blocks rather than load  #
+# them, so any slice of agents or ticks of a trajectory far larger  #
+# than memory is read without touching the rest of the files. Ticks #
+# are buffered and copied into the files by a background thread     #
+# (see BackgroundWriter)                                            #
+#####################################################################
+
+import sys
+import os
+import json
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from BackgroundWriter import BackgroundWriter, ColumnBuffer
+
+# Agent attributes stored at each tick, as floats and as packed bits
+FLOAT_ATTRS = ["attitude", "discrimination", "support", "probConceal",
+    "currentDepression"]
+FLAG_ATTRS = ["isConcealed", "isDepressed", "isDiscriminatory"]
+
+# Description of the store (dimensions, agent order and attributes)
+META_FILE = "meta.json"
+
+class TrajectoryStore:
+    #################################################################
+    # Initializes the store in the given directory for numTicks     #
+    # ticks, storing floats as dtype (i.e. np.float32 to halve the  #
+    # size). The blocks are allocated on the first tick observed,   #
+    # once the number of agents is known. Ticks are buffered by     #
+    # bufferTicks and copied into the blocks on a background thread #
+    # unless background is False (in which case the observer waits  #
+    # on the copy)                                                  #
+    #################################################################
+    def __init__(self, directory, numTicks, dtype=np.float64,
+        bufferTicks=32, background=True):
+        self.directory = directory
+        self.numTicks = numTicks
+        self.dtype = np.dtype(dtype)
+        self.bufferTicks = bufferTicks
+        self.isBackground = background
+
+        self.blocks = None
+        self.ticksWritten = 0
+
+        # Buffer of the ticks observed but not yet handed off to be
+        # copied into the blocks (see newBuffer), and the writer
+        self.buffer = None
+        self.background = None
+
+    #################################################################
+    # Returns the path of the .npy file holding the given attribute #
+    #################################################################
+    def TrajectoryStore_getPath(self, attr):
+        return os.path.join(self.directory, attr + ".npy")
+
+    #################################################################
+    # Allocates the blocks for the agents of the network base, also #
+    # storing the static per-agent values (agentID, isMinority)     #
+    #################################################################
+    def TrajectoryStore_allocate(self, network):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        self.agents = list(network.Agents.values())
+        numAgents = len(self.agents)
+        numBytes = (numAgents + 7)//8
+
+        self.blocks = {}
+        for attr in FLOAT_ATTRS:
+            self.blocks[attr] = open_memmap(
+                self.TrajectoryStore_getPath(attr), mode="w+",
+                dtype=self.dtype, shape=(self.numTicks, numAgents))
+        for attr in FLAG_ATTRS:
+            self.blocks[attr] = open_memmap(
+                self.TrajectoryStore_getPath(attr), mode="w+",
+                dtype=np.uint8, shape=(self.numTicks, numBytes))
+        self.blocks["policyScore"] = open_memmap(
+            self.TrajectoryStore_getPath("policyScore"), mode="w+",
+            dtype=np.float64, shape=(self.numTicks,))
+
+        self.buffer = self.TrajectoryStore_newBuffer()
+        if self.isBackground:
+            self.background = BackgroundWriter(
+                self.TrajectoryStore_writeBuffer,
+                self.TrajectoryStore_newBuffer)
+
+        np.save(self.TrajectoryStore_getPath("agentID"),
+            np.array([agent.agentID for agent in self.agents]))
+        np.save(self.TrajectoryStore_getPath("isMinority"), np.packbits(
+            np.array([agent.isMinority for agent in self.agents])))
+        self.TrajectoryStore_writeMeta()
+
+    #################################################################
+    # Writes the description of the store (rewritten on close with  #
+    # the number of ticks actually written)                         #
+    #################################################################
+    def TrajectoryStore_writeMeta(self):
+        meta = {
+            "numTicks": self.numTicks,
+            "numAgents": len(self.agents),
+            "ticksWritten": self.ticksWritten,
+            "floatAttrs": FLOAT_ATTRS,
+            "flagAttrs": FLAG_ATTRS,
+            "dtype": self.dtype.str
+        }
+        with open(os.path.join(self.directory, META_FILE), 'w') as f:
+            json.dump(meta, f)
+
+    #################################################################
+    # Returns an empty buffer of bufferTicks rows, each holding a   #
+    # tick and its rows of the blocks                               #
+    #################################################################
+    def TrajectoryStore_newBuffer(self):
+        columns = {"time": [np.int64, None], 
+            "policyScore": [np.float64, None]}
+        for attr in FLOAT_ATTRS:
+            columns[attr] = [self.dtype, len(self.agents)]
+        for attr in FLAG_ATTRS:
+            columns[attr] = [np.uint8, (len(self.agents) + 7)//8]
+        return ColumnBuffer(self.bufferTicks, columns)
+
+    #################################################################
+    # Observer hook called (via ObserverSink) after each tick:      #
+    # stores the state of all the agents as the row of that tick    #
+    #################################################################
+    def Observer_observeTick(self, network, time):
+        if self.blocks is None:
+            self.TrajectoryStore_allocate(network)
+        if time >= self.numTicks:
+            return
+
+        buffer = self.buffer
+        row = buffer.count
+        buffer.columns["time"][row] = time
+        buffer.columns["policyScore"][row] = network.policyScore
+        for attr in FLOAT_ATTRS:
+            buffer.columns[attr][row] = np.fromiter((getattr(agent, attr,
+                0.0) for agent in self.agents), dtype=self.dtype,
+                count=len(self.agents))
+        for attr in FLAG_ATTRS:
+            buffer.columns[attr][row] = np.packbits(np.fromiter((
+                bool(getattr(agent, attr, False)) for agent in self.agents),
+                dtype=bool, count=len(self.agents)))
+        buffer.count += 1
+        self.ticksWritten = max(self.ticksWritten, time + 1)
+
+        if buffer.ColumnBuffer_isFull():
+            self.TrajectoryStore_flush()
+
+    #################################################################
+    # Hands the buffered ticks off to be copied into the blocks (by #
+    # the background writer, if any) and continues in a recycled    #
+    # buffer                                                        #
+    #################################################################
+    def TrajectoryStore_flush(self):
+        if not self.buffer.count:
+            return
+        if self.background is None:
+            self.TrajectoryStore_writeBuffer(self.buffer)
+            self.buffer.ColumnBuffer_clear()
+        else:
+            self.background.BackgroundWriter_submit(self.buffer)
+            self.buffer = self.background.BackgroundWriter_getBuffer()
+
+    #################################################################
+    # Copies the ticks of the given buffer into their rows of the   #
+    # blocks                                                        #
+    #################################################################
+    def TrajectoryStore_writeBuffer(self, buffer):
+        times = buffer.columns["time"][:buffer.count]
+        for attr, block in self.blocks.items():
+            block[times] = buffer.columns[attr][:buffer.count]
+
+    #################################################################
+    # Copies any buffered ticks into the blocks, waiting for all of #
+    # them to be copied, then flushes all the blocks to disk and    #
+    # finalizes the description                                     #
+    #################################################################
+    def TrajectoryStore_close(self):
+        if self.blocks is None:
+            return
+        self.TrajectoryStore_flush()
+        if self.background is not None:
+            self.background.BackgroundWriter_close()
+            self.background = None
+        for block in self.blocks.values():
+            block.flush()
+        self.TrajectoryStore_writeMeta()
+        self.blocks = None
+
+class TrajectoryReader:
+    #################################################################
+    # Opens the store in the given directory: blocks are only mapped#
+    # (not read) until sliced                                       #
+    #################################################################
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), 'r') as f:
+            self.meta = json.load(f)
+
+        self.numAgents = self.meta["numAgents"]
+        self.numTicks = self.meta["ticksWritten"]
+        self.agentIDs = self.TrajectoryReader_load("agentID")
+
+        # Position of each agent (by ID) in the stored columns
+        self.index = dict((agentID, i) for i, agentID in
+            enumerate(self.agentIDs.tolist()))
+
+    #################################################################
+    # Maps the .npy file of the given attribute (read-only)         #
+    #################################################################
+    def TrajectoryReader_load(self, attr):
+        return np.load(os.path.join(self.directory, attr + ".npy"),
+            mmap_mode='r')
+
+    #################################################################
+    # Returns the values of attr (a float or flag attribute) for the#
+    # ticks (slice) and agents (slice of positions) given, as ticks #
+    # x agents. Slices may have any (including negative) step. Only #
+    # the bytes covering the agents requested are read              #
+    #################################################################
+    def TrajectoryReader_getAttr(self, attr, ticks=slice(None),
+        agents=slice(None)):
+        block = self.TrajectoryReader_load(attr)
+        if attr in self.meta["floatAttrs"]:
+            return np.asarray(block[ticks, agents])
+
+        positions = np.arange(*agents.indices(self.numAgents))
+        if not len(positions):
+            numTicks = len(range(*ticks.indices(self.numTicks)))
+            return np.zeros((numTicks, 0), dtype=bool)
+
+        # Unpacks only the bytes spanning the agents requested
+        firstByte = positions.min()//8
+        lastByte = positions.max()//8 + 1
+        bits = np.unpackbits(np.asarray(block[ticks, firstByte:lastByte]),
+            axis=1).astype(bool)
+        return bits[:, positions - firstByte * 8]
+
+    #################################################################
+    # Returns the trajectory (one value per tick) of attr for the   #
+    # agent with the given ID over the given ticks                  #
+    #################################################################
+    def TrajectoryReader_getAgent(self, agentID, attr, ticks=slice(None)):
+        position = self.index[agentID]
+        return self.TrajectoryReader_getAttr(attr, ticks,
+            slice(position, position + 1))[:, 0]
+
+    #################################################################
+    # Returns whether each agent (in stored order) is of minority   #
+    #################################################################
+    def TrajectoryReader_getMinority(self):
+        packed = self.TrajectoryReader_load("isMinority")
+        return np.unpackbits(packed)[:self.numAgents].astype(bool)
+
+    #################################################################
+    # Returns the policy score at each of the given ticks           #
+    #################################################################
+    def TrajectoryReader_getPolicyScores(self, ticks=slice(None)):
+        start, stop, step = ticks.indices(self.numTicks)
+        return np.asarray(self.TrajectoryReader_load("policyScore")
+            [start:stop:step])
@@ -0,0 +1,148 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: TrajectoryWriter.py                                         #
+# Description: Buffered, columnar writer of the agent trajectories  #
+# (the results CSV of SMDModel_runSimulation). Snapshots are kept as#
+# columns, with the static columns (agentID, isMinority) and the    #
+# network-wide policy score stored once, in preallocated buffers    #
+# that are recycled once written. They are written to a single open #
+# file handle in large blocks (by a background thread, so that the  #
+# simulation continues while the blocks are being written)          #
+#####################################################################
+
+import sys
+import os
+import csv
+import itertools
+import numpy as np
+
+from BackgroundWriter import BackgroundWriter, ColumnBuffer
+
+# Columns of the results CSV, along with the agent attributes that are
+# static (stored once) and dynamic (stored with each snapshot)
+COLUMNS = ['time', 'agentID', 'attitude', 'isMinority', 'discrimination',
+    'support', 'probConceal', 'isConcealed', 'currentDepression',
+    'isDepressed', 'policy points']
+STATIC_ATTRS = ["agentID", "isMinority"]
+DYNAMIC_ATTRS = ["attitude", "discrimination", "support", "probConceal",
+    "isConcealed", "currentDepression", "isDepressed"]
+
+# Dynamic attributes buffered as booleans (the others being floats)
+FLAG_ATTRS = ["isConcealed", "isDepressed"]
+
+class TrajectoryWriter:
+    #################################################################
+    # Opens the results file (writing its header), into which the   #
+    # snapshots are written once over bufferCells values are held.  #
+    # Blocks are written on a background thread unless background   #
+    # is False (in which case the snapshot call waits on the disk)  #
+    #################################################################
+    def __init__(self, resultsFile, bufferCells=1000000, background=True):
+        self.resultsFile = resultsFile
+        self.bufferCells = bufferCells
+
+        resultsDir = os.path.dirname(resultsFile)
+        if resultsDir and not os.path.isdir(resultsDir):
+            os.makedirs(resultsDir)
+
+        self.file = open(resultsFile, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(COLUMNS)
+
+        # Once started, only the background writer touches the file
+        self.background = None
+        if background:
+            self.file.flush()
+            self.background = BackgroundWriter(
+                self.TrajectoryWriter_writeSnapshots,
+                self.TrajectoryWriter_newBuffer)
+
+        # Agents (in order) and their static columns: set on the first
+        # snapshot since the agents of a network remain the same
+        self.agents = None
+        self.staticColumns = None
+
+        # Buffer being filled with snapshots (see newBuffer)
+        self.buffer = None
+
+    #################################################################
+    # Returns an empty buffer of snapshots: each row holds the time,#
+    # the policy score and the dynamic attributes of all the agents,#
+    # enough rows being allocated to hold bufferCells values        #
+    #################################################################
+    def TrajectoryWriter_newBuffer(self):
+        rowCells = max(1, len(self.agents) * len(DYNAMIC_ATTRS))
+        columns = {"time": [object, None], "policyScore": [object, None]}
+        for attr in DYNAMIC_ATTRS:
+            dtype = bool if attr in FLAG_ATTRS else float
+            columns[attr] = [dtype, len(self.agents)]
+        return ColumnBuffer(max(1, -(-self.bufferCells//rowCells)), 
+            columns)
+
+    #################################################################
+    # Buffers a snapshot of all the agents of the network base at   #
+    # the given time, flushing the buffer if full                   #
+    #################################################################
+    def TrajectoryWriter_snapshot(self, time, network):
+        if self.agents is None:
+            self.agents = list(network.Agents.values())
+            self.staticColumns = dict((attr, [getattr(agent, attr)
+                for agent in self.agents]) for attr in STATIC_ATTRS)
+            self.buffer = self.TrajectoryWriter_newBuffer()
+
+        buffer = self.buffer
+        row = buffer.count
+        buffer.columns["time"][row] = time
+        buffer.columns["policyScore"][row] = network.policyScore
+        for attr in DYNAMIC_ATTRS:
+            buffer.columns[attr][row] = [getattr(agent, attr) 
+                for agent in self.agents]
+        buffer.count += 1
+
+        if buffer.ColumnBuffer_isFull():
+            self.TrajectoryWriter_flush()
+
+    #################################################################
+    # Hands the buffered snapshots off to be written (to the        #
+    # background writer, if any) and continues in a recycled buffer #
+    #################################################################
+    def TrajectoryWriter_flush(self):
+        if self.buffer is None or not self.buffer.count:
+            return
+        if self.background is None:
+            self.TrajectoryWriter_writeSnapshots(self.buffer)
+            self.buffer.ColumnBuffer_clear()
+        else:
+            self.background.BackgroundWriter_submit(self.buffer)
+            self.buffer = self.background.BackgroundWriter_getBuffer()
+
+    #################################################################
+    # Writes out the snapshots of the given buffer: rows are        #
+    # assembled by zipping the columns (static ones and the time/   #
+    # policy repeated), the buffered values being converted back to #
+    # Python values so the CSV reads as if they were written as is  #
+    #################################################################
+    def TrajectoryWriter_writeSnapshots(self, buffer):
+        for row in range(buffer.count):
+            allColumns = dict((attr, buffer.columns[attr][row].tolist())
+                for attr in DYNAMIC_ATTRS)
+            allColumns.update(self.staticColumns)
+            allColumns["time"] = itertools.repeat(
+                buffer.columns["time"][row])
+            allColumns["policy points"] = itertools.repeat(
+                buffer.columns["policyScore"][row])
+            self.writer.writerows(zip(*[allColumns[column]
+                for column in COLUMNS]))
+        self.file.flush()
+
+    #################################################################
+    # Writes out any buffered snapshots, waiting for all of them to #
+    # be written, and closes the results file                       #
+    #################################################################
+    def TrajectoryWriter_close(self):
+        self.TrajectoryWriter_flush()
+        try:
+            if self.background is not None:
+                self.background.BackgroundWriter_close()
+        finally:
+            self.file.close()
@@ -0,0 +1,150 @@
+#####################################################################
+# Name: Yash Patel                                                  #
+# File: TransitionLog.py                                            #
+# Description: Event-sourced history of a simulation. Rather than a #
+# snapshot of every agent at every tick, only the transitions of the#
+# agents' flags (tick, agentID, field, new value) are logged, along #
+# with keyframes of all the attributes every few ticks. A replayer  #
+# rebuilds the state at any tick from the nearest keyframe before it#
+#####################################################################
+
+import sys
+import os
+import json
+import bisect
+
+# Agent flags whose transitions are logged at every tick and the
+# (continuous) attributes only stored in the keyframes
+FLAG_FIELDS = ["isConcealed", "isDepressed", "isDiscriminatory"]
+KEYFRAME_FIELDS = ["attitude", "discrimination", "support",
+    "probConceal", "currentDepression"]
+
+# Files of the log: the transitions (one JSON list per line), the
+# keyframes (one JSON object per line) and the index of the keyframes
+TRANSITIONS_FILE = "transitions.jsonl"
+KEYFRAMES_FILE = "keyframes.jsonl"
+INDEX_FILE = "index.json"
+
+class TransitionRecorder:
+    #################################################################
+    # Initializes the recorder writing to the given directory, which#
+    # stores a keyframe every keyframeRate ticks once it is added as#
+    # an observer of the simulation                                 #
+    #################################################################
+    def __init__(self, directory, keyframeRate=26):
+        self.directory = directory
+        self.keyframeRate = keyframeRate
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.transitionsFile = open(os.path.join(directory,
+            TRANSITIONS_FILE), 'w')
+        self.keyframesFile = open(os.path.join(directory,
+            KEYFRAMES_FILE), 'w')
+
+        # Flags of each agent as of the last tick observed (by agentID)
+        self.lastFlags = {}
+
+        # Index: for each keyframe, its tick and the byte offsets of it
+        # and of the first transition after it (where replay begins)
+        self.keyframes = []
+
+    #################################################################
+    # Observer hook called (via ObserverSink) after each tick: logs #
+    # the flags that changed since the previous tick and, every     #
+    # keyframeRate ticks, a keyframe of the full state. A keyframe  #
+    # is also written on the first tick observed (i.e. for a forked #
+    # or resumed run) or when agents have not been seen before      #
+    #################################################################
+    def Observer_observeTick(self, network, time):
+        if time % self.keyframeRate == 0 or any(agentID not in
+            self.lastFlags for agentID in network.Agents):
+            self.TransitionRecorder_writeKeyframe(network, time)
+            return
+
+        lines = []
+        for agentID, agent in network.Agents.items():
+            lastFlags = self.lastFlags[agentID]
+            for i, field in enumerate(FLAG_FIELDS):
+                value = bool(getattr(agent, field, False))
+                if value != lastFlags[i]:
+                    lastFlags[i] = value
+                    lines.append(json.dumps([time, agentID, field, value]))
+        if lines:
+            self.transitionsFile.write("\n".join(lines) + "\n")
+
+    #################################################################
+    # Writes a keyframe (all the flags and attributes of the agents #
+    # along with the policy score) of the state at the given tick   #
+    #################################################################
+    def TransitionRecorder_writeKeyframe(self, network, time):
+        agents = {}
+        for agentID, agent in network.Agents.items():
+            flags = [bool(getattr(agent, field, False))
+                for field in FLAG_FIELDS]
+            self.lastFlags[agentID] = list(flags)
+            agents[agentID] = flags + [getattr(agent, field)
+                for field in KEYFRAME_FIELDS]
+
+        keyframe = {"time": time, "policyScore": network.policyScore,
+            "agents": agents}
+        self.keyframes.append([time, self.keyframesFile.tell(),
+            self.transitionsFile.tell()])
+        self.keyframesFile.write(json.dumps(keyframe) + "\n")
+
+    #################################################################
+    # Closes the log files and writes out the index of keyframes    #
+    #################################################################
+    def TransitionRecorder_close(self):
+        self.transitionsFile.close()
+        self.keyframesFile.close()
+        with open(os.path.join(self.directory, INDEX_FILE), 'w') as f:
+            json.dump({"keyframes": self.keyframes,
+                "flagFields": FLAG_FIELDS,
+                "keyframeFields": KEYFRAME_FIELDS}, f)
+
+class TransitionReplayer:
+    #################################################################
+    # Opens the log in the given directory (only reading its index) #
+    #################################################################
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_FILE), 'r') as f:
+            index = json.load(f)
+        self.keyframes = index["keyframes"]
+        self.keyframeTimes = [keyframe[0] for keyframe in self.keyframes]
+
+    #################################################################
+    # Rebuilds the state at the end of the given tick: returns, for #
+    # each agentID, a dictionary of its flags (exact at that tick)  #
+    # and of its attributes (as of the nearest keyframe before it), #
+    # with the keyframe's policy score, as [agents, policyScore]    #
+    #################################################################
+    def TransitionReplayer_getState(self, time):
+        position = bisect.bisect_right(self.keyframeTimes, time) - 1
+        if position < 0:
+            sys.stderr.write("No keyframe at or before tick {}\n"\
+                .format(time))
+            return None
+        keyTime, keyOffset, transitionOffset = self.keyframes[position]
+
+        # Seeks directly to the keyframe and the transitions after it
+        with open(os.path.join(self.directory, KEYFRAMES_FILE), 'r') as f:
+            f.seek(keyOffset)
+            keyframe = json.loads(f.readline())
+
+        fields = FLAG_FIELDS + KEYFRAME_FIELDS
+        agents = {}
+        for agentID, values in keyframe["agents"].items():
+            agents[int(agentID)] = dict(zip(fields, values))
+
+        with open(os.path.join(self.directory, TRANSITIONS_FILE),
+            'r') as f:
+            f.seek(transitionOffset)
+            for line in f:
+                transitionTime, agentID, field, value = json.loads(line)
+                if transitionTime > time:
+                    break
+                agents[agentID][field] = value
+
+        return [agents, keyframe["policyScore"]]